@@ -0,0 +1,167 @@
+import argparse
+import contextlib
+import io
+import math
+import os
+import statistics
+import sys
+import time
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(RAIZ, 'src'))
+sys.path.insert(0, os.path.join(RAIZ, 'src', 'api'))
+
+from analitico import DUCKDB_DISPONIVEL, SOMA_CENTAVOS, conectar_duckdb, pasta_parquet
+from suite import preparar_area
+
+ROTAS = [
+    '/api/estatisticas',
+    '/api/estatisticas/uf',
+    '/api/estatisticas/uf?ano=2025',
+    '/api/estatisticas/uf?ano=2025&trimestre=4',
+]
+
+# Agregações calculadas a cada consulta (sem os resumos materializados do SQLite), mais as do querys.sql
+CONSULTAS_DIRETAS = [
+    ('total e média', f"SELECT {SOMA_CENTAVOS}, COUNT(d.valor_despesas) FROM despesas d"),
+    ('top 5 operadoras',
+     f"SELECT o.razao_social, {SOMA_CENTAVOS} AS centavos FROM despesas d JOIN operadoras o ON d.registro_ans = o.registro_ans "
+     "GROUP BY o.razao_social ORDER BY centavos DESC, o.razao_social NULLS FIRST LIMIT 5"),
+    ('total por UF e trimestre',
+     f"SELECT o.uf, d.ano, d.trimestre, {SOMA_CENTAVOS} AS centavos FROM despesas d "
+     "JOIN operadoras o ON d.registro_ans = o.registro_ans GROUP BY o.uf, d.ano, d.trimestre ORDER BY d.ano, d.trimestre, o.uf NULLS FIRST"),
+]
+
+
+def carregar(args):
+    # Pipeline completo na área com a cópia Parquet (o banco é recriado a cada execução)
+    import database
+    import processor
+    import transformer
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor.processar_arquivos(workers=args.workers)
+        transformer.main()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+        database.criar_tabelas()
+        inicio = time.perf_counter()
+        database.importar_dados(particionar=args.particionar_anos, parquet=True)
+    print(f"carga (SQLite + Parquet) em {time.perf_counter() - inicio:.2f} s")
+
+
+def mediana_ms(funcao, repeticoes):
+    funcao()  # aquecimento: páginas do banco e metadados dos Parquet em cache
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1000
+
+
+def mesmas_linhas(a, b):
+    # Inteiros (centavos) e textos exatos; floats do querys.sql (SUM/AVG em ordens diferentes) com tolerância relativa
+    if len(a) != len(b):
+        return False
+    for linha_a, linha_b in zip(a, b):
+        for x, y in zip(linha_a, linha_b):
+            if isinstance(x, float) and isinstance(y, float):
+                if not math.isclose(x, y, rel_tol=1e-9):
+                    return False
+            elif x != y:
+                return False
+    return True
+
+
+def comparar_rotas(caminho_db, repeticoes):
+    os.environ['INTUITIVE_DB_PATH'] = caminho_db
+    import app as api
+    from agregados import AgregadosDuckDB, AgregadosSQLite
+
+    cliente = api.app.test_client()
+    backends = [AgregadosSQLite(), AgregadosDuckDB(caminho_db)]
+    print(f"\n{'rota (cache limpo, mediana)':<48}{'sqlite':>12}{'duckdb':>12}  JSON")
+    divergentes = 0
+    for rota in ROTAS:
+        tempos, corpos = [], []
+        for backend in backends:
+            api.agregados = backend
+
+            def requisitar():
+                api.cache_respostas.limpar()
+                resposta = cliente.get(rota)
+                if resposta.status_code != 200:
+                    raise RuntimeError(f"{rota} retornou {resposta.status_code}")
+                return resposta.get_data()
+
+            corpos.append(requisitar())
+            tempos.append(mediana_ms(requisitar, repeticoes))
+        igual = corpos[0] == corpos[1]
+        divergentes += not igual
+        print(f"{rota:<48}{tempos[0]:>9.2f} ms{tempos[1]:>9.2f} ms  {'idêntico' if igual else 'DIFERENTE'}")
+    if not backends[1]._verificada[1]:
+        print("aviso: a cópia Parquet não é da geração atual; o backend DuckDB respondeu pelo SQLite")
+    backends[1].fechar()
+    return divergentes
+
+
+def comparar_consultas(caminho_db, repeticoes, threads):
+    import sqlite3
+
+    import database
+    from particoes import anexar_particoes
+
+    conn_sqlite = sqlite3.connect(caminho_db)
+    anexar_particoes(conn_sqlite, caminho_db)
+    conn_duckdb = conectar_duckdb(pasta_parquet(caminho_db), threads)
+    consultas = CONSULTAS_DIRETAS + [(f"querys.sql #{i}", sql) for i, sql in enumerate(database._ler_script()[1], 1)]
+
+    print(f"\n{'consulta (sem resumos, mediana)':<48}{'sqlite':>12}{'duckdb':>12}{'razão':>8}  resultado")
+    divergentes = 0
+    for nome, sql in consultas:
+        linhas_sqlite = conn_sqlite.execute(sql).fetchall()
+        linhas_duckdb = conn_duckdb.execute(sql).fetchall()
+        ms_sqlite = mediana_ms(lambda: conn_sqlite.execute(sql).fetchall(), repeticoes)
+        ms_duckdb = mediana_ms(lambda: conn_duckdb.execute(sql).fetchall(), repeticoes)
+        igual = mesmas_linhas(linhas_sqlite, linhas_duckdb)
+        divergentes += not igual
+        print(f"{nome:<48}{ms_sqlite:>9.2f} ms{ms_duckdb:>9.2f} ms{ms_sqlite / ms_duckdb:>8.1f}  {'igual' if igual else 'DIFERENTE'}")
+    conn_sqlite.close()
+    conn_duckdb.close()
+    return divergentes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara os backends SQLite e DuckDB (Parquet) das rotas agregadas.")
+    parser.add_argument('--linhas', type=int, default=5_000_000, help="Linhas nos ZIPs sintéticos.")
+    parser.add_argument('--trimestres', type=int, default=8)
+    parser.add_argument('--operadoras', type=int, default=1500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pasta', default=os.path.join(RAIZ, 'benchmarks', '.area_agregados'),
+                        help="Área de trabalho (os ZIPs gerados são reaproveitados entre execuções).")
+    parser.add_argument('--repeticoes', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads-duckdb', type=int, default=None)
+    parser.add_argument('--particionar-anos', action='store_true', help="SQLite com as despesas em um arquivo por ano.")
+    parser.add_argument('--sem-carga', action='store_true', help="Usa o banco e a cópia Parquet já carregados na área.")
+    args = parser.parse_args()
+
+    if not DUCKDB_DISPONIVEL:
+        print("duckdb não instalado (pip install duckdb).")
+        sys.exit(1)
+
+    preparar_area(os.path.abspath(args.pasta), args.linhas, args.trimestres, args.operadoras, args.seed)
+    if not args.sem_carga:
+        carregar(args)
+
+    caminho_db = os.path.abspath('data/intuitive_care.db')
+    divergentes = comparar_rotas(caminho_db, args.repeticoes)
+    divergentes += comparar_consultas(caminho_db, args.repeticoes, args.threads_duckdb)
+    if divergentes:
+        print(f"\n{divergentes} resultado(s) diferentes entre os backends")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
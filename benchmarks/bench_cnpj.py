@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from transformer import validar_cnpj, validar_cnpj_vetorizado
+
+
+def gerar_cnpjs(linhas, operadoras, seed=42):
+    # Poucos CNPJs distintos repetidos em todas as linhas, como nas despesas reais
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 10, size=(operadoras, 14)).astype(str)
+    unicos = np.array([''.join(d) for d in base], dtype=object)
+    unicos[::7] = [f"{c[:2]}.{c[2:5]}.{c[5:8]}/{c[8:12]}-{c[12:]}" for c in unicos[::7]]
+    return pd.Series(unicos[rng.integers(0, operadoras, linhas)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara validar_cnpj (apply) com validar_cnpj_vetorizado.")
+    parser.add_argument('--linhas', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--operadoras', type=int, default=1500)
+    parser.add_argument('--pular-escalar', action='store_true', help="Não mede o caminho apply (lento em 10M).")
+    args = parser.parse_args()
+
+    print(f"{'linhas':>12}{'apply (s)':>12}{'vetorizado (s)':>16}{'speedup':>10}")
+    for linhas in args.linhas:
+        cnpjs = gerar_cnpjs(linhas, args.operadoras)
+
+        inicio = time.perf_counter()
+        vetorizado = validar_cnpj_vetorizado(cnpjs)
+        t_vet = time.perf_counter() - inicio
+
+        if args.pular_escalar:
+            print(f"{linhas:>12,}{'-':>12}{t_vet:>16.3f}{'-':>10}")
+            continue
+
+        inicio = time.perf_counter()
+        escalar = cnpjs.astype(str).str.replace(r'[^0-9]', '', regex=True).apply(validar_cnpj)
+        t_esc = time.perf_counter() - inicio
+
+        if not (escalar.to_numpy() == vetorizado.to_numpy()).all():
+            raise SystemExit("Divergência entre validar_cnpj e validar_cnpj_vetorizado!")
+        print(f"{linhas:>12,}{t_esc:>12.3f}{t_vet:>16.3f}{t_esc / t_vet:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
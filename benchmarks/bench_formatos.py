@@ -0,0 +1,74 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from formato import TIPOS_CONSOLIDADO, TIPOS_FINAL, aplicar_tipos, ler_tabela, salvar_tabela
+
+
+def gerar_frames(linhas, seed=42):
+    rng = np.random.default_rng(seed)
+    registros = rng.integers(300000, 302000, linhas)
+    consolidado = pd.DataFrame({
+        'RegistroANS': registros,
+        'Ano': rng.integers(2023, 2027, linhas),
+        'Trimestre': rng.integers(1, 5, linhas),
+        'Valor Despesas': np.round(rng.uniform(0, 1e7, linhas), 2)
+    })
+    final = consolidado.copy()
+    final['CNPJ'] = pd.Series(registros).map(lambda r: f"{r:014d}")
+    final['RazaoSocial'] = pd.Series(registros).map(lambda r: f"OPERADORA {r} LTDA")
+    final['Modalidade'] = rng.choice(['Medicina de Grupo', 'Cooperativa Médica', 'Autogestão'], linhas)
+    final['UF'] = rng.choice(['SP', 'RJ', 'MG', 'RS', 'PR'], linhas)
+    final['CNPJ_Valido'] = rng.random(linhas) > 0.1
+    return aplicar_tipos(consolidado, TIPOS_CONSOLIDADO), aplicar_tipos(final, TIPOS_FINAL)
+
+
+def cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def medir_etapa(nome, df, tipos, pasta, repeticoes):
+    base = os.path.join(pasta, nome)
+    resultados = {}
+    for formato in ('csv', 'parquet'):
+        escrita = cronometrar(lambda: salvar_tabela(df, base, tipos, formato), repeticoes)
+        # Garante que a leitura pegue o formato medido
+        os.utime(f"{base}.{formato}")
+        leitura = cronometrar(lambda: ler_tabela(base, tipos), repeticoes)
+        tamanho = os.path.getsize(f"{base}.{formato}") / (1024 * 1024)
+        resultados[formato] = (escrita, leitura, tamanho)
+
+    print(f"\nEtapa: {nome} ({len(df):,} linhas)")
+    print(f"{'formato':<10}{'escrita (s)':>14}{'leitura (s)':>14}{'tamanho (MB)':>15}")
+    for formato, (escrita, leitura, tamanho) in resultados.items():
+        print(f"{formato:<10}{escrita:>14.3f}{leitura:>14.3f}{tamanho:>15.1f}")
+    csv, pq = resultados['csv'], resultados['parquet']
+    print(f"economia por execução: {csv[0] + csv[1] - pq[0] - pq[1]:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara CSV e Parquet nas trocas entre etapas do pipeline.")
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    consolidado, final = gerar_frames(args.linhas)
+    with tempfile.TemporaryDirectory() as pasta:
+        medir_etapa('consolidado', consolidado, TIPOS_CONSOLIDADO, pasta, args.repeticoes)
+        medir_etapa('consolidado_despesas_final', final, TIPOS_FINAL, pasta, args.repeticoes)
+
+
+if __name__ == "__main__":
+    main()
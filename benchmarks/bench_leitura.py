@@ -0,0 +1,72 @@
+import argparse
+import io
+import os
+import sys
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from processor import converter_valores, filtrar_despesas, ler_csv_trimestre
+
+DESCRICOES = [
+    'EVENTOS INDENIZÁVEIS LÍQUIDOS / SINISTROS RETIDOS', 'DESPESAS ADMINISTRATIVAS', 'RECEITAS DE CONTRAPRESTAÇÕES',
+    'ATIVO CIRCULANTE', 'PROVISÃO DE EVENTOS A LIQUIDAR', 'DESPESAS DE COMERCIALIZAÇÃO', 'APLICAÇÕES FINANCEIRAS'
+]
+
+
+def gerar_zip(linhas, seed=42):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'DATA': '2025-01-01',
+        'REG_ANS': rng.integers(300000, 302000, linhas).astype(str),
+        'CD_CONTA_CONTABIL': rng.integers(1, 99999999, linhas).astype(str),
+        'DESCRICAO': rng.choice(DESCRICOES, linhas),
+        'VL_SALDO_INICIAL': '0,00',
+        'VL_SALDO_FINAL': [f"{v:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.') for v in rng.uniform(0, 1e7, linhas)]
+    })
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('1T2025.csv', df.to_csv(sep=';', index=False).encode('latin1'))
+    buffer.seek(0)
+    return zipfile.ZipFile(buffer)
+
+
+def leitura_antiga(z):
+    # Caminho anterior: todas as colunas como str, regex por linha e conversão de valor com str.replace
+    with z.open('1T2025.csv') as f:
+        df = pd.read_csv(f, sep=';', encoding='latin1', dtype=str, on_bad_lines='skip')
+    memoria = df.memory_usage(deep=True).sum()
+    return converter_valores(filtrar_despesas(df, '2025', '1')), memoria
+
+
+def leitura_tipada(z):
+    df = next(ler_csv_trimestre(z, '1T2025.csv'))
+    memoria = df.memory_usage(deep=True).sum()
+    return converter_valores(filtrar_despesas(df, '2025', '1')), memoria
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a leitura de um trimestre com dtype=str e com a leitura tipada.")
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    z = gerar_zip(args.linhas)
+    print(f"{'leitura':<10}{'tempo (s)':>12}{'memória (MB)':>15}")
+    resultados = {}
+    for nome, funcao in (('antiga', leitura_antiga), ('tipada', leitura_tipada)):
+        inicio = time.perf_counter()
+        df, memoria = funcao(z)
+        segundos = time.perf_counter() - inicio
+        resultados[nome] = df
+        print(f"{nome:<10}{segundos:>12.3f}{memoria / (1024 * 1024):>15.1f}")
+
+    iguais = np.array_equal(resultados['antiga']['valor'].to_numpy(), resultados['tipada']['valor'].to_numpy(), equal_nan=True)
+    print(f"valores idênticos: {iguais}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import indice_zip
+from dados_sinteticos import gerar_trimestre
+from processor import encontrar_arquivo_csv, filtrar_despesas, indice_trimestre, ler_csv_indexado, ler_csv_trimestre
+
+
+def leitura_zipfile(caminho, chunksize):
+    # Caminho anterior: namelist, releitura do cabeçalho e normalização das colunas a cada execução
+    linhas = 0
+    with zipfile.ZipFile(caminho, 'r') as z:
+        for df in ler_csv_trimestre(z, encontrar_arquivo_csv(z), chunksize=chunksize):
+            linhas += len(filtrar_despesas(df, '2025', '1'))
+    return linhas
+
+
+def leitura_indexada(caminho, chunksize):
+    linhas = 0
+    indice = indice_trimestre(caminho)
+    for df in ler_csv_indexado(caminho, indice, chunksize=chunksize):
+        linhas += len(filtrar_despesas(df, '2025', '1', colunas_normalizadas=True))
+    return linhas
+
+
+def bytes_membro(caminho, abrir):
+    # Só a descompressão, sem o parser do pandas
+    inicio = time.perf_counter()
+    total = 0
+    with abrir() as f:
+        while True:
+            bloco = f.read(1024 * 1024)
+            if not bloco:
+                break
+            total += len(bloco)
+    return total, time.perf_counter() - inicio
+
+
+def cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a leitura dos ZIPs via zipfile com a leitura pelo índice (mmap + zlib).")
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--chunksize', type=int, default=None)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, '2025_1T_1T2025.zip')
+        gerar_trimestre(caminho, 2025, 1, args.linhas, 1500, np.random.default_rng(42))
+
+        inicio = time.perf_counter()
+        indice = indice_trimestre(caminho)
+        print(f"índice construído em {(time.perf_counter() - inicio) * 1000:.1f} ms "
+              f"({indice['membro']}, offset {indice['offset']}, {indice['encoding']})")
+
+        with zipfile.ZipFile(caminho, 'r') as z:
+            total_zipfile, s_zipfile = bytes_membro(caminho, lambda: z.open(indice['membro']))
+        total_mmap, s_mmap = bytes_membro(caminho, lambda: indice_zip.abrir_membro(caminho, indice))
+        print(f"{'descompressão':<16}{'zipfile':>10}{s_zipfile:>10.3f} s{'mmap+zlib':>12}{s_mmap:>10.3f} s"
+              f"  ({total_mmap == total_zipfile and 'mesmos bytes' or 'DIFERENTE'})")
+
+        print(f"{'leitura':<16}{'tempo (s)':>12}{'linhas':>12}")
+        for nome, funcao in (('zipfile', leitura_zipfile), ('indexada', leitura_indexada)):
+            segundos, linhas = cronometrar(lambda: funcao(caminho, args.chunksize), args.repeticoes)
+            print(f"{nome:<16}{segundos:>12.3f}{linhas:>12,}")
+
+
+if __name__ == "__main__":
+    main()
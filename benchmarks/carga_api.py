@@ -0,0 +1,225 @@
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(RAIZ, 'src'))
+
+ROTAS_PADRAO = [
+    '/api/estatisticas',
+    '/api/estatisticas/uf',
+    '/api/operadoras?page=1&limit=10',
+    '/api/operadoras?page=1&limit=10&search=SAUDE',
+    '/api/operadoras/sugestoes?q=saude',
+]
+
+# Rotas que dependem de uma operadora existente; {registro} é resolvido na base alvo
+ROTAS_OPERADORA = [
+    '/api/operadoras/{registro}',
+    '/api/operadoras/{registro}/despesas',
+]
+
+UFS = ['SP', 'RJ', 'MG', 'RS', 'PR', 'SC', 'BA', 'PE', 'CE', 'GO', 'DF', 'ES']
+MODALIDADES = ['Medicina de Grupo', 'Cooperativa Médica', 'Seguradora Especializada em Saúde',
+               'Autogestão', 'Odontologia de Grupo', 'Filantropia']
+PALAVRAS = ['SAUDE', 'ASSISTENCIA', 'MEDICA', 'ODONTO', 'PLANO', 'VIDA', 'UNIMED', 'CLINICA', 'HOSPITAL']
+
+
+def gerar_base_sintetica(caminho_db, operadoras, trimestres, seed=42):
+    # Monta a dimensão e o fato do transformer com dados aleatórios (semente fixa) e carrega
+    # pelo mesmo caminho do pipeline (database.importar_dados)
+    import database
+    from formato import TIPOS_DESPESAS, TIPOS_OPERADORAS, salvar_tabela
+
+    rng = np.random.default_rng(seed)
+    registros = np.arange(300_000, 300_000 + operadoras, dtype='int32')
+    dimensao = pd.DataFrame({
+        'RegistroANS': registros,
+        'CNPJ': [''.join(map(str, d)) for d in rng.integers(0, 10, size=(operadoras, 14))],
+        'RazaoSocial': [' '.join(rng.choice(PALAVRAS, 3)) + f' {i}' for i in range(operadoras)],
+        'Modalidade': rng.choice(MODALIDADES, operadoras),
+        'UF': rng.choice(UFS, operadoras),
+        'CNPJ_Valido': True,
+    })
+
+    # Uma despesa por operadora e trimestre, a partir de 2020/1T
+    primeiro = 2020 * 4
+    linhas = operadoras * trimestres
+    fato = pd.DataFrame({
+        'RegistroANS': np.tile(registros, trimestres),
+        'Periodo': np.repeat(np.arange(primeiro, primeiro + trimestres, dtype='int16'), operadoras),
+        'Valor Despesas': np.round(rng.lognormal(13, 2, linhas), 2),
+    })
+
+    pasta = tempfile.mkdtemp(prefix='carga_api_')
+    base_operadoras = os.path.join(pasta, 'dim_operadoras')
+    base_despesas = os.path.join(pasta, 'fato_despesas')
+    salvar_tabela(dimensao, base_operadoras, TIPOS_OPERADORAS)
+    salvar_tabela(fato, base_despesas, TIPOS_DESPESAS)
+
+    if os.path.exists(caminho_db):
+        os.remove(caminho_db)
+    database.DB_PATH = caminho_db
+    database.OPERADORAS_DIM = base_operadoras
+    database.DESPESAS_FATO = base_despesas
+    database.SQL_SCRIPT_PATH = os.path.join(RAIZ, 'sql', 'querys.sql')
+    database.criar_tabelas()
+    database.importar_dados()
+    return linhas
+
+
+def iniciar_servidor(tipo, caminho_db, porta, workers):
+    # Sobe a API em um subprocesso apontando para a base indicada e espera responder
+    env = dict(os.environ, INTUITIVE_DB_PATH=os.path.abspath(caminho_db),
+               API_BIND=f"127.0.0.1:{porta}", API_WORKERS=str(workers), API_LOG_LEVEL='warning')
+    if tipo == 'gunicorn':
+        comando = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(RAIZ, 'src', 'api', 'gunicorn.conf.py'),
+                   '--access-logfile', '/dev/null']
+    else:
+        comando = [sys.executable, '-c', f"from app import app; app.run(port={porta}, threaded=True)"]
+        env['PYTHONPATH'] = os.path.join(RAIZ, 'src', 'api')
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=env)
+
+    url = f"http://127.0.0.1:{porta}"
+    limite = time.perf_counter() + 30
+    while time.perf_counter() < limite:
+        try:
+            with urllib.request.urlopen(url + '/', timeout=1):
+                return processo, url
+        except (urllib.error.URLError, OSError):
+            if processo.poll() is not None:
+                break
+            time.sleep(0.2)
+    processo.kill()
+    raise RuntimeError(f"Servidor '{tipo}' não respondeu em {url}")
+
+
+def parar_servidor(processo):
+    # SIGTERM = desligamento gracioso (gunicorn espera as requisições em curso)
+    processo.send_signal(signal.SIGTERM)
+    try:
+        processo.wait(timeout=35)
+    except subprocess.TimeoutExpired:
+        processo.kill()
+
+
+def resolver_rotas_operadora(base_url):
+    with urllib.request.urlopen(base_url + '/api/operadoras?page=1&limit=1', timeout=30) as resp:
+        dados = json.loads(resp.read())['data']
+    if not dados:
+        return []
+    return [rota.format(registro=dados[0]['registro_ans']) for rota in ROTAS_OPERADORA]
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def cliente(base_url, rotas, fim, latencias, erros, lock):
+    i = 0
+    while time.perf_counter() < fim:
+        rota = rotas[i % len(rotas)]
+        i += 1
+        inicio = time.perf_counter()
+        try:
+            with urllib.request.urlopen(base_url + rota, timeout=30) as resp:
+                resp.read()
+            ok = True
+        except (urllib.error.URLError, OSError):
+            ok = False
+        decorrido = time.perf_counter() - inicio
+        with lock:
+            if ok:
+                latencias[rota].append(decorrido)
+            else:
+                erros[rota] += 1
+
+
+def executar_carga(base_url, rotas, clientes, duracao):
+    latencias = defaultdict(list)
+    erros = defaultdict(int)
+    lock = threading.Lock()
+    fim = time.perf_counter() + duracao
+
+    threads = [threading.Thread(target=cliente, args=(base_url, rotas, fim, latencias, erros, lock)) for _ in range(clientes)]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencias, erros, time.perf_counter() - inicio
+
+
+def imprimir_relatorio(latencias, erros, segundos, clientes):
+    print(f"\n{clientes} clientes simultâneos, {segundos:.1f}s")
+    print(f"{'rota':<50}{'req':>8}{'req/s':>9}{'média ms':>10}{'p50 ms':>9}{'p99 ms':>9}{'erros':>7}")
+    todas = []
+    for rota in sorted(set(latencias) | set(erros)):
+        valores = latencias.get(rota, [])
+        todas.extend(valores)
+        if valores:
+            print(f"{rota:<50}{len(valores):>8}{len(valores) / segundos:>9.1f}{statistics.mean(valores) * 1000:>10.2f}"
+                  f"{percentil(valores, 50) * 1000:>9.2f}{percentil(valores, 99) * 1000:>9.2f}{erros.get(rota, 0):>7}")
+        else:
+            print(f"{rota:<50}{0:>8}{'-':>9}{'-':>10}{'-':>9}{'-':>9}{erros.get(rota, 0):>7}")
+    if todas:
+        print(f"{'TOTAL':<50}{len(todas):>8}{len(todas) / segundos:>9.1f}{statistics.mean(todas) * 1000:>10.2f}"
+              f"{percentil(todas, 50) * 1000:>9.2f}{percentil(todas, 99) * 1000:>9.2f}{sum(erros.values()):>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga simples da API com clientes concorrentes.")
+    parser.add_argument('--url', default='http://localhost:5000', help="API já em execução (sem --servidor).")
+    parser.add_argument('--clientes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--duracao', type=float, default=10.0)
+    parser.add_argument('--rota', action='append', dest='rotas', help="Rota a exercitar (repetível).")
+    parser.add_argument('--base-sintetica', metavar='CAMINHO_DB',
+                        help="Gera uma base sintética reprodutível nesse caminho antes do teste.")
+    parser.add_argument('--operadoras', type=int, default=1500)
+    parser.add_argument('--trimestres', type=int, default=12)
+    parser.add_argument('--servidor', choices=['gunicorn', 'flask'],
+                        help="Sobe a API em subprocesso (com a base sintética, se gerada).")
+    parser.add_argument('--porta', type=int, default=5055)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    caminho_db = None
+    if args.base_sintetica:
+        caminho_db = args.base_sintetica
+        linhas = gerar_base_sintetica(caminho_db, args.operadoras, args.trimestres)
+        print(f"Base sintética: {args.operadoras} operadoras, {linhas:,} despesas em {caminho_db}")
+
+    processo = None
+    base_url = args.url
+    if args.servidor:
+        caminho_db = caminho_db or os.path.join(RAIZ, 'data', 'intuitive_care.db')
+        processo, base_url = iniciar_servidor(args.servidor, caminho_db, args.porta, args.workers)
+        print(f"Servidor {args.servidor} em {base_url} ({args.workers} workers)")
+
+    try:
+        rotas = args.rotas or ROTAS_PADRAO + resolver_rotas_operadora(base_url)
+        for clientes in args.clientes:
+            latencias, erros, segundos = executar_carga(base_url, rotas, clientes, args.duracao)
+            imprimir_relatorio(latencias, erros, segundos, clientes)
+    finally:
+        if processo is not None:
+            parar_servidor(processo)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from transformer import PESOS_DV1, PESOS_DV2
+
+# Descrições no formato das demonstrações contábeis da ANS; as cinco primeiras casam com PADRAO_DESPESAS
+DESCRICOES = [
+    'EVENTOS INDENIZÁVEIS LÍQUIDOS',
+    'EVENTOS/SINISTROS CONHECIDOS OU AVISADOS',
+    'SINISTROS CONHECIDOS',
+    'DESPESAS ADMINISTRATIVAS',
+    'DESPESAS DE COMERCIALIZAÇÃO',
+    'CONTRAPRESTAÇÕES EFETIVAS DE PLANO DE ASSISTÊNCIA À SAÚDE',
+    'RECEITAS FINANCEIRAS',
+    'APLICAÇÕES FINANCEIRAS',
+    'PROVISÕES TÉCNICAS DE OPERAÇÕES DE ASSISTÊNCIA À SAÚDE',
+    'TRIBUTOS E ENCARGOS SOCIAIS A RECOLHER',
+]
+MODALIDADES = ['Medicina de Grupo', 'Cooperativa Médica', 'Seguradora Especializada em Saúde',
+               'Autogestão', 'Odontologia de Grupo', 'Cooperativa Odontológica', 'Filantropia']
+UFS = ['SP', 'RJ', 'MG', 'RS', 'PR', 'SC', 'BA', 'PE', 'CE', 'GO', 'DF', 'ES', 'PA', 'AM', 'MT']
+PALAVRAS = ['SAÚDE', 'ASSISTÊNCIA', 'MÉDICA', 'ODONTO', 'PLANO', 'VIDA', 'UNIMED', 'CLÍNICA', 'HOSPITAL', 'BEM-ESTAR']
+
+REGISTRO_INICIAL = 300000
+TAMANHO_BLOCO = 500_000  # linhas geradas e gravadas por vez (memória constante em qualquer escala)
+FRACAO_CNPJ_INVALIDO = 0.05
+
+
+def gerar_cnpjs(quantidade, rng, fracao_invalidos=FRACAO_CNPJ_INVALIDO):
+    # 12 dígitos aleatórios + dígitos verificadores corretos; uma fração recebe o último dígito trocado
+    digitos = rng.integers(0, 10, size=(quantidade, 14))
+    resto = (digitos[:, :12] @ PESOS_DV1) % 11
+    digitos[:, 12] = np.where(resto < 2, 0, 11 - resto)
+    resto = (digitos[:, :13] @ PESOS_DV2) % 11
+    digitos[:, 13] = np.where(resto < 2, 0, 11 - resto)
+    invalidos = rng.random(quantidade) < fracao_invalidos
+    digitos[invalidos, 13] = (digitos[invalidos, 13] + 1) % 10
+    return [''.join(map(str, linha)) for linha in digitos]
+
+
+def gerar_cadastro(caminho, operadoras, rng):
+    registros = np.arange(REGISTRO_INICIAL, REGISTRO_INICIAL + operadoras)
+    nomes = [' '.join(rng.choice(PALAVRAS, 2)) + f' {r} LTDA' for r in registros]
+    df = pd.DataFrame({
+        'Registro_ANS': registros,
+        'CNPJ': gerar_cnpjs(operadoras, rng),
+        'Razao_Social': nomes,
+        'Nome_Fantasia': [f'FANT {r}' for r in registros],
+        'Modalidade': rng.choice(MODALIDADES, operadoras),
+        'UF': rng.choice(UFS, operadoras),
+        'Data_Registro_ANS': '2001-01-01',
+    })
+    df.to_csv(caminho, sep=';', index=False, encoding='latin1')
+    return caminho
+
+
+def gerar_trimestre(caminho_zip, ano, trimestre, linhas, operadoras, rng, tamanho_bloco=TAMANHO_BLOCO):
+    # Escreve o CSV direto no ZIP, em blocos: latin1, ';', valores com vírgula decimal e tudo entre aspas
+    descricoes = np.array(DESCRICOES, dtype=object)
+    nome_csv = f"{trimestre}T{ano}.csv"
+    data = f"{ano}-{(trimestre - 1) * 3 + 1:02d}-01"
+
+    # Data fixa no cabeçalho do membro: o ZIP não muda entre gerações com a mesma semente
+    info = zipfile.ZipInfo(nome_csv, date_time=(ano, (trimestre - 1) * 3 + 1, 1, 0, 0, 0))
+    info.compress_type = zipfile.ZIP_DEFLATED
+
+    with zipfile.ZipFile(caminho_zip, 'w') as z:
+        with z.open(info, 'w', force_zip64=True) as bruto:
+            texto = io.TextIOWrapper(bruto, encoding='latin1', newline='')
+            texto.write('"DATA";"REG_ANS";"CD_CONTA_CONTABIL";"DESCRICAO";"VL_SALDO_INICIAL";"VL_SALDO_FINAL"\n')
+            for inicio in range(0, linhas, tamanho_bloco):
+                n = min(tamanho_bloco, linhas - inicio)
+                bloco = pd.DataFrame({
+                    'DATA': data,
+                    'REG_ANS': rng.integers(REGISTRO_INICIAL, REGISTRO_INICIAL + operadoras, n),
+                    'CD_CONTA_CONTABIL': rng.integers(1000, 99999, n),
+                    'DESCRICAO': descricoes[rng.integers(0, len(descricoes), n)],
+                    'VL_SALDO_INICIAL': 0,
+                    'VL_SALDO_FINAL': np.round(rng.lognormal(11, 2, n), 2),
+                })
+                bloco.to_csv(texto, sep=';', header=False, index=False, decimal=',',
+                             float_format='%.2f', quoting=csv.QUOTE_ALL)
+            texto.flush()
+            texto.detach()
+    return caminho_zip
+
+
+def periodos(trimestres, ano_final=2025, trimestre_final=4):
+    fim = ano_final * 4 + trimestre_final - 1
+    return [(p // 4, p % 4 + 1) for p in range(fim - trimestres + 1, fim + 1)]
+
+
+def gerar_dados(pasta_raw, linhas, trimestres=3, operadoras=1500, seed=42):
+    # Mesma semente e parâmetros => mesmos arquivos, byte a byte
+    os.makedirs(pasta_raw, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    gerar_cadastro(os.path.join(pasta_raw, 'cadastro_operadoras.csv'), operadoras, rng)
+
+    por_trimestre = [linhas // trimestres + (1 if i < linhas % trimestres else 0) for i in range(trimestres)]
+    arquivos = []
+    for (ano, trimestre), n in zip(periodos(trimestres), por_trimestre):
+        caminho = os.path.join(pasta_raw, f"{ano}_{trimestre}T_{trimestre}T{ano}.zip")
+        arquivos.append(gerar_trimestre(caminho, ano, trimestre, n, operadoras, rng))
+
+    parametros = {'linhas': linhas, 'trimestres': trimestres, 'operadoras': operadoras, 'seed': seed}
+    with open(os.path.join(pasta_raw, 'sintetico.json'), 'w', encoding='utf-8') as f:
+        json.dump(parametros, f, indent=2)
+    return arquivos
+
+
+def dados_atuais(pasta_raw):
+    # Parâmetros da última geração nessa pasta (para reaproveitar os arquivos entre execuções)
+    try:
+        with open(os.path.join(pasta_raw, 'sintetico.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera ZIPs trimestrais e cadastro sintéticos no formato da ANS.")
+    parser.add_argument('--destino', default='data/raw')
+    parser.add_argument('--linhas', type=int, default=1_000_000, help="Total de linhas somando todos os trimestres.")
+    parser.add_argument('--trimestres', type=int, default=3)
+    parser.add_argument('--operadoras', type=int, default=1500)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    arquivos = gerar_dados(args.destino, args.linhas, args.trimestres, args.operadoras, args.seed)
+    tamanho = sum(os.path.getsize(a) for a in arquivos) / (1024 * 1024)
+    print(f"{len(arquivos)} ZIPs ({args.linhas:,} linhas, {tamanho:.1f} MB) + cadastro em {args.destino} "
+          f"({time.perf_counter() - inicio:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import time
+from datetime import datetime
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(RAIZ, 'src'))
+sys.path.insert(0, os.path.join(RAIZ, 'src', 'api'))
+
+from dados_sinteticos import dados_atuais, gerar_dados
+
+TOLERANCIA_PADRAO = 0.25
+# Diferenças absolutas abaixo disso são ruído de medição, não regressão
+DIFERENCA_MINIMA = {'s': 0.05, 'ms': 0.5}
+
+ROTAS = [
+    '/api/estatisticas',
+    '/api/estatisticas/uf',
+    '/api/operadoras?page=1&limit=10',
+    '/api/operadoras?page=50&limit=10',
+    '/api/operadoras?page=1&limit=10&search=saude',
+    '/api/operadoras/sugestoes?q=unimed',
+    '/api/operadoras/{registro}',
+    '/api/operadoras/{registro}/despesas',
+    '/api/despesas/lote?registros={registros}',
+    '/api/analises/crescimento?registro_ans={registro}',
+    '/api/analises/top-crescimento?n=10',
+    '/api/despesas/exportar?formato=csv&uf=SP',
+]
+
+
+def preparar_area(pasta, linhas, trimestres, operadoras, seed):
+    # Área de trabalho isolada com a mesma estrutura do projeto (os módulos usam caminhos relativos)
+    raw = os.path.join(pasta, 'data', 'raw')
+    parametros = {'linhas': linhas, 'trimestres': trimestres, 'operadoras': operadoras, 'seed': seed}
+    if dados_atuais(raw) != parametros:
+        print(f"Gerando dados sintéticos ({linhas:,} linhas)...")
+        shutil.rmtree(os.path.join(pasta, 'data'), ignore_errors=True)
+        gerar_dados(raw, linhas, trimestres, operadoras, seed)
+    os.makedirs(os.path.join(pasta, 'data', 'processed'), exist_ok=True)
+    os.makedirs(os.path.join(pasta, 'sql'), exist_ok=True)
+    shutil.copy(os.path.join(RAIZ, 'sql', 'querys.sql'), os.path.join(pasta, 'sql', 'querys.sql'))
+    os.chdir(pasta)
+
+
+def cronometrar(funcao, repeticoes, silencioso=True):
+    tempos = []
+    for _ in range(repeticoes):
+        saida = io.StringIO() if silencioso else sys.stdout
+        with contextlib.redirect_stdout(saida):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def medir_pipeline(args):
+    import database
+    import processor
+    import transformer
+
+    def carga():
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+        database.criar_tabelas()
+        database.importar_dados()
+
+    etapas = [
+        ('processar_arquivos', lambda: processor.processar_arquivos(streaming=args.streaming, workers=args.workers,
+                                                                    formato=args.formato)),
+        ('transformer.main', lambda: transformer.main(formato=args.formato)),
+        ('importar_dados', carga),
+    ]
+    medidas = {}
+    for nome, funcao in etapas:
+        segundos = cronometrar(funcao, args.repeticoes, silencioso=not args.verboso)
+        medidas[nome] = {'valor': round(segundos, 4), 'unidade': 's'}
+        print(f"  {nome:<50}{segundos:>10.3f} s")
+    return medidas
+
+
+def medir_api(requisicoes):
+    # Cliente de teste do Flask (sem rede): mede consulta + serialização, com o cache de respostas limpo a cada chamada
+    os.environ['INTUITIVE_DB_PATH'] = os.path.abspath('data/intuitive_care.db')
+    import app as api
+
+    cliente = api.app.test_client()
+    registros = [op['registro_ans'] for op in cliente.get('/api/operadoras?page=1&limit=20').get_json()['data']]
+    medidas = {}
+    for modelo in ROTAS:
+        rota = modelo.format(registro=registros[0], registros=','.join(registros))
+        cliente.get(rota).get_data()  # aquecimento: conexão do pool e páginas do banco em cache
+        latencias = []
+        for _ in range(requisicoes):
+            api.cache_respostas.limpar()
+            api.cache_contagens.clear()
+            inicio = time.perf_counter()
+            resposta = cliente.get(rota)
+            resposta.get_data()
+            latencias.append(time.perf_counter() - inicio)
+            if resposta.status_code != 200:
+                raise RuntimeError(f"{rota} retornou {resposta.status_code}")
+        latencias.sort()
+        p50 = statistics.median(latencias) * 1000
+        p99 = latencias[min(len(latencias) - 1, int(round(0.99 * (len(latencias) - 1))))] * 1000
+        medidas[f"GET {modelo}"] = {'valor': round(p50, 3), 'unidade': 'ms', 'p99_ms': round(p99, 3)}
+        print(f"  {modelo:<50}{p50:>10.2f} ms  (p99 {p99:.2f} ms)")
+    return medidas
+
+
+def comparar(atual, baseline, tolerancia):
+    # Maior = pior para todas as medidas (tempos); regressão se passar da tolerância relativa
+    print(f"\n{'medida':<60}{'baseline':>12}{'atual':>12}{'razão':>9}")
+    regressoes = []
+    for nome, medida in atual['medidas'].items():
+        base = baseline['medidas'].get(nome)
+        if base is None or not base['valor']:
+            print(f"{nome:<60}{'-':>12}{medida['valor']:>12.3f}{'-':>9}")
+            continue
+        razao = medida['valor'] / base['valor']
+        significativa = abs(medida['valor'] - base['valor']) >= DIFERENCA_MINIMA.get(medida['unidade'], 0)
+        marca = ''
+        if razao > 1 + tolerancia and significativa:
+            marca = '  <- regressão'
+            regressoes.append(nome)
+        elif razao < 1 - tolerancia and significativa:
+            marca = '  <- melhora'
+        print(f"{nome:<60}{base['valor']:>12.3f}{medida['valor']:>12.3f}{razao:>9.2f}{marca}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline e da API sobre dados sintéticos reprodutíveis.")
+    parser.add_argument('--linhas', type=int, default=1_000_000, help="Linhas nos ZIPs sintéticos (10k a 50M).")
+    parser.add_argument('--trimestres', type=int, default=3)
+    parser.add_argument('--operadoras', type=int, default=1500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pasta', default=os.path.join(RAIZ, 'benchmarks', '.area'),
+                        help="Área de trabalho (os dados gerados são reaproveitados entre execuções).")
+    parser.add_argument('--repeticoes', type=int, default=3, help="Execuções de cada etapa do pipeline (vale a menor).")
+    parser.add_argument('--requisicoes', type=int, default=100, help="Requisições por rota da API.")
+    parser.add_argument('--streaming', action='store_true')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--formato', default='parquet')
+    parser.add_argument('--so-api', action='store_true', help="Mede só a API (usa o banco já carregado na área).")
+    parser.add_argument('--saida', help="Grava os resultados em JSON (ex.: baseline.json).")
+    parser.add_argument('--baseline', help="Compara com um JSON gravado antes por --saida.")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO, help="Variação relativa aceita (0.25 = 25%%).")
+    parser.add_argument('--verboso', action='store_true', help="Mostra a saída das etapas do pipeline.")
+    args = parser.parse_args()
+
+    saida = os.path.abspath(args.saida) if args.saida else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    preparar_area(os.path.abspath(args.pasta), args.linhas, args.trimestres, args.operadoras, args.seed)
+
+    resultado = {
+        'metadados': {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'linhas': args.linhas, 'trimestres': args.trimestres, 'operadoras': args.operadoras, 'seed': args.seed,
+            'streaming': args.streaming, 'workers': args.workers, 'formato': args.formato,
+            'python': platform.python_version(), 'plataforma': platform.platform(), 'cpus': os.cpu_count(),
+        },
+        'medidas': {},
+    }
+
+    if not args.so_api:
+        print("Pipeline (menor tempo de", args.repeticoes, "execuções):")
+        resultado['medidas'].update(medir_pipeline(args))
+    print(f"API (mediana de {args.requisicoes} requisições, cache limpo):")
+    resultado['medidas'].update(medir_api(args.requisicoes))
+
+    # Regressão de plano (absoluta, sem baseline): nenhuma consulta pode voltar a ler uma tabela inteira
+    import database
+    print("\nPlanos de consulta:")
+    varreduras = database.verificar_planos(detalhado=False)
+    resultado['varreduras'] = [{'consulta': nome, 'plano': detalhe} for nome, detalhe in varreduras]
+
+    if saida:
+        with open(saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados: {saida}")
+
+    falhou = bool(varreduras)
+    if varreduras:
+        print(f"\n{len(varreduras)} varredura(s) de tabela nos planos de consulta")
+    if baseline:
+        with open(baseline, 'r', encoding='utf-8') as f:
+            regressoes = comparar(resultado, json.load(f), args.tolerancia)
+        if regressoes:
+            print(f"\n{len(regressoes)} medida(s) acima da tolerância de {args.tolerancia:.0%}")
+            falhou = True
+    if falhou:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
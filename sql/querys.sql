@@ -15,15 +15,101 @@ CREATE TABLE IF NOT EXISTS despesas (
     id INTEGER PRIMARY KEY AUTOINCREMENT, -- Identificador único da linha
     registro_ans VARCHAR(20),
     ano INTEGER,
-    trimestre VARCHAR(10),
+    trimestre INTEGER, -- 1 a 4
     valor_despesas DECIMAL(15, 2),
     descricao VARCHAR(255),
     FOREIGN KEY (registro_ans) REFERENCES operadoras(registro_ans)
 );
 
--- Índices para performance
-CREATE INDEX IF NOT EXISTS idx_despesas_ans ON despesas(registro_ans);
-CREATE INDEX IF NOT EXISTS idx_despesas_tempo ON despesas(ano, trimestre);
+-- Metadados da carga (ex.: geracao, incrementada a cada importação)
+CREATE TABLE IF NOT EXISTS metadados (
+    chave VARCHAR(50) PRIMARY KEY,
+    valor VARCHAR(255)
+);
+
+-- Índice de busca textual (FTS5 trigram) sobre razão social e CNPJ, já normalizados
+-- (sem acentos, minúsculas, CNPJ só com dígitos). Reconstruído pelo database.py a cada carga.
+CREATE VIRTUAL TABLE IF NOT EXISTS operadoras_busca USING fts5(
+    registro_ans UNINDEXED,
+    razao_social_norm,
+    cnpj_digitos,
+    tokenize = 'trigram'
+);
+
+-- CNPJ só com dígitos, para busca por prefixo usando índice
+CREATE TABLE IF NOT EXISTS operadoras_cnpj (
+    cnpj_digitos VARCHAR(14),
+    registro_ans VARCHAR(20),
+    PRIMARY KEY (cnpj_digitos, registro_ans)
+) WITHOUT ROWID;
+
+-- Agregados materializados (recalculados pelo database.py a cada carga, na mesma transação).
+-- As colunas de soma ficam sem tipo declarado para guardar o resultado do SUM/AVG exatamente como calculado.
+CREATE TABLE IF NOT EXISTS resumo_geral (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_geral,
+    media_trimestral,
+    linhas INTEGER,
+    geracao INTEGER -- geração (metadados) em que o resumo foi calculado
+);
+
+CREATE TABLE IF NOT EXISTS resumo_operadoras (
+    registro_ans VARCHAR(20) PRIMARY KEY,
+    razao_social VARCHAR(255),
+    uf VARCHAR(2),
+    total,
+    linhas INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS resumo_uf_trimestre (
+    uf VARCHAR(2),
+    ano INTEGER,
+    trimestre INTEGER,
+    total,
+    PRIMARY KEY (uf, ano, trimestre)
+);
+
+CREATE TABLE IF NOT EXISTS resumo_top_operadoras (
+    posicao INTEGER PRIMARY KEY,
+    razao_social VARCHAR(255),
+    total
+);
+
+-- Séries trimestrais com variações pré-calculadas (usadas pela /api/analises).
+-- periodo = ano * 4 + trimestre - 1 é contínuo entre anos: o trimestre anterior é periodo - 1
+-- e o mesmo trimestre do ano anterior é periodo - 4. Variações são frações (0.1 = +10%).
+CREATE TABLE IF NOT EXISTS serie_operadoras (
+    registro_ans VARCHAR(20),
+    periodo INTEGER,
+    ano INTEGER,
+    trimestre INTEGER,
+    total,
+    variacao_trimestral REAL, -- vs. trimestre anterior (QoQ)
+    variacao_anual REAL,      -- vs. mesmo trimestre do ano anterior (YoY)
+    media_movel_4t REAL,      -- média dos trimestres presentes entre periodo - 3 e periodo
+    PRIMARY KEY (registro_ans, periodo)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS serie_uf (
+    uf VARCHAR(2),
+    periodo INTEGER,
+    ano INTEGER,
+    trimestre INTEGER,
+    total,
+    variacao_trimestral REAL,
+    variacao_anual REAL,
+    media_movel_4t REAL,
+    PRIMARY KEY (uf, periodo)
+) WITHOUT ROWID;
+
+-- Índices para performance. Os de despesas são de cobertura: as consultas por operadora e por
+-- período (inclusive o ranking por valor) são respondidas só pelo índice, sem ler as linhas da tabela.
+CREATE INDEX IF NOT EXISTS idx_despesas_operadora_periodo ON despesas(registro_ans, ano, trimestre, valor_despesas);
+CREATE INDEX IF NOT EXISTS idx_despesas_periodo_valor ON despesas(ano, trimestre, valor_despesas DESC, registro_ans);
+CREATE INDEX IF NOT EXISTS idx_operadoras_cnpj ON operadoras(cnpj);
+CREATE INDEX IF NOT EXISTS idx_operadoras_uf ON operadoras(uf, registro_ans);
+CREATE INDEX IF NOT EXISTS idx_operadoras_razao_social ON operadoras(razao_social, registro_ans);
+CREATE INDEX IF NOT EXISTS idx_serie_operadoras_periodo ON serie_operadoras(periodo);
 
 -- ============================================================================
 -- 3.4. QUERIES ANALÍTICAS
@@ -0,0 +1,74 @@
+import json
+import os
+import sqlite3
+
+try:
+    import duckdb
+    DUCKDB_DISPONIVEL = True
+except ImportError:
+    DUCKDB_DISPONIVEL = False
+
+# Cópia colunar opcional das despesas (database.py --parquet-analitico) para o backend DuckDB da API:
+# <banco>_parquet/operadoras.parquet e despesas/<ano>_<trimestre>T.parquet, um arquivo por trimestre
+# (a carga incremental troca só os trimestres alterados). geracao.json diz de qual carga é a cópia.
+CHAVE_PARQUET = 'parquet_analitico'
+ARQUIVO_GERACAO = 'geracao.json'
+
+# Somas de dinheiro em centavos inteiros: exatas e independentes da ordem de leitura, então SQLite
+# e DuckDB (que agrega em paralelo) chegam ao mesmo total; a divisão por 100 é feita uma vez no fim
+SOMA_CENTAVOS = "SUM(CAST(ROUND(d.valor_despesas * 100) AS BIGINT))"
+
+
+def pasta_parquet(caminho_db):
+    return f"{os.path.splitext(caminho_db)[0]}_parquet"
+
+
+def caminho_operadoras(pasta):
+    return os.path.join(pasta, 'operadoras.parquet')
+
+
+def pasta_despesas(pasta):
+    return os.path.join(pasta, 'despesas')
+
+
+def caminho_trimestre(pasta, ano, trimestre):
+    return os.path.join(pasta_despesas(pasta), f"{int(ano)}_{int(trimestre)}T.parquet")
+
+
+def parquet_ativo(conn):
+    # Marcado em metadados pela carga; a incremental mantém a cópia em dia se estiver marcado
+    try:
+        return conn.execute("SELECT 1 FROM main.metadados WHERE chave = ?", (CHAVE_PARQUET,)).fetchone() is not None
+    except sqlite3.OperationalError:
+        return False
+
+
+def ler_geracao(pasta):
+    try:
+        with open(os.path.join(pasta, ARQUIVO_GERACAO), 'r', encoding='utf-8') as f:
+            return json.load(f)['geracao']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def gravar_geracao(pasta, geracao):
+    caminho = os.path.join(pasta, ARQUIVO_GERACAO)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'geracao': geracao}, f)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def _literal(caminho):
+    return "'" + caminho.replace("'", "''") + "'"
+
+
+def conectar_duckdb(pasta, threads=None):
+    # Banco DuckDB em memória com views sobre os Parquet: os arquivos são relidos a cada consulta,
+    # então trimestres trocados por uma carga aparecem sem reabrir a conexão
+    conn = duckdb.connect()
+    if threads:
+        conn.execute(f"SET threads = {int(threads)}")
+    arquivos_despesas = os.path.join(pasta_despesas(pasta), '*.parquet')
+    conn.execute(f"CREATE VIEW despesas AS SELECT * FROM read_parquet({_literal(arquivos_despesas)})")
+    conn.execute(f"CREATE VIEW operadoras AS SELECT * FROM read_parquet({_literal(caminho_operadoras(pasta))})")
+    return conn
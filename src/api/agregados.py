@@ -0,0 +1,193 @@
+import logging
+import sqlite3
+import threading
+import time
+
+from analitico import DUCKDB_DISPONIVEL, SOMA_CENTAVOS, conectar_duckdb, ler_geracao, pasta_parquet
+from conexoes import geracao_dados
+from metricas import registrar_sql
+
+if DUCKDB_DISPONIVEL:
+    import duckdb
+
+BACKENDS_AGREGADOS = ('sqlite', 'duckdb')
+TOP_ESTATISTICAS = 5
+
+logger = logging.getLogger(__name__)
+
+
+def _reais(centavos):
+    # Mesma conta do SQLite (SOMA_CENTAVOS / 100.0): a soma inteira exata dividida uma única vez
+    return None if centavos is None else centavos / 100
+
+
+class AgregadosSQLite:
+    # Rotas agregadas pelo SQLite: resumos materializados pela carga ou, se desatualizados, cálculo direto
+    nome = 'sqlite'
+
+    def _resumo(self, conn):
+        # Só usa os agregados materializados se foram calculados na geração atual dos dados
+        try:
+            resumo = conn.execute("SELECT total_geral, media_trimestral, geracao FROM resumo_geral WHERE id = 1").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        if resumo is None or resumo['geracao'] != geracao_dados(conn):
+            return None
+        return resumo
+
+    def estatisticas(self, conn):
+        resumo = self._resumo(conn)
+        if resumo is not None:
+            top = conn.execute(
+                "SELECT razao_social, total FROM resumo_top_operadoras ORDER BY posicao LIMIT ?", (TOP_ESTATISTICAS,)
+            ).fetchall()
+            total_geral, media = resumo['total_geral'], resumo['media_trimestral']
+        else:
+            # Banco sem resumos atualizados (ex.: carga antiga): calcula direto sobre despesas
+            total_geral, media = conn.execute(f"""
+                SELECT COALESCE({SOMA_CENTAVOS} / 100.0, 0), COALESCE({SOMA_CENTAVOS} / 100.0 / COUNT(d.valor_despesas), 0)
+                FROM despesas d
+            """).fetchone()
+            top = conn.execute(f"""
+                SELECT o.razao_social, {SOMA_CENTAVOS} / 100.0 as total
+                FROM despesas d
+                JOIN operadoras o ON d.registro_ans = o.registro_ans
+                GROUP BY o.razao_social
+                ORDER BY total DESC, o.razao_social
+                LIMIT ?
+            """, (TOP_ESTATISTICAS,)).fetchall()
+
+        return {
+            'total_geral': total_geral,
+            'media_trimestral': media,
+            'top_operadoras': [dict(row) for row in top]
+        }
+
+    def estatisticas_uf(self, conn, ano=None, trimestre=None):
+        filtros = [(coluna, valor) for coluna, valor in (('ano', ano), ('trimestre', trimestre)) if valor is not None]
+        params = [valor for _, valor in filtros]
+
+        if self._resumo(conn) is not None:
+            where = ''.join(f"AND {coluna} = ? " for coluna, _ in filtros)
+            query = f"SELECT uf, ano, trimestre, total FROM resumo_uf_trimestre WHERE 1=1 {where}"
+        else:
+            # Banco sem resumos atualizados: mesmo cálculo da carga, direto sobre despesas
+            where = ''.join(f"AND d.{coluna} = ? " for coluna, _ in filtros)
+            query = f"""
+                SELECT o.uf AS uf, d.ano AS ano, d.trimestre AS trimestre, {SOMA_CENTAVOS} / 100.0 AS total
+                FROM despesas d
+                JOIN operadoras o ON d.registro_ans = o.registro_ans
+                WHERE 1=1 {where}
+                GROUP BY o.uf, d.ano, d.trimestre
+            """
+        rows = conn.execute(query + " ORDER BY ano DESC, trimestre DESC, total DESC, uf", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def fechar(self):
+        pass
+
+
+class AgregadosDuckDB:
+    # As mesmas rotas calculadas pelo DuckDB sobre a cópia Parquet (database.py --parquet-analitico), com
+    # o mesmo JSON do SQLite: somas em centavos e os mesmos critérios de desempate (NULLs como no SQLite).
+    # Só responde se a cópia for da geração atual do banco; senão, ou em erro do DuckDB, usa o SQLite.
+    nome = 'duckdb'
+
+    def __init__(self, caminho_db, threads=None, reserva=None):
+        self.pasta = pasta_parquet(caminho_db)
+        self.threads = threads
+        self.reserva = reserva or AgregadosSQLite()
+        self._conn = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._verificada = None  # (geração do SQLite, cópia Parquet da mesma geração?)
+
+    def _cursor(self):
+        # Uma conexão DuckDB por processo; cada thread usa um cursor próprio
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            with self._lock:
+                if self._conn is None:
+                    self._conn = conectar_duckdb(self.pasta, self.threads)
+                cursor = self._local.cursor = self._conn.cursor()
+        return cursor
+
+    def _em_dia(self, conn):
+        # O Parquet é gravado antes do COMMIT da carga: basta reler geracao.json quando a geração do SQLite muda
+        geracao = geracao_dados(conn)
+        verificada = self._verificada
+        if verificada is None or verificada[0] != geracao:
+            verificada = self._verificada = (geracao, ler_geracao(self.pasta) == geracao)
+        return verificada[1]
+
+    def _consultar(self, conn, calcular, reserva):
+        if not self._em_dia(conn):
+            return reserva()
+        inicio = time.perf_counter()
+        try:
+            resultado = calcular(self._cursor())
+        except duckdb.Error as e:
+            logger.warning(f"DuckDB falhou, respondendo pelo SQLite: {e}")
+            return reserva()
+        # Consultas do DuckDB entram no tempo de SQL da requisição (/metrics)
+        registrar_sql(time.perf_counter() - inicio)
+        return resultado
+
+    def estatisticas(self, conn):
+        return self._consultar(conn, self._estatisticas, lambda: self.reserva.estatisticas(conn))
+
+    def _estatisticas(self, cursor):
+        centavos, valores = cursor.execute(f"SELECT {SOMA_CENTAVOS}, COUNT(d.valor_despesas) FROM despesas d").fetchone()
+        top = cursor.execute(f"""
+            SELECT o.razao_social, {SOMA_CENTAVOS} AS centavos
+            FROM despesas d
+            JOIN operadoras o ON d.registro_ans = o.registro_ans
+            GROUP BY o.razao_social
+            ORDER BY centavos DESC NULLS LAST, o.razao_social NULLS FIRST
+            LIMIT ?
+        """, [TOP_ESTATISTICAS]).fetchall()
+
+        return {
+            'total_geral': 0 if centavos is None else _reais(centavos),
+            'media_trimestral': 0 if centavos is None else centavos / 100 / valores,
+            'top_operadoras': [{'razao_social': razao_social, 'total': _reais(c)} for razao_social, c in top]
+        }
+
+    def estatisticas_uf(self, conn, ano=None, trimestre=None):
+        return self._consultar(conn, lambda cursor: self._estatisticas_uf(cursor, ano, trimestre),
+                               lambda: self.reserva.estatisticas_uf(conn, ano, trimestre))
+
+    def _estatisticas_uf(self, cursor, ano, trimestre):
+        where, params = "", []
+        if ano is not None:
+            where += "AND d.ano = ? "
+            params.append(ano)
+        if trimestre is not None:
+            where += "AND d.trimestre = ? "
+            params.append(trimestre)
+        rows = cursor.execute(f"""
+            SELECT o.uf, d.ano, d.trimestre, {SOMA_CENTAVOS} AS centavos
+            FROM despesas d
+            JOIN operadoras o ON d.registro_ans = o.registro_ans
+            WHERE 1=1 {where}
+            GROUP BY o.uf, d.ano, d.trimestre
+            ORDER BY d.ano DESC, d.trimestre DESC, centavos DESC NULLS LAST, o.uf NULLS FIRST
+        """, params).fetchall()
+        return [{'uf': uf, 'ano': a, 'trimestre': t, 'total': _reais(c)} for uf, a, t, c in rows]
+
+    def fechar(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        self._local = threading.local()
+
+
+def criar_agregados(backend, caminho_db, threads=None):
+    if backend not in BACKENDS_AGREGADOS:
+        raise ValueError(f"Backend de agregados deve ser um de: {', '.join(BACKENDS_AGREGADOS)}")
+    if backend == 'duckdb':
+        if DUCKDB_DISPONIVEL:
+            return AgregadosDuckDB(caminho_db, threads=threads)
+        logger.warning("duckdb não instalado: agregados respondidos pelo SQLite")
+    return AgregadosSQLite()
@@ -1,12 +1,51 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, g, Response, stream_with_context
 from flask_cors import CORS
-import sqlite3
 import os
+import sys
+import re
+import time
+import base64
+import json
+import sqlite3
+import functools
+import hashlib
+from conexoes import PoolConexoes, PoolEsgotado
+from cache import CacheRespostas, MonitorGeracao
+from compressao import TAMANHO_MINIMO, comprimir, comprimir_stream, escolher_codificacao
+from exportacao import FORMATOS_EXPORTACAO, GERADORES_EXPORTACAO, PARQUET_DISPONIVEL
+from metricas import LIMITE_CONSULTA_LENTA_MS, ConexaoInstrumentada, RegistroMetricas, instrumentar
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agregados import criar_agregados
+from particoes import anexar_particoes
+from texto import normalizar_texto, somente_digitos
 
 app = Flask(__name__)
 CORS(app)
 
-DB_PATH = os.path.join(os.getcwd(), "data/intuitive_care.db")  # usar arquivo .db existente
+# usar arquivo .db existente; INTUITIVE_DB_PATH permite apontar para outra base (ex.: sintética no teste de carga)
+DB_PATH = os.environ.get("INTUITIVE_DB_PATH", os.path.join(os.getcwd(), "data/intuitive_care.db"))
+
+# Latência, SQL, serialização e linhas por rota em /metrics; consultas acima de INTUITIVE_SQL_LENTA_MS vão para o log com o plano
+registro_metricas = RegistroMetricas(
+    limite_consulta_lenta_ms=float(os.environ.get("INTUITIVE_SQL_LENTA_MS", LIMITE_CONSULTA_LENTA_MS)))
+instrumentar(app, registro_metricas)
+
+pool = PoolConexoes(DB_PATH, ao_conectar=anexar_particoes, fabrica=ConexaoInstrumentada)
+monitor_geracao = MonitorGeracao(pool)
+cache_respostas = CacheRespostas()
+# Rotas agregadas (/api/estatisticas*): 'sqlite' (resumos materializados) ou 'duckdb' (Parquet do database.py --parquet-analitico)
+agregados = criar_agregados(os.environ.get("INTUITIVE_BACKEND_AGREGADOS", "sqlite"), DB_PATH,
+                            threads=os.environ.get("INTUITIVE_DUCKDB_THREADS"))
+
+MAX_CACHE_CONTAGENS = 1024
+SUGESTOES_ORCAMENTO_MS = 8
+SUGESTOES_LIMITE_PADRAO = 8
+SUGESTOES_LIMITE_MAX = 20
+MAX_REGISTROS_LOTE = 1000
+TAMANHO_FETCH_LOTE = 2000
+TAMANHO_BLOCO_NDJSON = 64 * 1024
+cache_contagens = {}
 
 @app.route('/')
 def home():
@@ -20,60 +59,216 @@ def home():
     })
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Uma conexão do pool por requisição, devolvida no teardown mesmo se a rota lançar exceção
+    if 'db' not in g:
+        g.db = pool.obter()
+    return g.db
+
+@app.errorhandler(PoolEsgotado)
+def pool_esgotado(e):
+    # Todas as conexões em uso até o timeout do pool: o cliente pode repetir em seguida
+    app.logger.warning(f"{request.full_path}: {e}")
+    resposta = jsonify({'error': 'Servidor ocupado, tente novamente'})
+    resposta.headers['Retry-After'] = '1'
+    return resposta, 503
+
+@app.teardown_appcontext
+def devolver_conexao(exc):
+    conn = g.pop('db', None)
+    if conn is not None:
+        pool.devolver(conn)
+
+def codificar_cursor(posicao):
+    return base64.urlsafe_b64encode(json.dumps(posicao).encode('utf-8')).decode('ascii')
+
+def decodificar_cursor(cursor):
+    posicao = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    if not isinstance(posicao, dict) or not ({'r', 'o'} & set(posicao)):
+        raise ValueError(cursor)
+    return posicao
+
+def chave_busca(search):
+    # Identifica no cursor a busca (e com ela a ordenação) para a qual ele foi emitido
+    return hashlib.sha1(search.encode('utf-8')).hexdigest()[:12] if search else ''
+
+def termo_fts(texto):
+    # Frase entre aspas: o trigram casa a substring em qualquer posição
+    return '"' + texto.replace('"', '""') + '"'
+
+def montar_busca(search):
+    # Retorna (origem, where, params, ranqueada)
+    if not search:
+        return "operadoras o", "", [], False
+
+    digitos = somente_digitos(search)
+    if digitos and re.fullmatch(r'[0-9.\-/\s]+', search):
+        # CNPJ digitado (com ou sem máscara): busca por prefixo no índice de dígitos
+        return ("operadoras o",
+                "AND o.registro_ans IN (SELECT registro_ans FROM operadoras_cnpj WHERE cnpj_digitos >= ? AND cnpj_digitos < ?) ",
+                [digitos, digitos + ':'], False)
+
+    normalizado = normalizar_texto(search)
+    if len(normalizado) >= 3:
+        return ("operadoras o JOIN (SELECT registro_ans, rank FROM operadoras_busca WHERE razao_social_norm MATCH ?) b "
+                "ON b.registro_ans = o.registro_ans",
+                "", [termo_fts(normalizado)], True)
+
+    # Termos curtos demais para trigramas
+    term = f"%{search}%"
+    return "operadoras o", "AND (o.razao_social LIKE ? OR o.cnpj LIKE ?) ", [term, term], False
+
+def contar_operadoras(conn, origem, where, params, search):
+    # COUNT(*) só roda de novo para um termo de busca depois de uma nova carga (geração)
+    geracao = monitor_geracao.atual()
+    chave = (geracao, search)
+    if chave not in cache_contagens:
+        if len(cache_contagens) >= MAX_CACHE_CONTAGENS:
+            cache_contagens.clear()
+        cache_contagens[chave] = conn.execute(f"SELECT COUNT(*) FROM {origem} WHERE 1=1 {where}", params).fetchone()[0]
+    return cache_contagens[chave]
+
+def cache_resposta(view):
+    # Serve do cache (ou 304 via If-None-Match) enquanto a geração dos dados não mudar
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        geracao = monitor_geracao.atual()
+        chave = (request.path, tuple(sorted(request.args.items(multi=True))))
+
+        item = cache_respostas.obter(chave, geracao)
+        if item is None:
+            resposta = app.make_response(view(*args, **kwargs))
+            if resposta.status_code != 200:
+                return resposta
+            item = cache_respostas.guardar(chave, geracao, resposta.get_data(), resposta.mimetype)
+
+        if request.if_none_match.contains(item.etag):
+            cache_respostas.not_modified += 1
+            resposta = Response(status=304)
+        else:
+            resposta = Response(item.corpo, mimetype=item.mimetype)
+        resposta.set_etag(item.etag)
+        resposta.headers['Cache-Control'] = 'no-cache'
+        return resposta
+    return wrapper
 
 @app.route('/api/operadoras', methods=['GET'])
+@cache_resposta
 
 def list_operadoras():
     try:
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
-        search = request.args.get('search', '')
+    except (ValueError, TypeError):
+        return jsonify({'error': 'page e limit devem ser números inteiros'}), 400
+    if page < 1 or limit < 1:
+        return jsonify({'error': 'page e limit devem ser maiores que zero'}), 400
 
-        offset = (page - 1) * limit
+    try:
+        search = request.args.get('search', '')
+        cursor_param = request.args.get('cursor')
 
         conn = get_db_connection()
 
-        query = "SELECT * FROM operadoras WHERE 1=1 "
-        params = []
+        origem, where, params, ranqueada = montar_busca(search)
+
+        total = contar_operadoras(conn, origem, where, params, search)
 
-        if search:
-            query += "AND (razao_social LIKE ? OR cnpj LIKE ?) "
-            term = f"%{search}%"
-            params.extend([term, term])
+        posicao = {}
+        if cursor_param:
+            try:
+                posicao = decodificar_cursor(cursor_param)
+                if 'o' in posicao and (not isinstance(posicao['o'], int) or posicao['o'] < 0):
+                    raise ValueError(cursor_param)
+                if 'r' in posicao and (isinstance(posicao['r'], bool) or not isinstance(posicao['r'], (str, int))):
+                    raise ValueError(cursor_param)
+            except (ValueError, TypeError):
+                return jsonify({'error': 'Cursor inválido'}), 400
+            # Cursor de outra busca ou ordenação (offset na lista ranqueada x keyset por registro_ans):
+            # ignorá-lo devolveria a primeira página e o cliente repetiria a mesma página para sempre
+            if ('o' if ranqueada else 'r') not in posicao or posicao.get('q', '') != chave_busca(search):
+                return jsonify({'error': 'Cursor não corresponde a esta busca'}), 400
 
-        # count without limit/offset
-        count_query = f"SELECT COUNT(*) FROM ({query})"
-        total = conn.execute(count_query, params).fetchone()[0]
+        query = f"SELECT o.* FROM {origem} WHERE 1=1 {where}"
+        if ranqueada:
+            # Resultados de busca vêm por relevância; o cursor guarda a posição na lista ranqueada
+            offset = int(posicao.get('o', (page - 1) * limit))
+            query += "ORDER BY b.rank, o.registro_ans LIMIT ? OFFSET ?"
+            params_with_pagination = params + [limit + 1, offset]
+        elif 'r' in posicao:
+            # Keyset: a página começa direto depois do último registro_ans visto (custo constante)
+            query += "AND o.registro_ans > ? ORDER BY o.registro_ans LIMIT ?"
+            params_with_pagination = params + [posicao['r'], limit + 1]
+        else:
+            query += "ORDER BY o.registro_ans LIMIT ? OFFSET ?"
+            params_with_pagination = params + [limit + 1, (page - 1) * limit]
 
-        # add pagination
-        query += "LIMIT ? OFFSET ?"
-        params_with_pagination = params + [limit, offset]
+        rows = conn.execute(query, params_with_pagination).fetchall()
 
-        cursor = conn.execute(query, params_with_pagination)
-        rows = cursor.fetchall()
-        conn.close()
+        tem_proxima = len(rows) > limit
+        results = [dict(row) for row in rows[:limit]]
 
-        results = [dict(row) for row in rows]
+        next_cursor = None
+        if tem_proxima:
+            posicao = {'o': offset + limit} if ranqueada else {'r': results[-1]['registro_ans']}
+            if search:
+                posicao['q'] = chave_busca(search)
+            next_cursor = codificar_cursor(posicao)
 
         return jsonify({
             'data': results,
             'meta': {
-                'page': page,
+                'page': None if cursor_param else page,
                 'limit': limit,
                 'total': total,
-                'total_pages': (total + limit - 1)// limit
+                'total_pages': (total + limit - 1)// limit,
+                'next_cursor': next_cursor
             }
         })
+    except PoolEsgotado:
+        raise
     except Exception as e:
+        app.logger.exception(f"Erro em {request.full_path}")
         return jsonify({'error': str(e)}), 500
     
 
+# Typeahead da caixa de busca
+@app.route('/api/operadoras/sugestoes', methods=['GET'])
+
+def get_sugestoes():
+    q = request.args.get('q', '')
+    try:
+        limit = max(min(int(request.args.get('limit', SUGESTOES_LIMITE_PADRAO)), SUGESTOES_LIMITE_MAX), 1)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'limit deve ser um número inteiro'}), 400
+
+    origem, where, params, ranqueada = montar_busca(q)
+    if len(normalizar_texto(q)) < 3 and not where:
+        return jsonify([])
+
+    conn = get_db_connection()
+    ordem = "b.rank, o.registro_ans" if ranqueada else "o.registro_ans"
+
+    # Orçamento de latência: a consulta é interrompida se passar de SUGESTOES_ORCAMENTO_MS
+    prazo = time.perf_counter() + SUGESTOES_ORCAMENTO_MS / 1000
+    conn.set_progress_handler(lambda: time.perf_counter() > prazo, 1000)
+    try:
+        rows = conn.execute(
+            f"SELECT o.registro_ans, o.razao_social, o.cnpj FROM {origem} WHERE 1=1 {where} ORDER BY {ordem} LIMIT ?",
+            params + [limit]
+        ).fetchall()
+    except sqlite3.OperationalError as e:
+        if 'interrupt' not in str(e):
+            raise
+        rows = []
+    finally:
+        conn.set_progress_handler(None, 0)
+
+    return jsonify([dict(row) for row in rows])
+
 
 # Rota 2 - Detalhes Operadora
 @app.route('/api/operadoras/<cnpj_ou_registro>', methods=['GET'])
+@cache_resposta
 
 def get_operadora_details(cnpj_ou_registro):
     conn = get_db_connection()
@@ -84,8 +279,6 @@ def get_operadora_details(cnpj_ou_registro):
         (clean_id, clean_id)
     ).fetchone()
 
-    conn.close()
-
     if operadora is None:
         return jsonify({'error': 'Operadora não encontrada'}), 400
     
@@ -94,6 +287,7 @@ def get_operadora_details(cnpj_ou_registro):
 
 #Rota 3 
 @app.route('/api/operadoras/<registro_ans>/despesas', methods=['GET'])
+@cache_resposta
 
 def get_operadoras_despesas(registro_ans):
     conn = get_db_connection()
@@ -101,37 +295,339 @@ def get_operadoras_despesas(registro_ans):
         "SELECT ano, trimestre, valor_despesas FROM despesas WHERE registro_ans = ? ORDER BY ano DESC, trimestre DESC",
         (registro_ans,)
     ).fetchall()
-    conn.close()
 
     return jsonify([dict(row) for row in rows])
 
+def ler_parametros_lote():
+    # registros via query string (?registros=1,2,3) ou corpo JSON {"registros": [...]} no POST;
+    # período opcional por ano_inicio/trimestre_inicio e ano_fim/trimestre_fim
+    dados = request.get_json(silent=True) if request.method == 'POST' else None
+    if dados is None:
+        dados = {}
+    elif not isinstance(dados, dict):
+        raise ValueError("O corpo JSON deve ser um objeto, ex.: {\"registros\": [...]}")
+    registros = dados.get('registros')
+    if registros is None:
+        registros = request.args.get('registros', '').split(',')
+    elif not isinstance(registros, list) or any(isinstance(r, (bool, list, dict)) for r in registros):
+        raise ValueError("'registros' no corpo JSON deve ser uma lista de registro_ans")
+    registros = list(dict.fromkeys(str(r).strip() for r in registros if r is not None and str(r).strip()))
+    if not registros:
+        raise ValueError("Informe ao menos um registro_ans em 'registros'")
+    if len(registros) > MAX_REGISTROS_LOTE:
+        raise ValueError(f"Máximo de {MAX_REGISTROS_LOTE} registros por requisição")
+
+    return registros, ler_periodo(dados)
+
+def ler_periodo(dados=None):
+    # Faixa de período opcional: ano_inicio/trimestre_inicio e ano_fim/trimestre_fim (corpo JSON ou query string)
+    dados = dados or {}
+    periodo = {}
+    for campo in ('ano_inicio', 'trimestre_inicio', 'ano_fim', 'trimestre_fim'):
+        valor = dados.get(campo, request.args.get(campo))
+        if valor not in (None, ''):
+            periodo[campo] = int(valor)
+    return periodo
+
+def indice_periodo(ano, trimestre):
+    # Mesmo índice das tabelas serie_* (periodo = ano * 4 + trimestre - 1)
+    return ano * 4 + trimestre - 1
+
+def consultar_despesas_lote(conn, registros, periodo):
+    # Um único SELECT para todos os registros: a lista vai como um parâmetro JSON (json_each),
+    # sem limite de variáveis nem tabela temporária (as conexões do pool são somente leitura)
+    where, params = "", [json.dumps(registros)]
+    if 'ano_inicio' in periodo:
+        where += "AND (ano > ? OR (ano = ? AND trimestre >= ?)) "
+        params += [periodo['ano_inicio'], periodo['ano_inicio'], periodo.get('trimestre_inicio', 1)]
+    if 'ano_fim' in periodo:
+        where += "AND (ano < ? OR (ano = ? AND trimestre <= ?)) "
+        params += [periodo['ano_fim'], periodo['ano_fim'], periodo.get('trimestre_fim', 4)]
+
+    return conn.execute(
+        "SELECT registro_ans, ano, trimestre, valor_despesas FROM despesas "
+        f"WHERE registro_ans IN (SELECT value FROM json_each(?)) {where}"
+        "ORDER BY registro_ans, ano DESC, trimestre DESC",
+        params
+    )
+
+def series_despesas(cursor):
+    # Agrupa as linhas (já ordenadas por registro_ans) em uma série por operadora, lendo em blocos
+    atual, serie = None, []
+    while True:
+        rows = cursor.fetchmany(TAMANHO_FETCH_LOTE)
+        if not rows:
+            break
+        for row in rows:
+            if row['registro_ans'] != atual:
+                if serie:
+                    yield {'registro_ans': atual, 'despesas': serie}
+                atual, serie = row['registro_ans'], []
+            serie.append({'ano': row['ano'], 'trimestre': row['trimestre'], 'valor_despesas': row['valor_despesas']})
+    if serie:
+        yield {'registro_ans': atual, 'despesas': serie}
+
+def blocos_ndjson(series):
+    bloco = []
+    tamanho = 0
+    for serie in series:
+        linha = (json.dumps(serie) + '\n').encode('utf-8')
+        bloco.append(linha)
+        tamanho += len(linha)
+        if tamanho >= TAMANHO_BLOCO_NDJSON:
+            yield b''.join(bloco)
+            bloco, tamanho = [], 0
+    if bloco:
+        yield b''.join(bloco)
+
+# Despesas de várias operadoras em uma requisição (JSON, ou NDJSON em streaming com formato=ndjson)
+@app.route('/api/despesas/lote', methods=['GET', 'POST'])
+def get_despesas_lote():
+    try:
+        registros, periodo = ler_parametros_lote()
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db_connection()
+    cursor = consultar_despesas_lote(conn, registros, periodo)
+    codificacao = escolher_codificacao(request.accept_encodings)
+    ndjson = request.args.get('formato') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson'
+
+    if ndjson:
+        # stream_with_context mantém a conexão do pool com a requisição até o último bloco
+        blocos = blocos_ndjson(series_despesas(cursor))
+        if codificacao:
+            blocos = comprimir_stream(blocos, codificacao)
+        resposta = Response(stream_with_context(blocos), mimetype='application/x-ndjson')
+    else:
+        resposta = jsonify(list(series_despesas(cursor)))
+        if codificacao and resposta.content_length < TAMANHO_MINIMO:
+            codificacao = None
+        if codificacao:
+            resposta.set_data(comprimir(resposta.get_data(), codificacao))
+
+    if codificacao:
+        resposta.headers['Content-Encoding'] = codificacao
+    resposta.headers['Vary'] = 'Accept-Encoding'
+    return resposta
+
+def consultar_exportacao(conn, filtros):
+    where, params = "", []
+    for coluna, campo in (('d.ano', 'ano'), ('d.trimestre', 'trimestre')):
+        if filtros.get(campo):
+            where += f"AND {coluna} = ? "
+            params.append(int(filtros[campo]))
+    for coluna, campo in (('o.uf', 'uf'), ('o.modalidade', 'modalidade')):
+        if filtros.get(campo):
+            where += f"AND {coluna} = ? "
+            params.append(filtros[campo])
+
+    # Cursor próprio com tuplas (sem sqlite3.Row): os geradores só precisam dos valores, na ordem das colunas
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor.execute(
+        "SELECT d.registro_ans, o.cnpj, o.razao_social, o.modalidade, o.uf, d.ano, d.trimestre, d.valor_despesas "
+        "FROM despesas d LEFT JOIN operadoras o ON o.registro_ans = d.registro_ans "
+        f"WHERE 1=1 {where}",
+        params
+    )
+
+# Exportação completa em streaming (CSV, NDJSON ou Parquet), com memória constante
+@app.route('/api/despesas/exportar', methods=['GET'])
+def exportar_despesas():
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACAO:
+        return jsonify({'error': f"Formato inválido; use {', '.join(FORMATOS_EXPORTACAO)}"}), 400
+    if formato == 'parquet' and not PARQUET_DISPONIVEL:
+        return jsonify({'error': 'Exportação Parquet requer pyarrow'}), 400
+
+    try:
+        cursor = consultar_exportacao(get_db_connection(), request.args)
+    except ValueError:
+        return jsonify({'error': 'ano e trimestre devem ser numéricos'}), 400
+
+    mimetype, extensao = FORMATOS_EXPORTACAO[formato]
+    blocos = GERADORES_EXPORTACAO[formato](cursor)
+
+    # Parquet já vem comprimido por coluna; CSV/NDJSON usam gzip/brotli se o cliente aceitar
+    codificacao = None if formato == 'parquet' else escolher_codificacao(request.accept_encodings)
+    if codificacao:
+        blocos = comprimir_stream(blocos, codificacao)
+
+    resposta = Response(stream_with_context(blocos), mimetype=mimetype)
+    if codificacao:
+        resposta.headers['Content-Encoding'] = codificacao
+    resposta.headers['Vary'] = 'Accept-Encoding'
+    resposta.headers['Content-Disposition'] = f'attachment; filename="despesas.{extensao}"'
+    return resposta
+
 #Rota 4
 @app.route('/api/estatisticas', methods=['GET'])
+@cache_resposta
 def get_estatisticas():
-    
+    return jsonify(agregados.estatisticas(get_db_connection()))
+
+# Totais por UF e trimestre (params opcionais: ano, trimestre)
+@app.route('/api/estatisticas/uf', methods=['GET'])
+@cache_resposta
+def get_estatisticas_uf():
+    ano = request.args.get('ano')
+    trimestre = request.args.get('trimestre')
+    try:
+        ano = int(ano) if ano else None
+        trimestre = int(trimestre) if trimestre else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'ano e trimestre devem ser números inteiros'}), 400
+    return jsonify(agregados.estatisticas_uf(get_db_connection(), ano, trimestre))
+
+# Análises de séries temporais (tabelas serie_* pré-calculadas pelo database.py a cada carga)
+NIVEIS_ANALISE = {
+    'operadora': ('serie_operadoras', 'registro_ans'),
+    'uf': ('serie_uf', 'uf'),
+}
+MAX_TOP_CRESCIMENTO = 100
+
+def ler_nivel_analise():
+    nivel = request.args.get('nivel', 'operadora')
+    if nivel not in NIVEIS_ANALISE:
+        raise ValueError(f"nivel deve ser um de: {', '.join(NIVEIS_ANALISE)}")
+    return NIVEIS_ANALISE[nivel]
+
+@app.route('/api/analises/crescimento', methods=['GET'])
+@cache_resposta
+def get_analises_crescimento():
+    try:
+        tabela, coluna = ler_nivel_analise()
+        periodo = ler_periodo()
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    chaves = [c.strip() for c in request.args.get(coluna, '').split(',') if c.strip()]
+    if tabela == 'serie_operadoras' and not chaves:
+        return jsonify({'error': 'Informe registro_ans (um ou mais, separados por vírgula)'}), 400
+    if len(chaves) > MAX_REGISTROS_LOTE:
+        return jsonify({'error': f"Máximo de {MAX_REGISTROS_LOTE} valores por requisição"}), 400
+
+    where, params = "", []
+    if chaves:
+        where += f"AND {coluna} IN (SELECT value FROM json_each(?)) "
+        params.append(json.dumps(chaves))
+    if 'ano_inicio' in periodo:
+        where += "AND periodo >= ? "
+        params.append(indice_periodo(periodo['ano_inicio'], periodo.get('trimestre_inicio', 1)))
+    if 'ano_fim' in periodo:
+        where += "AND periodo <= ? "
+        params.append(indice_periodo(periodo['ano_fim'], periodo.get('trimestre_fim', 4)))
+
     conn = get_db_connection()
-    
-    total_despesas = conn.execute("SELECT SUM(valor_despesas) FROM despesas").fetchone()[0] or 0
-    
-    media = conn.execute("SELECT AVG(valor_despesas) FROM despesas").fetchone()[0] or 0
-    
-    top_5 = conn.execute("""
-        SELECT o.razao_social, SUM(d.valor_despesas) as total
-        FROM despesas d
-        JOIN operadoras o ON d.registro_ans = o.registro_ans
-        GROUP BY o.razao_social
-        ORDER BY total DESC
-        LIMIT 5
-    """).fetchall()
-    
-    conn.close()
+    try:
+        rows = conn.execute(
+            f"SELECT {coluna}, ano, trimestre, total, variacao_trimestral, variacao_anual, media_movel_4t "
+            f"FROM {tabela} WHERE 1=1 {where}ORDER BY {coluna}, periodo",
+            params
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return jsonify({'error': 'Análises não calculadas; rode o database.py'}), 503
+
+    return jsonify([dict(row) for row in rows])
+
+@app.route('/api/analises/top-crescimento', methods=['GET'])
+@cache_resposta
+def get_analises_top_crescimento():
+    # Maiores crescimentos entre dois trimestres; padrão: último trimestre carregado vs. o anterior
+    try:
+        tabela, coluna = ler_nivel_analise()
+        periodo = ler_periodo()
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        n = max(min(int(request.args.get('n', 10)), MAX_TOP_CRESCIMENTO), 1)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'n deve ser um número inteiro'}), 400
+
+    conn = get_db_connection()
+    try:
+        if 'ano_fim' in periodo:
+            fim = indice_periodo(periodo['ano_fim'], periodo.get('trimestre_fim', 4))
+        else:
+            fim = conn.execute(f"SELECT MAX(periodo) FROM {tabela}").fetchone()[0]
+        if fim is None:
+            return jsonify([])
+        if 'ano_inicio' in periodo:
+            inicio = indice_periodo(periodo['ano_inicio'], periodo.get('trimestre_inicio', 1))
+        else:
+            inicio = fim - 1
+
+        nome = ", o.razao_social" if coluna == 'registro_ans' else ""
+        juncao = "LEFT JOIN operadoras o ON o.registro_ans = f.registro_ans " if coluna == 'registro_ans' else ""
+        rows = conn.execute(
+            f"SELECT f.{coluna}{nome}, i.total AS total_inicio, f.total AS total_fim, "
+            "(f.total - i.total) * 1.0 / i.total AS crescimento "
+            f"FROM {tabela} f JOIN {tabela} i ON i.{coluna} = f.{coluna} AND i.periodo = ? "
+            f"{juncao}"
+            "WHERE f.periodo = ? AND i.total > 0 "
+            f"ORDER BY crescimento DESC, f.{coluna} LIMIT ?",
+            (inicio, fim, n)
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return jsonify({'error': 'Análises não calculadas; rode o database.py'}), 503
 
     return jsonify({
-        'total_geral': total_despesas,
-        'media_trimestral': media,
-        'top_operadoras': [dict(row) for row in top_5]
+        'inicio': {'ano': inicio // 4, 'trimestre': inicio % 4 + 1},
+        'fim': {'ano': fim // 4, 'trimestre': fim % 4 + 1},
+        'data': [dict(row) for row in rows]
     })
 
+@app.route('/api/cache/metricas', methods=['GET'])
+def get_cache_metricas():
+    metricas = cache_respostas.metricas()
+    metricas['geracao'] = monitor_geracao.atual()
+    metricas['backend_agregados'] = agregados.nome
+    return jsonify(metricas)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Formato texto do Prometheus; métricas do processo (cada worker do gunicorn responde pelas suas)
+    cache = cache_respostas.metricas()
+    extras = [
+        ('api_cache_hits_total', 'counter', "Respostas servidas do cache", cache['hits']),
+        ('api_cache_misses_total', 'counter', "Respostas geradas (fora do cache)", cache['misses']),
+        ('api_cache_not_modified_total', 'counter', "Respostas 304 por If-None-Match", cache['not_modified']),
+        ('api_cache_evictions_total', 'counter', "Respostas removidas do cache por tamanho", cache['evictions']),
+        ('api_cache_itens', 'gauge', "Respostas no cache", cache['itens']),
+        ('api_geracao_dados', 'gauge', "Geração dos dados carregados", monitor_geracao.atual()),
+    ]
+    return Response(registro_metricas.texto_prometheus(extras), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Rotas consultadas na subida do worker para popular o cache de respostas
+ROTAS_AQUECIMENTO = [
+    '/api/estatisticas',
+    '/api/estatisticas/uf',
+    '/api/operadoras?page=1&limit=10',
+]
+
+def aquecer_servidor():
+    # Abre as conexões do pool e pré-carrega as respostas mais acessadas antes da primeira requisição real
+    inicio = time.perf_counter()
+    try:
+        pool.aquecer()
+    except sqlite3.Error as e:
+        app.logger.warning(f"Aquecimento do pool falhou: {e}")
+        return
+
+    with app.test_client() as cliente:
+        for rota in ROTAS_AQUECIMENTO:
+            resposta = cliente.get(rota)
+            if resposta.status_code != 200:
+                app.logger.warning(f"Aquecimento de {rota} retornou {resposta.status_code}")
+    app.logger.info(f"Worker aquecido em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+def encerrar_servidor():
+    # Fecha as conexões ociosas do pool no desligamento do worker
+    pool.fechar()
+    agregados.fechar()
+    cache_respostas.limpar()
+
 if __name__ == '__main__':
     
     print("Servidor API rodando em http://localhost:5000")
@@ -0,0 +1,96 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from conexoes import geracao_dados
+
+CACHE_MAX_ITENS = 2048
+CACHE_TTL = 600
+INTERVALO_GERACAO = 2.0
+
+ItemCache = namedtuple('ItemCache', ['geracao', 'expira_em', 'corpo', 'etag', 'mimetype'])
+
+
+class MonitorGeracao:
+    # Lê a geração dos dados no banco no máximo uma vez a cada `intervalo` segundos
+
+    def __init__(self, pool, intervalo=INTERVALO_GERACAO):
+        self.pool = pool
+        self.intervalo = intervalo
+        self._geracao = None
+        self._verificado_em = 0.0
+        self._lock = threading.Lock()
+
+    def atual(self):
+        agora = time.monotonic()
+        if self._geracao is not None and agora - self._verificado_em < self.intervalo:
+            return self._geracao
+        with self._lock:
+            if self._geracao is None or agora - self._verificado_em >= self.intervalo:
+                conn = self.pool.obter()
+                try:
+                    geracao = geracao_dados(conn)
+                finally:
+                    self.pool.devolver(conn)
+                if self._geracao is not None and geracao != self._geracao:
+                    # Nova carga: reabre as conexões (a lista de partições anexadas pode ter mudado)
+                    self.pool.renovar()
+                self._geracao = geracao
+                self._verificado_em = agora
+        return self._geracao
+
+
+class CacheRespostas:
+    # LRU + TTL de respostas já serializadas; itens de gerações antigas são descartados
+
+    def __init__(self, max_itens=CACHE_MAX_ITENS, ttl=CACHE_TTL):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+
+    def obter(self, chave, geracao):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None and item.geracao == geracao and item.expira_em > time.monotonic():
+                self._itens.move_to_end(chave)
+                self.hits += 1
+                return item
+            if item is not None:
+                del self._itens[chave]
+            self.misses += 1
+            return None
+
+    def guardar(self, chave, geracao, corpo, mimetype):
+        etag = f"{geracao}-{hashlib.sha1(corpo).hexdigest()[:20]}"
+        item = ItemCache(geracao, time.monotonic() + self.ttl, corpo, etag, mimetype)
+        with self._lock:
+            self._itens[chave] = item
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self.evictions += 1
+        return item
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def metricas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / consultas if consultas else 0.0,
+                'not_modified': self.not_modified,
+                'evictions': self.evictions,
+                'itens': len(self._itens),
+                'max_itens': self.max_itens,
+                'ttl_segundos': self.ttl
+            }
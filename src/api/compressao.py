@@ -0,0 +1,44 @@
+import zlib
+
+try:
+    import brotli
+    BROTLI_DISPONIVEL = True
+except ImportError:
+    brotli = None
+    BROTLI_DISPONIVEL = False
+
+NIVEL_GZIP = 6
+QUALIDADE_BROTLI = 5
+TAMANHO_MINIMO = 1024  # respostas menores que isso não compensam comprimir
+
+
+def escolher_codificacao(accept_encodings):
+    # Brotli (se instalado) tem prioridade sobre gzip quando o cliente aceita os dois
+    if BROTLI_DISPONIVEL and 'br' in accept_encodings:
+        return 'br'
+    if 'gzip' in accept_encodings:
+        return 'gzip'
+    return None
+
+
+def comprimir_stream(partes, codificacao):
+    # Comprime pedaço a pedaço; o flush a cada parte deixa o cliente ler o NDJSON enquanto chega
+    if codificacao == 'br':
+        compressor = brotli.Compressor(quality=QUALIDADE_BROTLI)
+        for parte in partes:
+            dados = compressor.process(parte) + compressor.flush()
+            if dados:
+                yield dados
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for parte in partes:
+        dados = compressor.compress(parte) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if dados:
+            yield dados
+    yield compressor.flush()
+
+
+def comprimir(corpo, codificacao):
+    return b''.join(comprimir_stream([corpo], codificacao))
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
+
+POOL_TAMANHO = 8
+POOL_TIMEOUT = 10
+MMAP_MB = 256
+CACHE_KB = 64 * 1024
+CACHED_STATEMENTS = 256
+
+
+def geracao_dados(conn):
+    # Incrementada pelo database.py a cada importação
+    try:
+        linha = conn.execute("SELECT valor FROM metadados WHERE chave = 'geracao'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(linha[0]) if linha else 0
+
+
+class PoolEsgotado(Exception):
+    # Nenhuma conexão livre dentro do timeout (a API responde 503)
+    pass
+
+
+class PoolConexoes:
+    # Conexões somente leitura reaproveitadas entre requisições (uma por thread em uso, no máximo `tamanho`)
+
+    def __init__(self, caminho, tamanho=POOL_TAMANHO, timeout=POOL_TIMEOUT, ao_conectar=None, fabrica=sqlite3.Connection):
+        self.caminho = caminho
+        self.tamanho = tamanho
+        self.timeout = timeout
+        self.ao_conectar = ao_conectar  # ex.: anexar as partições anuais de despesas
+        self.fabrica = fabrica  # subclasse de sqlite3.Connection (ex.: com as consultas instrumentadas)
+        self._livres = []  # pilha: a conexão usada por último (com cache quente) sai primeiro
+        self._criadas = 0
+        # Protege as listas e contadores; avisa quem espera quando uma conexão volta ou uma vaga abre
+        self._condicao = threading.Condition()
+        self._versao = 0
+        self._versoes = {}
+
+    def _criar(self, versao):
+        uri = f"file:{pathname2url(os.path.abspath(self.caminho))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=CACHED_STATEMENTS,
+                               factory=self.fabrica)
+        conn.row_factory = sqlite3.Row
+        if self.ao_conectar:
+            self.ao_conectar(conn, self.caminho)
+        conn.execute("PRAGMA query_only=ON")
+        conn.execute(f"PRAGMA mmap_size={MMAP_MB * 1024 * 1024}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_KB}")
+        with self._condicao:
+            self._versoes[id(conn)] = versao
+        return conn
+
+    def _descartar(self, conn):
+        # Chamado com a condição adquirida: libera a vaga e acorda uma thread que espera para criar outra
+        self._versoes.pop(id(conn), None)
+        self._criadas -= 1
+        self._condicao.notify()
+        conn.close()
+
+    def renovar(self):
+        # Conexões abertas antes disso são fechadas ao voltar para o pool ou ao sair dele (ex.: carga que
+        # mudou as partições)
+        with self._condicao:
+            self._versao += 1
+
+    def obter(self):
+        prazo = time.monotonic() + self.timeout
+        with self._condicao:
+            while True:
+                while self._livres:
+                    conn = self._livres.pop()
+                    if self._versoes.get(id(conn)) == self._versao:
+                        return conn
+                    self._descartar(conn)
+                if self._criadas < self.tamanho:
+                    self._criadas += 1
+                    versao = self._versao
+                    break
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    raise PoolEsgotado(f"Nenhuma conexão livre em {self.timeout} s ({self.tamanho} em uso)")
+                self._condicao.wait(restante)
+
+        # Conexão nova fora da condição: abrir e anexar partições não bloqueia quem devolve conexões
+        try:
+            return self._criar(versao)
+        except Exception:
+            with self._condicao:
+                self._criadas -= 1
+                self._condicao.notify()
+            raise
+
+    def devolver(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._condicao:
+            if self._versoes.get(id(conn)) != self._versao:
+                self._descartar(conn)
+                return
+            self._livres.append(conn)
+            self._condicao.notify()
+
+    def aquecer(self, quantidade=None):
+        conexoes = [self.obter() for _ in range(quantidade or self.tamanho)]
+        for conn in conexoes:
+            self.devolver(conn)
+
+    def fechar(self):
+        with self._condicao:
+            while self._livres:
+                self._descartar(self._livres.pop())
@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+TAMANHO_FETCH_EXPORTACAO = 20_000  # linhas por fetchmany (e por row group no Parquet)
+
+COLUNAS_EXPORTACAO = ['registro_ans', 'cnpj', 'razao_social', 'modalidade', 'uf', 'ano', 'trimestre', 'valor_despesas']
+
+FORMATOS_EXPORTACAO = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+if PARQUET_DISPONIVEL:
+    SCHEMA_EXPORTACAO = pa.schema([
+        ('registro_ans', pa.string()),
+        ('cnpj', pa.string()),
+        ('razao_social', pa.string()),
+        ('modalidade', pa.string()),
+        ('uf', pa.string()),
+        ('ano', pa.int16()),
+        ('trimestre', pa.int8()),
+        ('valor_despesas', pa.float64()),
+    ])
+
+
+def lotes(cursor):
+    # Lê o resultado em blocos: só um lote de linhas fica em memória por vez
+    while True:
+        rows = cursor.fetchmany(TAMANHO_FETCH_EXPORTACAO)
+        if not rows:
+            break
+        yield rows
+
+
+def blocos_csv(cursor):
+    # Mesmo formato dos CSVs do pipeline (separador ';', UTF-8, com cabeçalho)
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';', lineterminator='\n')
+    escritor.writerow(COLUNAS_EXPORTACAO)
+    for rows in lotes(cursor):
+        escritor.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def blocos_ndjson(cursor):
+    for rows in lotes(cursor):
+        yield ''.join(json.dumps(dict(zip(COLUNAS_EXPORTACAO, row))) + '\n' for row in rows).encode('utf-8')
+
+
+class SaidaIncremental:
+    # "Arquivo" mínimo para o ParquetWriter: acumula os bytes escritos e os entrega a cada row group
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._posicao = 0
+        self.closed = False
+
+    def write(self, dados):
+        self._buffer += dados
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def retirar(self):
+        dados = bytes(self._buffer)
+        self._buffer.clear()
+        return dados
+
+
+def blocos_parquet(cursor):
+    # Um row group por lote; o rodapé (metadados) sai no fechamento do writer
+    saida = SaidaIncremental()
+    escritor = pq.ParquetWriter(saida, SCHEMA_EXPORTACAO)
+    try:
+        for rows in lotes(cursor):
+            colunas = list(zip(*rows))
+            tabela = pa.Table.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, SCHEMA_EXPORTACAO)],
+                schema=SCHEMA_EXPORTACAO
+            )
+            escritor.write_table(tabela)
+            yield saida.retirar()
+    finally:
+        escritor.close()
+    yield saida.retirar()
+
+
+GERADORES_EXPORTACAO = {
+    'csv': blocos_csv,
+    'ndjson': blocos_ndjson,
+    'parquet': blocos_parquet,
+}
@@ -0,0 +1,45 @@
+# Configuração de produção da API (gunicorn, Linux/macOS).
+# Uso, a partir da raiz do projeto:
+#   gunicorn -c src/api/gunicorn.conf.py
+# Variáveis de ambiente: API_BIND, API_WORKERS, API_THREADS, INTUITIVE_DB_PATH,
+# INTUITIVE_BACKEND_AGREGADOS (sqlite|duckdb), INTUITIVE_DUCKDB_THREADS, INTUITIVE_SQL_LENTA_MS
+
+import multiprocessing
+import os
+
+pythonpath = os.path.dirname(os.path.abspath(__file__))
+wsgi_app = "app:app"
+
+bind = os.environ.get("API_BIND", "0.0.0.0:5000")
+
+# Leituras no SQLite seguram o GIL boa parte do tempo: escala com processos,
+# e algumas threads por worker cobrem a espera de rede/disco
+workers = int(os.environ.get("API_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("API_THREADS", 4))  # não deve passar de POOL_TAMANHO (conexoes.py)
+
+# Sem preload: cada worker importa o app depois do fork, então nenhuma conexão
+# SQLite é compartilhada entre processos
+preload_app = False
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Recicla workers periodicamente para conter crescimento de memória
+max_requests = 10_000
+max_requests_jitter = 1_000
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("API_LOG_LEVEL", "info")
+
+
+def post_worker_init(worker):
+    from app import aquecer_servidor
+    aquecer_servidor()
+
+
+def worker_exit(server, worker):
+    from app import encerrar_servidor
+    encerrar_servidor()
@@ -0,0 +1,272 @@
+import contextvars
+import logging
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+LIMITE_CONSULTA_LENTA_MS = 100
+MAX_PLANOS_CACHE = 256
+
+LIMITES_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_LINHAS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+# Histogramas por rota: nome, descrição, limites dos buckets e rótulos além da rota
+HISTOGRAMAS = {
+    'api_requisicao_segundos': ("Latência das requisições (até o fim do corpo, nas respostas em streaming)",
+                                LIMITES_SEGUNDOS, ('metodo', 'status')),
+    'api_sql_segundos': ("Tempo em consultas (execute + fetch) por requisição", LIMITES_SEGUNDOS, ()),
+    'api_serializacao_segundos': ("Tempo de serialização (JSON e geração dos corpos em streaming, sem o SQL) por requisição",
+                                  LIMITES_SEGUNDOS, ()),
+    'api_linhas_retornadas': ("Linhas lidas das consultas por requisição", LIMITES_LINHAS, ()),
+}
+
+logger = logging.getLogger(__name__)
+
+# Medição da requisição em curso na thread (lida pelo cursor instrumentado e pelo provedor JSON)
+_medicao = contextvars.ContextVar('medicao', default=None)
+
+
+class Medicao:
+    __slots__ = ('registro', 'inicio', 'sql', 'serializacao', 'linhas', 'consultas_lentas', 'rota')
+
+    def __init__(self, registro, rota):
+        self.registro = registro
+        self.rota = rota
+        self.inicio = time.perf_counter()
+        self.sql = 0.0
+        self.serializacao = 0.0
+        self.linhas = 0
+        self.consultas_lentas = 0
+
+
+def registrar_sql(segundos, linhas=0):
+    # Para consultas fora do sqlite3 (ex.: DuckDB) entrarem no tempo de SQL da requisição
+    medicao = _medicao.get()
+    if medicao is not None:
+        medicao.sql += segundos
+        medicao.linhas += linhas
+
+
+class CursorInstrumentado(sqlite3.Cursor):
+    # Soma o tempo de execute/fetch e as linhas lidas na medição da requisição; uma consulta que
+    # passa do limite é registrada (uma vez) no log de consultas lentas com o EXPLAIN QUERY PLAN
+
+    def _medir(self, inicio, linhas):
+        segundos = time.perf_counter() - inicio
+        medicao = _medicao.get()
+        if medicao is None:
+            return
+        medicao.sql += segundos
+        medicao.linhas += linhas
+        self._tempo += segundos
+        if self._tempo >= medicao.registro.limite_consulta_lenta and not self._lenta:
+            self._lenta = True
+            medicao.consultas_lentas += 1
+            medicao.registro.consulta_lenta(self.connection, self._sql, self._params, self._tempo, medicao.rota)
+
+    def execute(self, sql, params=()):
+        self._sql, self._params, self._tempo, self._lenta = sql, params, 0.0, False
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            self._medir(inicio, 0)
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        linha = super().fetchone()
+        self._medir(inicio, int(linha is not None))
+        return linha
+
+    def fetchmany(self, size=None):
+        inicio = time.perf_counter()
+        linhas = super().fetchmany(self.arraysize if size is None else size)
+        self._medir(inicio, len(linhas))
+        return linhas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        linhas = super().fetchall()
+        self._medir(inicio, len(linhas))
+        return linhas
+
+
+class ConexaoInstrumentada(sqlite3.Connection):
+    # factory do sqlite3.connect: cursores (inclusive os de conn.execute) medidos por CursorInstrumentado
+
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+
+class Histograma:
+    __slots__ = ('contagens', 'soma', 'total')
+
+    def __init__(self, limites):
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0
+        self.total = 0
+
+    def observar(self, limites, valor):
+        self.contagens[bisect_left(limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(pares):
+    return ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares)
+
+
+class RegistroMetricas:
+    # Métricas da API em memória do processo (cada worker do gunicorn tem as suas), no formato texto do Prometheus
+
+    def __init__(self, limite_consulta_lenta_ms=LIMITE_CONSULTA_LENTA_MS):
+        self.limite_consulta_lenta = limite_consulta_lenta_ms / 1000
+        self._histogramas = {nome: {} for nome in HISTOGRAMAS}
+        self._consultas_lentas = {}
+        self._excecoes = {}
+        self._planos = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, rota, metodo, status, medicao):
+        total = time.perf_counter() - medicao.inicio
+        valores = (
+            ('api_requisicao_segundos', (rota, metodo, str(status)), total),
+            ('api_sql_segundos', (rota,), medicao.sql),
+            ('api_serializacao_segundos', (rota,), medicao.serializacao),
+            ('api_linhas_retornadas', (rota,), medicao.linhas),
+        )
+        with self._lock:
+            for nome, chave, valor in valores:
+                limites = HISTOGRAMAS[nome][1]
+                serie = self._histogramas[nome].get(chave)
+                if serie is None:
+                    serie = self._histogramas[nome][chave] = Histograma(limites)
+                serie.observar(limites, valor)
+            if medicao.consultas_lentas:
+                self._consultas_lentas[rota] = self._consultas_lentas.get(rota, 0) + medicao.consultas_lentas
+
+    def registrar_excecao(self, rota):
+        with self._lock:
+            self._excecoes[rota] = self._excecoes.get(rota, 0) + 1
+
+    def _plano(self, conn, sql, params):
+        # Plano guardado por texto da consulta: o log não repete o EXPLAIN a cada ocorrência
+        plano = self._planos.get(sql)
+        if plano is None:
+            try:
+                plano = [linha[3] for linha in sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", params)]
+            except sqlite3.Error as e:
+                return [f"(EXPLAIN QUERY PLAN falhou: {e})"]
+            if len(self._planos) >= MAX_PLANOS_CACHE:
+                self._planos.clear()
+            self._planos[sql] = plano
+        return plano
+
+    def consulta_lenta(self, conn, sql, params, segundos, rota):
+        plano = self._plano(conn, sql, params)
+        logger.warning(
+            f"Consulta lenta ({segundos * 1000:.1f} ms) em {rota}: {' '.join(sql.split())} params={params!r}\n"
+            + '\n'.join(f"    {detalhe}" for detalhe in plano)
+        )
+
+    def texto_prometheus(self, extras=()):
+        # extras: (nome, tipo, descrição, valor) de métricas mantidas fora do registro (ex.: cache de respostas)
+        linhas = []
+        with self._lock:
+            for nome, (descricao, limites, rotulos) in HISTOGRAMAS.items():
+                linhas += [f"# HELP {nome} {descricao}", f"# TYPE {nome} histogram"]
+                for chave, serie in sorted(self._histogramas[nome].items()):
+                    base = _rotulos(zip(('rota',) + rotulos, chave))
+                    acumulado = 0
+                    for limite, contagem in zip(limites + ('+Inf',), serie.contagens):
+                        acumulado += contagem
+                        linhas.append(f'{nome}_bucket{{{base},le="{limite}"}} {acumulado}')
+                    linhas.append(f"{nome}_sum{{{base}}} {serie.soma!r}")
+                    linhas.append(f"{nome}_count{{{base}}} {serie.total}")
+            for nome, descricao, contadores in (
+                ('api_consultas_lentas_total', "Consultas acima do limite do log de consultas lentas", self._consultas_lentas),
+                ('api_excecoes_total', "Exceções não tratadas nas rotas", self._excecoes),
+            ):
+                linhas += [f"# HELP {nome} {descricao}", f"# TYPE {nome} counter"]
+                linhas += [f"{nome}{{{_rotulos([('rota', rota)])}}} {valor}" for rota, valor in sorted(contadores.items())]
+        for nome, tipo, descricao, valor in extras:
+            linhas += [f"# HELP {nome} {descricao}", f"# TYPE {nome} {tipo}", f"{nome} {valor!r}"]
+        return '\n'.join(linhas) + '\n'
+
+
+class ProvedorJSONMedido(DefaultJSONProvider):
+    # jsonify com o tempo de serialização somado à medição da requisição
+
+    def dumps(self, obj, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            medicao = _medicao.get()
+            if medicao is not None:
+                medicao.serializacao += time.perf_counter() - inicio
+
+
+def _corpo_medido(corpo, medicao, finalizar):
+    # Corpo em streaming: cada bloco gerado conta como serialização, menos o SQL feito para gerá-lo;
+    # a requisição é registrada quando o corpo termina (ou a conexão é fechada antes disso)
+    try:
+        iterador = iter(corpo)
+        while True:
+            inicio, sql_antes = time.perf_counter(), medicao.sql
+            try:
+                bloco = next(iterador)
+            except StopIteration:
+                break
+            medicao.serializacao += time.perf_counter() - inicio - (medicao.sql - sql_antes)
+            yield bloco
+    finally:
+        if hasattr(corpo, 'close'):
+            corpo.close()
+        finalizar()
+
+
+def instrumentar(app, registro):
+    # Mede cada requisição: latência, SQL (via ConexaoInstrumentada), serialização e linhas, por rota
+    app.json = ProvedorJSONMedido(app)
+
+    def rota_atual():
+        return request.url_rule.rule if request.url_rule is not None else 'desconhecida'
+
+    @app.before_request
+    def iniciar_medicao():
+        _medicao.set(Medicao(registro, rota_atual()))
+
+    @app.after_request
+    def registrar_medicao(resposta):
+        medicao = _medicao.get()
+        if medicao is None:
+            return resposta
+        metodo, status = request.method, resposta.status_code
+
+        def finalizar():
+            # Consultas depois disso (ex.: monitor de geração em outra rota) não entram nesta medição
+            _medicao.set(None)
+            registro.registrar(medicao.rota, metodo, status, medicao)
+
+        if resposta.is_streamed:
+            resposta.response = _corpo_medido(resposta.response, medicao, finalizar)
+        else:
+            finalizar()
+        return resposta
+
+    @app.teardown_request
+    def registrar_excecao(exc):
+        if exc is not None:
+            registro.registrar_excecao(rota_atual())
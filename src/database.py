@@ -1,12 +1,60 @@
 import sqlite3
+import numpy as np
 import pandas as pd
 import os
+import re
+import time
+import argparse
+import json
+import shutil
+import manifest as mf
+from analitico import (CHAVE_PARQUET, SOMA_CENTAVOS, caminho_operadoras, caminho_trimestre, gravar_geracao, ler_geracao,
+                       parquet_ativo, pasta_despesas, pasta_parquet)
+from formato import PARQUET_DISPONIVEL, TIPOS_DESPESAS, TIPOS_OPERADORAS, ler_tabela, localizar_tabela
+from particoes import (CHAVE_PARTICOES, anexar_particoes, anos_particionados, caminho_particao, criar_view_despesas,
+                       versoes_particoes)
+from texto import normalizar_texto, somente_digitos
 
 # Configurações
 DB_PATH = "data/intuitive_care.db"
-CSV_DESPESAS = "data/processed/consolidado_despesas_final.csv"
+OPERADORAS_DIM = "data/processed/dim_operadoras"
+DESPESAS_FATO = "data/processed/fato_despesas"
 SQL_SCRIPT_PATH = "sql/querys.sql"
 
+TAMANHO_LOTE = 50_000
+CACHE_CARGA_KB = 256 * 1024
+TOP_N_RESUMO = 100
+# Tipos fixos nos Parquet: o DuckDB lê todos os trimestres como uma tabela só
+TIPOS_PARQUET = {'registro_ans': 'int32', 'ano': 'int16', 'trimestre': 'int8', 'valor_despesas': 'float64'}
+
+MARCADOR_QUERIES = '-- 3.4. QUERIES ANALÍTICAS'
+ESQUEMA_NOVA_PARTICAO = 'particao_nova'
+
+# "SCAN x" sem índice: leitura da tabela inteira (subconsultas e tabelas virtuais não contam)
+RE_VARREDURA = re.compile(r'^SCAN (?!\(|CONSTANT ROW)(\S+)(?!\S)(?!.*VIRTUAL TABLE)(?!.* USING (COVERING )?INDEX)')
+# Origens "FROM/JOIN tabela [alias]" de uma consulta, para saber a que objeto o plano se refere
+RE_ORIGEM = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:ON|WHERE|JOIN|LEFT|INNER|GROUP|ORDER|LIMIT)\b)(\w+))?', re.I)
+
+# Consultas da API sobre despesas/operadoras conferidas por verificar_planos (além das analíticas do querys.sql)
+CONSULTAS_API = [
+    ('operadora por registro ou CNPJ', "SELECT * FROM operadoras WHERE cnpj = ? OR registro_ans = ?", ('', '')),
+    ('despesas da operadora',
+     "SELECT ano, trimestre, valor_despesas FROM despesas WHERE registro_ans = ? ORDER BY ano DESC, trimestre DESC", ('',)),
+    ('despesas em lote',
+     "SELECT registro_ans, ano, trimestre, valor_despesas FROM despesas "
+     "WHERE registro_ans IN (SELECT value FROM json_each(?)) AND (ano > ? OR (ano = ? AND trimestre >= ?)) "
+     "ORDER BY registro_ans, ano DESC, trimestre DESC", ('[]', 0, 0, 1)),
+    ('exportação por período',
+     "SELECT d.registro_ans, o.cnpj, o.razao_social, o.modalidade, o.uf, d.ano, d.trimestre, d.valor_despesas "
+     "FROM despesas d LEFT JOIN operadoras o ON o.registro_ans = d.registro_ans WHERE d.ano = ? AND d.trimestre = ?", (0, 1)),
+    ('exportação por UF',
+     "SELECT d.registro_ans, o.cnpj, o.razao_social, o.modalidade, o.uf, d.ano, d.trimestre, d.valor_despesas "
+     "FROM despesas d LEFT JOIN operadoras o ON o.registro_ans = d.registro_ans WHERE o.uf = ?", ('',)),
+    ('estatísticas sem resumos',
+     f"SELECT o.razao_social, {SOMA_CENTAVOS} / 100.0 as total FROM despesas d "
+     "JOIN operadoras o ON d.registro_ans = o.registro_ans GROUP BY o.razao_social ORDER BY total DESC, o.razao_social LIMIT 5", ()),
+]
+
 def get_connection():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     return sqlite3.connect(DB_PATH)
@@ -23,12 +71,10 @@ def criar_tabelas():
         return
     
     try:
-        with open(SQL_SCRIPT_PATH, 'r', encoding='utf-8') as f:
-            script = f.read()
-            
-        partes = script.split('-- 3.4. QUERIES ANALÍTICAS')
-        sql_ddl = partes[0]
-        
+        sql_ddl = _ler_script()[0]
+
+        # Bancos de versões anteriores são migrados antes (tipos de coluna, índices); o script cria o que faltar
+        migrar_esquema(conn, sql_ddl)
         cursor.executescript(sql_ddl)
         conn.commit()
         print("Tabelas criadas com sucesso.")
@@ -37,45 +83,580 @@ def criar_tabelas():
     finally:
         conn.close()
 
-def importar_dados():
-    print(">>> Importando dados dos CSVs para o SQL...")
+def _ler_script():
+    # (DDL, consultas analíticas) do querys.sql
+    with open(SQL_SCRIPT_PATH, 'r', encoding='utf-8') as f:
+        ddl, queries = f.read().split(MARCADOR_QUERIES)
+    consultas = [q.strip() for q in queries.split(';') if 'SELECT' in q.upper()]
+    return ddl, consultas
+
+def _definicao(sql):
+    # Só a lista de colunas: depois de um RENAME o SQLite guarda o nome da tabela entre aspas
+    return re.sub(r'\s+', ' ', sql[sql.index('('):]).strip()
+
+def _colunas(conn, tabela):
+    return [linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})")]
+
+def _com_esquema(sql_indice, esquema):
+    return re.sub(r'^CREATE INDEX\s+(IF NOT EXISTS\s+)?', f"CREATE INDEX IF NOT EXISTS {esquema}.", sql_indice)
+
+def migrar_esquema(conn, sql_ddl):
+    # Compara o banco com o DDL do script (aplicado em um banco em memória): tabelas com colunas diferentes
+    # são recriadas copiando os dados (a afinidade da nova coluna converte, ex.: trimestre '1' -> 1) e
+    # índices que saíram do script são removidos. Tabelas e índices novos ficam para o executescript.
+    referencia = sqlite3.connect(':memory:')
+    referencia.executescript(sql_ddl)
+    tabelas = dict(referencia.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND sql LIKE 'CREATE TABLE%' AND name NOT LIKE 'sqlite_%'"
+    ))
+    indices = {nome: sql for nome, sql in referencia.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    )}
+    colunas_referencia = {tabela: _colunas(referencia, tabela) for tabela in tabelas}
+    referencia.close()
+
+    atuais = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table'"))
+    migradas = [t for t, sql in tabelas.items() if t in atuais and _definicao(atuais[t]) != _definicao(sql)]
+    obsoletos = [nome for nome, tabela, sql in conn.execute(
+        "SELECT name, tbl_name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    ) if tabela in tabelas and tabela not in migradas and (nome not in indices or indices[nome] != sql)]
+    if not migradas and not obsoletos:
+        return []
+
+    conn.execute("BEGIN IMMEDIATE")
+    for tabela in migradas:
+        print(f"Migrando tabela {tabela}...")
+        colunas = ', '.join(c for c in colunas_referencia[tabela] if c in _colunas(conn, tabela))
+        conn.execute(re.sub(rf'^CREATE TABLE\s+"?{tabela}"?', f"CREATE TABLE {tabela}_migracao", tabelas[tabela]))
+        conn.execute(f"INSERT INTO {tabela}_migracao ({colunas}) SELECT {colunas} FROM {tabela}")
+        conn.execute(f"DROP TABLE {tabela}")
+        conn.execute(f"ALTER TABLE {tabela}_migracao RENAME TO {tabela}")
+    for nome in obsoletos:
+        print(f"Removendo índice {nome}...")
+        conn.execute(f"DROP INDEX {nome}")
+    conn.execute("COMMIT")
+    return migradas
+
+def configurar_carga(conn):
+    # WAL mantém leitores (API) enxergando o snapshot antigo até o COMMIT da carga
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_CARGA_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+def _lotes(df, tamanho_lote=TAMANHO_LOTE):
+    # Converte fatias do DataFrame em tuplas nativas (None no lugar de NA) sem materializar tudo de uma vez
+    for inicio in range(0, len(df), tamanho_lote):
+        fatia = df.iloc[inicio:inicio + tamanho_lote]
+        colunas = [fatia[c].astype(object).where(fatia[c].notna(), None).tolist() for c in fatia.columns]
+        yield list(zip(*colunas))
+
+def inserir_em_lotes(conn, tabela, df, comando="INSERT"):
+    colunas = ', '.join(df.columns)
+    marcadores = ', '.join('?' for _ in df.columns)
+    sql = f"{comando} INTO {tabela} ({colunas}) VALUES ({marcadores})"
+    for lote in _lotes(df):
+        conn.executemany(sql, lote)
+    return len(df)
+
+def _ddl_tabela(conn, tabela, novo_nome):
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (tabela,)).fetchone()[0]
+    return re.sub(rf'^CREATE TABLE\s+"?{tabela}"?', f"CREATE TABLE {novo_nome}", sql)
+
+def _indices(conn, tabela):
+    return [r[0] for r in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (tabela,)
+    )]
+
+def _preparar_particao(conn, esquema, indices=True):
+    # Mesma tabela (e índices) de main.despesas no banco anexado como `esquema`
+    conn.execute(_ddl_tabela(conn, 'despesas', f"IF NOT EXISTS {esquema}.despesas"))
+    if indices:
+        for sql_indice in _indices(conn, 'despesas'):
+            conn.execute(_com_esquema(sql_indice, esquema))
+
+def _gravar_particao(conn, ano, versao, preencher, origem=None):
+    # Monta <banco>_<ano>.g<versão>.db em .tmp (linhas antes dos índices) e renomeia no fim. O arquivo só
+    # passa a ser lido quando o COMMIT do banco principal grava a nova versão em metadados.
+    # `origem`: arquivo atual do ano, copiado antes de `preencher` (carga incremental)
+    caminho = caminho_particao(DB_PATH, ano, versao)
+    if os.path.exists(caminho + '.tmp'):
+        os.remove(caminho + '.tmp')
+    if origem is not None:
+        fonte, destino = sqlite3.connect(origem), sqlite3.connect(caminho + '.tmp')
+        try:
+            fonte.backup(destino)
+        finally:
+            fonte.close()
+            destino.close()
+    conn.execute(f"ATTACH DATABASE ? AS {ESQUEMA_NOVA_PARTICAO}", (caminho + '.tmp',))
+    try:
+        conn.execute(f"PRAGMA {ESQUEMA_NOVA_PARTICAO}.synchronous=OFF")
+        conn.execute("BEGIN IMMEDIATE")
+        if origem is None:
+            _preparar_particao(conn, ESQUEMA_NOVA_PARTICAO, indices=False)
+        preencher(f"{ESQUEMA_NOVA_PARTICAO}.despesas")
+        if origem is None:
+            for sql_indice in _indices(conn, 'despesas'):
+                conn.execute(_com_esquema(sql_indice, ESQUEMA_NOVA_PARTICAO))
+        conn.execute("COMMIT")
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.execute(f"DETACH DATABASE {ESQUEMA_NOVA_PARTICAO}")
+    os.replace(caminho + '.tmp', caminho)
+
+def gravar_particoes(conn, df_desp=None):
+    # Um arquivo novo por ano, com a versão da geração que a carga vai gravar; retorna {ano: versão}.
+    # Sem DataFrame, as linhas vêm de main.despesas (migração de um banco não particionado).
+    versao = _geracao(conn) + 1
+    if df_desp is not None:
+        anos = sorted(int(a) for a in df_desp['ano'].unique())
+    else:
+        anos = [linha[0] for linha in conn.execute("SELECT DISTINCT ano FROM main.despesas ORDER BY ano")]
+
+    for ano in anos:
+        if df_desp is not None:
+            preencher = lambda tabela: inserir_em_lotes(conn, tabela, df_desp[df_desp['ano'] == ano])
+        else:
+            preencher = lambda tabela: conn.execute(f"INSERT INTO {tabela} SELECT * FROM main.despesas WHERE ano = ?", (ano,))
+        _gravar_particao(conn, ano, versao, preencher)
+    return {ano: versao for ano in anos}
+
+def atualizar_particoes(conn, versoes, particoes, df_desp):
+    # Carga incremental particionada: cada ano afetado ganha um arquivo novo (cópia da versão atual, ou
+    # vazio se o ano é novo) com os trimestres substituídos; os anos não afetados continuam como estão
+    versao = _geracao(conn) + 1
+    novas = dict(versoes)
+    for ano in sorted({int(a) for a, _ in particoes}):
+        trimestres = [int(t) for a, t in particoes if int(a) == ano]
+
+        def preencher(tabela, ano=ano, trimestres=trimestres):
+            for trimestre in trimestres:
+                conn.execute(f"DELETE FROM {tabela} WHERE ano = ? AND trimestre = ?", (ano, trimestre))
+            inserir_em_lotes(conn, tabela, df_desp[df_desp['ano'] == ano])
+
+        origem = caminho_particao(DB_PATH, ano, versoes[ano]) if ano in versoes else None
+        _gravar_particao(conn, ano, versao, preencher, origem)
+        novas[ano] = versao
+    return novas
+
+def registrar_particoes(conn, versoes):
+    if versoes:
+        valor = json.dumps({str(ano): versao for ano, versao in sorted(versoes.items())})
+        conn.execute("INSERT OR REPLACE INTO metadados (chave, valor) VALUES (?, ?)", (CHAVE_PARTICOES, valor))
+    else:
+        conn.execute("DELETE FROM metadados WHERE chave = ?", (CHAVE_PARTICOES,))
+
+def remover_particoes(versoes, manter=None):
+    # Arquivos {ano: versão} que não estão em `manter`: os substituídos (depois do COMMIT) ou os gravados
+    # por uma carga que falhou. Uma conexão da API ainda aberta no arquivo antigo segue lendo até reabrir.
+    manter = manter or {}
+    for ano, versao in versoes.items():
+        if ano in manter and manter[ano] == versao:
+            continue
+        for sufixo in ('', '-wal', '-shm', '-journal'):
+            caminho = caminho_particao(DB_PATH, ano, versao) + sufixo
+            try:
+                if os.path.exists(caminho):
+                    os.remove(caminho)
+            except OSError as e:
+                print(f"Não foi possível remover {caminho}: {e}")
+
+def particionar_banco(conn):
+    # Migração: move as despesas já carregadas em main.despesas para os arquivos por ano
+    conn.isolation_level = None
+    versoes = gravar_particoes(conn)
+    try:
+        anexar_particoes(conn, DB_PATH, versoes, somente_leitura=False)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM main.despesas")
+        registrar_particoes(conn, versoes)
+        incrementar_geracao(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        remover_particoes(versoes)
+        raise
+    print(f"Despesas particionadas por ano: {', '.join(map(str, sorted(versoes))) or 'nenhum ano'}.")
+    return sorted(versoes)
+
+def _geracao(conn):
+    linha = conn.execute("SELECT valor FROM metadados WHERE chave = 'geracao'").fetchone()
+    return int(linha[0]) if linha else 0
+
+def _gravar_parquet(df, caminho):
+    df.to_parquet(caminho + '.tmp', index=False, engine='pyarrow')
+    os.replace(caminho + '.tmp', caminho)
+
+def gravar_parquet(conn, df_desp, trimestres=None):
+    # Cópia colunar para o backend DuckDB da API, gravada antes do COMMIT e marcada com a nova geração:
+    # até o COMMIT as gerações do SQLite e do Parquet diferem e a API responde pelo SQLite.
+    # Sem `trimestres` (carga completa) regrava tudo e apaga os trimestres que deixaram de existir.
+    pasta = pasta_parquet(DB_PATH)
+    os.makedirs(pasta_despesas(pasta), exist_ok=True)
+    _gravar_parquet(pd.read_sql_query(
+        "SELECT CAST(registro_ans AS INTEGER) AS registro_ans, razao_social, uf FROM operadoras", conn
+    ), caminho_operadoras(pasta))
+
+    existentes = {(int(a), int(t)) for a, t in df_desp[['ano', 'trimestre']].drop_duplicates().itertuples(index=False)}
+    if trimestres is None:
+        trimestres = sorted(existentes)
+        manter = {caminho_trimestre(pasta, a, t) for a, t in trimestres}
+        for nome in os.listdir(pasta_despesas(pasta)):
+            if os.path.join(pasta_despesas(pasta), nome) not in manter:
+                os.remove(os.path.join(pasta_despesas(pasta), nome))
+    for ano, trimestre in trimestres:
+        ano, trimestre = int(ano), int(trimestre)
+        caminho = caminho_trimestre(pasta, ano, trimestre)
+        if (ano, trimestre) in existentes:
+            df_trimestre = df_desp[(df_desp['ano'] == ano) & (df_desp['trimestre'] == trimestre)]
+            _gravar_parquet(df_trimestre[list(TIPOS_PARQUET)].astype(TIPOS_PARQUET), caminho)
+        elif os.path.exists(caminho):
+            os.remove(caminho)
+
+    gravar_geracao(pasta, _geracao(conn))
+
+def registrar_parquet(conn, ativo):
+    if ativo:
+        conn.execute("INSERT OR REPLACE INTO metadados (chave, valor) VALUES (?, '1')", (CHAVE_PARQUET,))
+    else:
+        conn.execute("DELETE FROM metadados WHERE chave = ?", (CHAVE_PARQUET,))
+
+def remover_parquet():
+    shutil.rmtree(pasta_parquet(DB_PATH), ignore_errors=True)
+
+def incrementar_geracao(conn):
+    # A API usa a geração para invalidar caches (contagens, respostas, agregados) após cada carga
+    conn.execute("""
+        INSERT INTO metadados (chave, valor) VALUES ('geracao', '1')
+        ON CONFLICT(chave) DO UPDATE SET valor = CAST(valor AS INTEGER) + 1
+    """)
+
+def atualizar_indice_busca(conn):
+    # Mantém operadoras_busca (FTS5) e operadoras_cnpj em sincronia com operadoras, na mesma transação da carga
+    operadoras = conn.execute("SELECT registro_ans, razao_social, cnpj FROM operadoras").fetchall()
+    conn.execute("DELETE FROM operadoras_busca")
+    conn.execute("DELETE FROM operadoras_cnpj")
+    conn.executemany(
+        "INSERT INTO operadoras_busca (registro_ans, razao_social_norm, cnpj_digitos) VALUES (?, ?, ?)",
+        [(r, normalizar_texto(razao), somente_digitos(cnpj)) for r, razao, cnpj in operadoras]
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO operadoras_cnpj (cnpj_digitos, registro_ans) VALUES (?, ?)",
+        [(somente_digitos(cnpj), r) for r, _, cnpj in operadoras if cnpj]
+    )
+    conn.execute("INSERT INTO operadoras_busca (operadoras_busca) VALUES ('optimize')")
+
+def atualizar_resumos(conn):
+    # Agregados lidos pela /api/estatisticas: calculados uma vez por carga em vez de a cada requisição.
+    # Totais somados em centavos (SOMA_CENTAVOS), os mesmos que o backend DuckDB calcula sobre o Parquet.
+    for tabela in ('resumo_geral', 'resumo_operadoras', 'resumo_uf_trimestre', 'resumo_top_operadoras'):
+        conn.execute(f"DELETE FROM {tabela}")
+
+    conn.execute(f"""
+        INSERT INTO resumo_geral (id, total_geral, media_trimestral, linhas, geracao)
+        SELECT 1, COALESCE({SOMA_CENTAVOS} / 100.0, 0), COALESCE({SOMA_CENTAVOS} / 100.0 / COUNT(d.valor_despesas), 0),
+               COUNT(*), (SELECT CAST(valor AS INTEGER) FROM metadados WHERE chave = 'geracao')
+        FROM despesas d
+    """)
+    conn.execute(f"""
+        INSERT INTO resumo_operadoras (registro_ans, razao_social, uf, total, linhas)
+        SELECT o.registro_ans, o.razao_social, o.uf, {SOMA_CENTAVOS} / 100.0, COUNT(*)
+        FROM despesas d
+        JOIN operadoras o ON d.registro_ans = o.registro_ans
+        GROUP BY o.registro_ans
+    """)
+    conn.execute(f"""
+        INSERT INTO resumo_uf_trimestre (uf, ano, trimestre, total)
+        SELECT o.uf, d.ano, d.trimestre, {SOMA_CENTAVOS} / 100.0
+        FROM despesas d
+        JOIN operadoras o ON d.registro_ans = o.registro_ans
+        GROUP BY o.uf, d.ano, d.trimestre
+    """)
+    conn.execute(f"""
+        INSERT INTO resumo_top_operadoras (posicao, razao_social, total)
+        SELECT ROW_NUMBER() OVER (ORDER BY total DESC, razao_social), razao_social, total
+        FROM (
+            SELECT o.razao_social, {SOMA_CENTAVOS} / 100.0 as total
+            FROM despesas d
+            JOIN operadoras o ON d.registro_ans = o.registro_ans
+            GROUP BY o.razao_social
+            ORDER BY total DESC, o.razao_social
+            LIMIT ?
+        )
+    """, (TOP_N_RESUMO,))
+
+def _variacoes(serie):
+    # serie: uma linha por (chave, periodo), ordenada. Compara cada linha com as até 4 anteriores da
+    # mesma chave; como os períodos são crescentes, periodo - 1 e periodo - 4 só podem estar nessas 4.
+    chave = serie['chave'].to_numpy()
+    periodo = serie['periodo'].to_numpy(dtype='int64')
+    total = serie['total'].to_numpy(dtype='float64')
+    n = len(serie)
+
+    anterior = np.full(n, np.nan)
+    ano_anterior = np.full(n, np.nan)
+    soma = total.copy()
+    contagem = np.ones(n)
+    for k in range(1, 5):
+        mesma = np.zeros(n, dtype=bool)
+        mesma[k:] = chave[k:] == chave[:-k]
+        periodo_k = np.full(n, np.iinfo('int64').min)
+        periodo_k[k:] = periodo[:-k]
+        total_k = np.full(n, np.nan)
+        total_k[k:] = total[:-k]
+
+        anterior = np.where(mesma & (periodo_k == periodo - 1), total_k, anterior)
+        ano_anterior = np.where(mesma & (periodo_k == periodo - 4), total_k, ano_anterior)
+        janela = mesma & (periodo_k >= periodo - 3)
+        soma += np.where(janela, total_k, 0.0)
+        contagem += janela
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        serie['variacao_trimestral'] = np.where(anterior != 0, (total - anterior) / anterior, np.nan)
+        serie['variacao_anual'] = np.where(ano_anterior != 0, (total - ano_anterior) / ano_anterior, np.nan)
+    serie['media_movel_4t'] = soma / contagem
+    return serie
+
+def atualizar_series(conn):
+    # Séries da /api/analises: total por trimestre com variação QoQ/YoY e média móvel de 4 trimestres
+    # (média dos trimestres presentes entre periodo - 3 e periodo). Uma única agregação no SQL; as
+    # comparações entre trimestres são vetorizadas, bem mais rápidas que janelas RANGE no SQLite.
+    # Totais em centavos inteiros (SOMA_CENTAVOS, como nos resumos), divididos por 100 só no fim
+    base = pd.read_sql_query(f"""
+        SELECT d.registro_ans AS chave, d.ano, d.trimestre, {SOMA_CENTAVOS} AS centavos
+        FROM despesas d
+        GROUP BY d.registro_ans, d.ano, d.trimestre
+    """, conn)
+    base['periodo'] = base['ano'] * 4 + base['trimestre'] - 1
+
+    ufs = pd.read_sql_query("SELECT registro_ans AS chave, uf FROM operadoras", conn)
+    base_uf = (base.merge(ufs, on='chave')
+                   .dropna(subset=['uf'])
+                   .groupby(['uf', 'ano', 'trimestre', 'periodo'], as_index=False)['centavos'].sum()
+                   .rename(columns={'uf': 'chave'}))
+    for serie in (base, base_uf):
+        serie['total'] = serie.pop('centavos') / 100
+
+    colunas = ['periodo', 'ano', 'trimestre', 'total', 'variacao_trimestral', 'variacao_anual', 'media_movel_4t']
+    for tabela, coluna, serie in (('serie_operadoras', 'registro_ans', base), ('serie_uf', 'uf', base_uf)):
+        serie = _variacoes(serie.sort_values(['chave', 'periodo'], ignore_index=True))
+        conn.execute(f"DELETE FROM {tabela}")
+        inserir_em_lotes(conn, tabela, serie[['chave'] + colunas].rename(columns={'chave': coluna}))
+
+def _ler_tabelas(periodos=None):
+    # Dimensão e fato do transformer já vêm no formato das tabelas: uma linha por operadora, sem deduplicar.
+    # periodos (ano * 4 + trimestre - 1) restringe o fato às partições pedidas.
+    df_ops = ler_tabela(OPERADORAS_DIM, TIPOS_OPERADORAS, colunas=['RegistroANS', 'CNPJ', 'RazaoSocial', 'Modalidade', 'UF'])
+    df_ops.columns = ['registro_ans', 'cnpj', 'razao_social', 'modalidade', 'uf']
+
+    df_fato = ler_tabela(DESPESAS_FATO, TIPOS_DESPESAS)
+    periodo = df_fato['Periodo'].to_numpy()
+    if periodos is not None:
+        manter = np.isin(periodo, list(periodos))
+        df_fato, periodo = df_fato[manter], periodo[manter]
+
+    df_desp = pd.DataFrame({
+        'registro_ans': df_fato['RegistroANS'].to_numpy(),
+        'ano': periodo // 4,
+        'trimestre': periodo % 4 + 1,
+        'valor_despesas': df_fato['Valor Despesas'].to_numpy(),
+    })
+    return df_ops, df_desp
+
+def importar_dados(incremental=False, particionar=False, parquet=False):
+    print(">>> Importando dados processados para o SQL...")
     
-    if not os.path.exists(CSV_DESPESAS):
-        print("CSV de despesas não encontrado. Rode o transformer.py.")
+    if localizar_tabela(OPERADORAS_DIM) is None or localizar_tabela(DESPESAS_FATO) is None:
+        print("Base de despesas não encontrada. Rode o transformer.py.")
         return
 
+    if parquet and not PARQUET_DISPONIVEL:
+        print("pyarrow não instalado: a cópia Parquet para o DuckDB não será gravada.")
+        parquet = False
+
+    if incremental:
+        return importar_particoes()
+
     conn = get_connection()
+    conn.isolation_level = None
+    versoes_anteriores, versoes, concluida = {}, {}, False
     
     try:
-        df = pd.read_csv(CSV_DESPESAS, sep=';', encoding='utf-8')
-        
-        df_ops = df[['RegistroANS', 'CNPJ', 'RazaoSocial', 'Modalidade', 'UF']].drop_duplicates(subset=['RegistroANS'])
-        
-        df_ops.columns = ['registro_ans', 'cnpj', 'razao_social', 'modalidade', 'uf']
-        
-        
-        conn.execute("DELETE FROM operadoras")
-        df_ops.to_sql('operadoras', conn, if_exists='append', index=False)
+        df_ops, df_desp = _ler_tabelas()
+
+        configurar_carga(conn)
+        inicio = time.perf_counter()
+
+        # Particionado: as despesas vão para arquivos novos por ano (a API só passa a lê-los no COMMIT),
+        # anexados para os resumos
+        versoes_anteriores = versoes_particoes(conn)
+        versoes = gravar_particoes(conn, df_desp) if particionar else {}
+        anos = sorted(versoes)
+        # (a view só é criada depois da troca: o RENAME revalida os índices de main.despesas e a view os esconderia)
+        anexar_particoes(conn, DB_PATH, versoes, somente_leitura=False, criar_view=False)
+        tabelas = [('operadoras', df_ops)] + ([] if particionar else [('despesas', df_desp)])
+
+        # Carga em tabelas de staging sem índices, dentro de uma única transação;
+        # a troca (DROP + RENAME + índices) só fica visível para a API no COMMIT
+        conn.execute("BEGIN IMMEDIATE")
+        for tabela, df_tabela in tabelas:
+            staging = f"{tabela}_staging"
+            conn.execute(f"DROP TABLE IF EXISTS {staging}")
+            conn.execute(_ddl_tabela(conn, tabela, staging))
+            inserir_em_lotes(conn, staging, df_tabela)
+
+        for tabela, _ in tabelas:
+            indices = _indices(conn, tabela)
+            conn.execute(f"DROP TABLE main.{tabela}")
+            conn.execute(f"ALTER TABLE {tabela}_staging RENAME TO {tabela}")
+            for sql_indice in indices:
+                conn.execute(sql_indice)
+        if particionar:
+            conn.execute("DELETE FROM main.despesas")
+        criar_view_despesas(conn, anos)
+        registrar_particoes(conn, versoes)
+        atualizar_indice_busca(conn)
+        incrementar_geracao(conn)
+        atualizar_resumos(conn)
+        atualizar_series(conn)
+        registrar_parquet(conn, parquet)
+        if parquet:
+            gravar_parquet(conn, df_desp)
+        conn.execute("COMMIT")
+        concluida = True
+        if not parquet:
+            remover_parquet()
+
+        segundos = time.perf_counter() - inicio
+        total = len(df_ops) + len(df_desp)
         print(f"Importadas {len(df_ops)} operadoras.")
-        
-      
-        df_desp = df[['RegistroANS', 'Ano', 'Trimestre', 'Valor Despesas']]
-        df_desp.columns = ['registro_ans', 'ano', 'trimestre', 'valor_despesas']
-        
-        conn.execute("DELETE FROM despesas")
-        df_desp.to_sql('despesas', conn, if_exists='append', index=False)
-        print(f"Importados {len(df_desp)} registros de despesas.")
-        
-        conn.commit()
+        print(f"Importados {len(df_desp)} registros de despesas" + (f" em {len(anos)} partições anuais." if anos else "."))
+        if parquet:
+            print(f"Cópia Parquet para o DuckDB em {pasta_parquet(DB_PATH)}.")
+        print(f"Carga concluída em {segundos:.2f}s ({total / segundos:,.0f} linhas/s).")
+
+        conn.execute("PRAGMA optimize")
         
     except Exception as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
         print(f"Erro na importação: {e}")
     finally:
         conn.close()
+        # Depois do COMMIT saem os arquivos substituídos; numa carga que falhou, os que ela gravou
+        if concluida:
+            remover_particoes(versoes_anteriores, manter=versoes)
+        else:
+            remover_particoes(versoes, manter=versoes_anteriores)
+
+def importar_particoes():
+    # Upsert apenas das partições (ano, trimestre) que o processor marcou como pendentes no manifesto
+    manifest = mf.carregar_manifest()
+    particoes = mf.particoes_pendentes(manifest)
+
+    if not particoes:
+        print("Nenhuma partição pendente no manifesto.")
+        return
+
+    conn = get_connection()
+    conn.isolation_level = None
+    versoes_anteriores, versoes, concluida = {}, {}, False
+
+    try:
+        df_ops, df_desp = _ler_tabelas(periodos={int(a) * 4 + int(t) - 1 for a, t in particoes})
+
+        configurar_carga(conn)
+        inicio = time.perf_counter()
+
+        # Banco particionado: cada ano afetado é regravado em um arquivo novo antes da transação principal
+        # (uma transação sobre vários bancos anexados não é atômica em WAL); o COMMIT troca as versões
+        versoes_anteriores = versoes_particoes(conn)
+        if versoes_anteriores:
+            versoes = atualizar_particoes(conn, versoes_anteriores, particoes, df_desp)
+            anexar_particoes(conn, DB_PATH, versoes, somente_leitura=False)
+
+        # Leitores continuam vendo os dados antigos até o COMMIT
+        conn.execute("BEGIN IMMEDIATE")
+        inserir_em_lotes(conn, 'operadoras', df_ops, comando="INSERT OR REPLACE")
+        if versoes:
+            registrar_particoes(conn, versoes)
+        else:
+            for ano, trimestre in particoes:
+                conn.execute("DELETE FROM despesas WHERE ano = ? AND trimestre = ?", (int(ano), int(trimestre)))
+            inserir_em_lotes(conn, 'despesas', df_desp)
+        atualizar_indice_busca(conn)
+        copia_em_dia = ler_geracao(pasta_parquet(DB_PATH)) == _geracao(conn)
+        incrementar_geracao(conn)
+        atualizar_resumos(conn)
+        atualizar_series(conn)
+        if parquet_ativo(conn):
+            if copia_em_dia:
+                gravar_parquet(conn, df_desp, trimestres=particoes)
+            else:
+                # Cópia ausente ou de outra carga: regrava todos os trimestres a partir do banco
+                gravar_parquet(conn, pd.read_sql_query(
+                    "SELECT CAST(registro_ans AS INTEGER) AS registro_ans, ano, trimestre, valor_despesas FROM despesas", conn
+                ))
+        conn.execute("COMMIT")
+        concluida = True
+
+        segundos = time.perf_counter() - inicio
+        print(f"Atualizadas {len(df_ops)} operadoras.")
+        print(f"Partições atualizadas: {', '.join(f'{a}/{t}T' for a, t in particoes)} ({len(df_desp)} registros).")
+        print(f"Carga concluída em {segundos:.2f}s ({(len(df_ops) + len(df_desp)) / segundos:,.0f} linhas/s).")
+
+        mf.marcar_carregados(manifest)
+        mf.salvar_manifest(manifest)
+
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        print(f"Erro na importação: {e}")
+    finally:
+        conn.close()
+        if concluida:
+            remover_particoes(versoes_anteriores, manter=versoes)
+        else:
+            remover_particoes(versoes, manter=versoes_anteriores)
+
+def verificar_planos(conn=None, detalhado=True):
+    # Regressão de plano: nenhuma consulta analítica (querys.sql) ou da API pode ler uma tabela inteira.
+    # Varrer um índice de cobertura é aceito (agregados sobre tudo); "SCAN <tabela>" sem índice não.
+    proprio = conn is None
+    if proprio:
+        conn = get_connection()
+        anexar_particoes(conn, DB_PATH, somente_leitura=False)
+    consultas = [(f"querys.sql #{i}", sql, ()) for i, sql in enumerate(_ler_script()[1], 1)] + CONSULTAS_API
+    varreduras = []
+    try:
+        # Com partições, `despesas` é a view que une os anos: varrer o resultado dela não é ler uma tabela
+        # (as partições em si aparecem no plano com o próprio nome)
+        views = {linha[0] for linha in conn.execute(
+            "SELECT name FROM sqlite_temp_master WHERE type = 'view' UNION SELECT name FROM sqlite_master WHERE type = 'view'"
+        )}
+        for nome, sql, params in consultas:
+            origens = {alias or tabela: tabela for tabela, alias in RE_ORIGEM.findall(sql)}
+            detalhes = [linha[3] for linha in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            for detalhe in detalhes:
+                varredura = RE_VARREDURA.match(detalhe)
+                if varredura and origens.get(varredura.group(1), varredura.group(1)) not in views:
+                    varreduras.append((nome, detalhe))
+            erro = any(n == nome for n, _ in varreduras)
+            print(f"{'ERRO' if erro else 'ok':<6}{nome}")
+            for detalhe in detalhes if detalhado or erro else []:
+                print(f"        {detalhe}")
+    finally:
+        if proprio:
+            conn.close()
+    return varreduras
 
 def executar_query_teste():
     print("\n>>> Testando banco de dados (Query: Top 3 Despesas):")
     conn = get_connection()
+    anexar_particoes(conn, DB_PATH, somente_leitura=False)
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -91,6 +672,34 @@ def executar_query_teste():
     conn.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cria o banco SQLite e importa os dados processados.")
+    parser.add_argument('--incremental', action='store_true', help="Atualiza só as partições pendentes no manifesto.")
+    parser.add_argument('--particionar-anos', action='store_true',
+                        help="Grava as despesas em um arquivo por ano (<banco>_<ano>.db), anexados ao banco principal.")
+    parser.add_argument('--parquet-analitico', action='store_true',
+                        help="Grava também uma cópia das despesas em Parquet (<banco>_parquet/) para o backend DuckDB da API.")
+    parser.add_argument('--migrar', action='store_true',
+                        help="Só atualiza o esquema de um banco existente (com --particionar-anos, move as despesas para os arquivos por ano).")
+    parser.add_argument('--verificar-planos', action='store_true',
+                        help="Confere os planos das consultas (EXPLAIN QUERY PLAN) e falha se alguma ler uma tabela inteira.")
+    args = parser.parse_args()
+
+    if args.verificar_planos:
+        varreduras = verificar_planos()
+        if varreduras:
+            print(f"\n{len(varreduras)} varredura(s) de tabela: {', '.join(dict.fromkeys(nome for nome, _ in varreduras))}")
+            raise SystemExit(1)
+        raise SystemExit(0)
+
     criar_tabelas()
-    importar_dados()
-    executar_query_teste()
\ No newline at end of file
+    if args.migrar:
+        if args.particionar_anos:
+            conn = get_connection()
+            try:
+                if not anos_particionados(conn):
+                    particionar_banco(conn)
+            finally:
+                conn.close()
+    else:
+        importar_dados(incremental=args.incremental, particionar=args.particionar_anos, parquet=args.parquet_analitico)
+        executar_query_teste()
\ No newline at end of file
@@ -0,0 +1,150 @@
+import os
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+FORMATO_PADRAO = 'parquet' if PARQUET_DISPONIVEL else 'csv'
+FORMATOS = ('parquet', 'csv')
+
+# Tipos explícitos de cada etapa: nada de reinferir strings a cada leitura
+TIPOS_CONSOLIDADO = {
+    'RegistroANS': 'Int64',
+    'Ano': 'Int16',
+    'Trimestre': 'Int8',
+    'Valor Despesas': 'float64'
+}
+
+TIPOS_FINAL = {
+    'RegistroANS': 'Int64',
+    'Ano': 'Int16',
+    'Trimestre': 'Int8',
+    'Valor Despesas': 'float64',
+    'CNPJ': 'string',
+    'RazaoSocial': 'string',
+    'Modalidade': 'category',
+    'UF': 'category',
+    'CNPJ_Valido': 'boolean'
+}
+
+# Esquema estrela gerado pelo transformer: dimensão de operadoras (uma linha por registro, atributos
+# categóricos) e fato de despesas só com chaves inteiras e valor (14 bytes por linha em memória)
+TIPOS_OPERADORAS = {
+    'RegistroANS': 'int32',
+    'CNPJ': 'string',
+    'RazaoSocial': 'string',
+    'Modalidade': 'category',
+    'UF': 'category',
+    'CNPJ_Valido': 'boolean'
+}
+
+TIPOS_DESPESAS = {
+    'RegistroANS': 'int32',
+    'Periodo': 'int16',  # ano * 4 + trimestre - 1
+    'Valor Despesas': 'float64'
+}
+
+
+def caminho_tabela(base, formato):
+    return f"{base}.{formato}"
+
+
+def aplicar_tipos(df, tipos):
+    for col, tipo in tipos.items():
+        if col not in df.columns:
+            continue
+        serie = df[col]
+        if tipo in ('Int64', 'Int16', 'Int8', 'int32', 'int16', 'float64'):
+            serie = pd.to_numeric(serie, errors='coerce')
+            if tipo != 'float64':
+                serie = serie.astype(tipo)
+        elif tipo == 'boolean':
+            if not pd.api.types.is_bool_dtype(serie):
+                serie = serie.map({'True': True, 'False': False, True: True, False: False})
+            serie = serie.astype('boolean')
+        else:
+            serie = serie.astype(tipo)
+        df[col] = serie
+    return df
+
+
+def salvar_tabela(df, base, tipos, formato=FORMATO_PADRAO, exportar_csv=False):
+    df = aplicar_tipos(df.copy(deep=False), tipos)
+    # O CSV opcional é gravado antes para que o formato principal seja o mais recente em disco
+    if formato == 'csv' or exportar_csv:
+        df.to_csv(caminho_tabela(base, 'csv'), index=False, sep=';', encoding='utf-8')
+    if formato == 'parquet':
+        df.to_parquet(caminho_tabela(base, 'parquet'), index=False, engine='pyarrow')
+    return caminho_tabela(base, formato)
+
+
+def localizar_tabela(base):
+    # Se houver mais de um formato em disco, vale o mais recente
+    existentes = [caminho_tabela(base, f) for f in FORMATOS if os.path.exists(caminho_tabela(base, f))]
+    if not PARQUET_DISPONIVEL:
+        existentes = [c for c in existentes if not c.endswith('.parquet')]
+    if not existentes:
+        return None
+    return max(existentes, key=os.path.getmtime)
+
+
+def ler_tabela(base, tipos, colunas=None, memory_map=True):
+    caminho = localizar_tabela(base)
+    if caminho is None:
+        return None
+    if caminho.endswith('.parquet'):
+        return pd.read_parquet(caminho, columns=colunas, memory_map=memory_map)
+    df = pd.read_csv(caminho, sep=';', encoding='utf-8', dtype=str, usecols=colunas)
+    return aplicar_tipos(df, tipos)
+
+
+class EscritorTabela:
+    # Escrita incremental (um chunk por vez) mantendo o mesmo schema tipado entre os chunks
+
+    def __init__(self, base, tipos, formato=FORMATO_PADRAO, exportar_csv=False):
+        self.base = base
+        self.tipos = tipos
+        self.formato = formato
+        self.exportar_csv = exportar_csv
+        self.linhas = 0
+        self._parquet = None
+        self._csv = None
+        self._schema = None
+
+    def _temp(self, formato):
+        return caminho_tabela(self.base, formato) + '.tmp'
+
+    def __enter__(self):
+        if self.formato == 'csv' or self.exportar_csv:
+            self._csv = open(self._temp('csv'), 'w', encoding='utf-8', newline='')
+        return self
+
+    def escrever(self, df):
+        df = aplicar_tipos(df.copy(deep=False), self.tipos)
+        if self.formato == 'parquet':
+            tabela = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            if self._parquet is None:
+                self._schema = tabela.schema
+                self._parquet = pq.ParquetWriter(self._temp('parquet'), self._schema)
+            self._parquet.write_table(tabela)
+        if self._csv is not None:
+            df.to_csv(self._csv, index=False, sep=';', header=self._csv.tell() == 0)
+        self.linhas += len(df)
+
+    def __exit__(self, tipo_erro, erro, tb):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._csv is not None:
+            self._csv.close()
+
+        escritos = [f for f in reversed(FORMATOS) if os.path.exists(self._temp(f))]
+        for f in escritos:
+            if tipo_erro is None and self.linhas:
+                os.replace(self._temp(f), caminho_tabela(self.base, f))
+            else:
+                os.remove(self._temp(f))
+        return False
@@ -0,0 +1,189 @@
+import io
+import json
+import mmap
+import os
+import struct
+import zipfile
+import zlib
+
+import pandas as pd
+
+VERSAO_INDICE = 2  # incrementar quando mudar o conteúdo do índice (ou o layout gravado nele)
+
+TAMANHO_BLOCO = 1024 * 1024  # bytes comprimidos lidos do mmap por vez
+TAMANHO_AMOSTRA = 64 * 1024  # início do membro usado para achar cabeçalho, encoding e separador
+SEPARADORES = (';', ',', '\t')
+
+# Cabeçalho local de cada membro (30 bytes): o nome e o campo extra vêm logo depois, e então os dados
+ESTRUTURA_CABECALHO_LOCAL = struct.Struct('<4sHHHHHLLLHH')
+ASSINATURA_CABECALHO_LOCAL = b'PK\x03\x04'
+
+METODOS_DIRETOS = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+
+
+def caminho_indice(caminho_zip):
+    return caminho_zip + '.indice.json'
+
+
+def carregar_indice(caminho_zip):
+    # Só vale se o ZIP não mudou desde a indexação (tamanho e mtime)
+    try:
+        with open(caminho_indice(caminho_zip), 'r', encoding='utf-8') as f:
+            indice = json.load(f)
+        st = os.stat(caminho_zip)
+    except (OSError, ValueError):
+        return None
+    if indice.get('versao') != VERSAO_INDICE or indice.get('tamanho_zip') != st.st_size or indice.get('mtime_zip') != st.st_mtime:
+        return None
+    return indice
+
+
+def salvar_indice(caminho_zip, indice):
+    caminho = caminho_indice(caminho_zip)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(indice, f, indent=2, ensure_ascii=False)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def offset_dados(arquivo, info):
+    # O central directory não traz o tamanho do campo extra local: é preciso ler o cabeçalho local
+    arquivo.seek(info.header_offset)
+    campos = ESTRUTURA_CABECALHO_LOCAL.unpack(arquivo.read(ESTRUTURA_CABECALHO_LOCAL.size))
+    if campos[0] != ASSINATURA_CABECALHO_LOCAL:
+        raise zipfile.BadZipFile(f"Cabeçalho local inválido para {info.filename}")
+    return info.header_offset + ESTRUTURA_CABECALHO_LOCAL.size + campos[9] + campos[10]
+
+
+def detectar_encoding(amostra):
+    # Os arquivos da ANS são latin1; só um BOM garante UTF-8. Uma amostra que decodifica como UTF-8 não basta:
+    # um byte latin1 depois dela quebraria a leitura no meio (e latin1 decodifica qualquer byte)
+    if amostra.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    return 'latin1'
+
+
+def detectar_separador(cabecalho):
+    return max(SEPARADORES, key=cabecalho.count) if any(s in cabecalho for s in SEPARADORES) else ';'
+
+
+def construir_indice(caminho_zip, escolher_membro, layout=None):
+    st = os.stat(caminho_zip)
+    indice = {'versao': VERSAO_INDICE, 'tamanho_zip': st.st_size, 'mtime_zip': st.st_mtime, 'membro': None}
+
+    with zipfile.ZipFile(caminho_zip, 'r') as z:
+        membro = escolher_membro(z)
+        if not membro:
+            return indice
+        info = z.getinfo(membro)
+        with open(caminho_zip, 'rb') as f:
+            offset = offset_dados(f, info)
+        with z.open(info) as f:
+            amostra = f.read(TAMANHO_AMOSTRA)
+
+    encoding = detectar_encoding(amostra)
+    cabecalho = amostra.split(b'\n', 1)[0].decode(encoding).rstrip('\r')
+    separador = detectar_separador(cabecalho)
+    colunas = list(pd.read_csv(io.StringIO(cabecalho), sep=separador, nrows=0).columns)
+
+    indice.update({
+        'membro': membro,
+        'offset': offset,
+        'compressao': info.compress_type,
+        'criptografado': bool(info.flag_bits & 0x1),
+        'tamanho_comprimido': info.compress_size,
+        'tamanho': info.file_size,
+        'crc': info.CRC,
+        'cabecalho': cabecalho,
+        'encoding': encoding,
+        'separador': separador,
+        'colunas': colunas,
+    })
+    if layout is not None:
+        indice['layout'] = layout(colunas)
+    return indice
+
+
+def obter_indice(caminho_zip, escolher_membro, layout=None):
+    # Primeira execução: abre o ZIP, escolhe o membro e analisa o cabeçalho; as seguintes só leem o JSON
+    indice = carregar_indice(caminho_zip)
+    if indice is None:
+        indice = construir_indice(caminho_zip, escolher_membro, layout)
+        salvar_indice(caminho_zip, indice)
+    return indice
+
+
+class LeitorMembro(io.RawIOBase):
+    # Lê um membro direto do mmap do ZIP: fatias do arquivo para membros "stored",
+    # descompressão zlib em blocos para "deflated". O CRC é conferido ao chegar no fim.
+
+    def __init__(self, caminho_zip, indice, tamanho_bloco=TAMANHO_BLOCO):
+        super().__init__()
+        self._arquivo = open(caminho_zip, 'rb')
+        self._mapa = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        self._visao = memoryview(self._mapa)
+        self._membro = indice['membro']
+        self._posicao = indice['offset']
+        self._fim = indice['offset'] + indice['tamanho_comprimido']
+        self._tamanho_bloco = tamanho_bloco
+        self._descompressor = zlib.decompressobj(-zlib.MAX_WBITS) if indice['compressao'] == zipfile.ZIP_DEFLATED else None
+        self._pendente = b''
+        self._inicio_pendente = 0
+        self._crc = 0
+        self._crc_esperado = indice['crc']
+        self._restante = indice['tamanho']
+
+    def readable(self):
+        return True
+
+    def _proximo_bloco(self):
+        entrada = self._visao[self._posicao:min(self._posicao + self._tamanho_bloco, self._fim)]
+        self._posicao += len(entrada)
+        if self._descompressor is None:
+            return entrada
+        with entrada:
+            dados = self._descompressor.decompress(entrada)
+        if self._posicao >= self._fim:
+            dados += self._descompressor.flush()
+        return memoryview(dados)
+
+    def readinto(self, buffer):
+        while self._inicio_pendente >= len(self._pendente):
+            if self._posicao >= self._fim:
+                self._conferir()
+                return 0
+            self._liberar_pendente()
+            self._pendente = self._proximo_bloco()
+            self._inicio_pendente = 0
+
+        n = min(len(buffer), len(self._pendente) - self._inicio_pendente)
+        trecho = self._pendente[self._inicio_pendente:self._inicio_pendente + n]
+        buffer[:n] = trecho
+        self._crc = zlib.crc32(trecho, self._crc)
+        self._restante -= n
+        self._inicio_pendente += n
+        return n
+
+    def _conferir(self):
+        if self._restante != 0 or self._crc != self._crc_esperado:
+            raise zipfile.BadZipFile(f"CRC ou tamanho inválido em {self._membro}")
+
+    def _liberar_pendente(self):
+        # Fatias do mmap precisam ser liberadas antes de fechá-lo (e recortar memoryview não copia)
+        if isinstance(self._pendente, memoryview):
+            self._pendente.release()
+
+    def close(self):
+        if not self.closed:
+            self._liberar_pendente()
+            self._visao.release()
+            self._mapa.close()
+            self._arquivo.close()
+        super().close()
+
+
+def abrir_membro(caminho_zip, indice):
+    # Métodos que o zlib não cobre (bzip2, lzma) e membros criptografados ficam com o zipfile
+    if indice['compressao'] in METODOS_DIRETOS and not indice.get('criptografado'):
+        return io.BufferedReader(LeitorMembro(caminho_zip, indice), buffer_size=TAMANHO_BLOCO)
+    with zipfile.ZipFile(caminho_zip, 'r') as z:
+        return z.open(indice['membro'])
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+
+MANIFEST_PATH = "data/processed/manifest.json"
+
+# Ciclo de vida de cada ZIP no manifesto:
+#   processado -> entrou no consolidado.csv (delta) mas ainda não foi carregado no banco
+#   carregado  -> a partição (ano, trimestre) já foi gravada no SQLite
+STATUS_PROCESSADO = 'processado'
+STATUS_CARREGADO = 'carregado'
+
+
+def carregar_manifest(caminho=MANIFEST_PATH):
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    manifest.setdefault('arquivos', {})
+    return manifest
+
+
+def salvar_manifest(manifest, caminho=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def hash_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    h = hashlib.sha1()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def arquivo_alterado(manifest, nome, caminho):
+    entrada = manifest['arquivos'].get(nome)
+    if not entrada or entrada.get('status') != STATUS_CARREGADO:
+        return True
+
+    st = os.stat(caminho)
+    if st.st_size != entrada.get('tamanho'):
+        return True
+    if st.st_mtime == entrada.get('mtime'):
+        return False
+
+    # Mesmo tamanho mas mtime diferente (ex.: download refeito): o hash decide
+    if hash_arquivo(caminho) != entrada.get('sha1'):
+        return True
+    entrada['mtime'] = st.st_mtime
+    return False
+
+
+def registrar_processado(manifest, nome, caminho, ano, trimestre, linhas):
+    st = os.stat(caminho)
+    manifest['arquivos'][nome] = {
+        'tamanho': st.st_size,
+        'mtime': st.st_mtime,
+        'sha1': hash_arquivo(caminho),
+        'ano': int(ano),
+        'trimestre': str(trimestre),
+        'linhas': int(linhas),
+        'status': STATUS_PROCESSADO
+    }
+
+
+def registrar_consolidado(manifest, caminho):
+    # Consolidado gravado junto com este manifesto: sem ele (ou com outro arquivo no lugar) o delta se perdeu
+    st = os.stat(caminho)
+    manifest['consolidado'] = {'caminho': caminho, 'tamanho': st.st_size, 'mtime': st.st_mtime}
+
+
+def consolidado_em_dia(manifest, caminho):
+    registrado = manifest.get('consolidado')
+    if not caminho or not registrado or not os.path.exists(caminho):
+        return False
+    st = os.stat(caminho)
+    return registrado == {'caminho': caminho, 'tamanho': st.st_size, 'mtime': st.st_mtime}
+
+
+def particoes_pendentes(manifest):
+    return sorted({
+        (e['ano'], e['trimestre'])
+        for e in manifest['arquivos'].values()
+        if e.get('status') == STATUS_PROCESSADO
+    })
+
+
+def marcar_carregados(manifest):
+    for entrada in manifest['arquivos'].values():
+        if entrada.get('status') == STATUS_PROCESSADO:
+            entrada['status'] = STATUS_CARREGADO
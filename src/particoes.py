@@ -0,0 +1,66 @@
+import json
+import os
+import sqlite3
+from urllib.request import pathname2url
+
+# Particionamento opcional de despesas por ano (database.py --particionar-anos): cada ano fica em
+# <banco>_<ano>.g<versão>.db, anexado como p<ano>. A view temporária `despesas` une as partições e esconde
+# a tabela (vazia) do banco principal, então as consultas da API e dos resumos não mudam.
+# A versão é a geração da carga que gravou o arquivo: uma carga nunca altera um arquivo em uso, grava
+# arquivos novos e só o COMMIT do banco principal (metadados) passa a apontar para eles.
+CHAVE_PARTICOES = 'particoes_ano'
+# Só as colunas consultadas: assim cada partição responde pelos índices de cobertura
+COLUNAS_VIEW = 'registro_ans, ano, trimestre, valor_despesas'
+
+
+def caminho_particao(caminho_db, ano, versao=None):
+    # Sem versão: nome dos bancos particionados antes do versionamento (<banco>_<ano>.db)
+    base, extensao = os.path.splitext(caminho_db)
+    sufixo = '' if versao is None else f".g{int(versao)}"
+    return f"{base}_{int(ano)}{sufixo}{extensao or '.db'}"
+
+
+def esquema_particao(ano):
+    return f"p{int(ano)}"
+
+
+def versoes_particoes(conn):
+    # {ano: versão do arquivo} gravado pela carga em metadados; vazio se o banco não está particionado
+    try:
+        linha = conn.execute("SELECT valor FROM main.metadados WHERE chave = ?", (CHAVE_PARTICOES,)).fetchone()
+    except sqlite3.OperationalError:
+        return {}
+    if not linha:
+        return {}
+    valor = json.loads(linha[0])
+    if isinstance(valor, list):
+        # Formato antigo: só a lista de anos, arquivos sem versão
+        return {int(ano): None for ano in valor}
+    return {int(ano): versao for ano, versao in valor.items()}
+
+
+def anos_particionados(conn):
+    return sorted(versoes_particoes(conn))
+
+
+def criar_view_despesas(conn, anos):
+    conn.execute("DROP VIEW IF EXISTS temp.despesas")
+    if anos:
+        uniao = " UNION ALL ".join(f"SELECT {COLUNAS_VIEW} FROM {esquema_particao(ano)}.despesas" for ano in anos)
+        conn.execute(f"CREATE TEMP VIEW despesas AS {uniao}")
+
+
+def anexar_particoes(conn, caminho_db, versoes=None, somente_leitura=True, criar_view=True):
+    # ATTACH não é permitido dentro de transação nem com query_only: chamar logo após conectar
+    versoes = versoes_particoes(conn) if versoes is None else versoes
+    anos = sorted(versoes)
+    anexados = {linha[1] for linha in conn.execute("PRAGMA database_list")}
+    for ano in anos:
+        if esquema_particao(ano) in anexados:
+            continue
+        caminho = os.path.abspath(caminho_particao(caminho_db, ano, versoes[ano]))
+        alvo = f"file:{pathname2url(caminho)}?mode=ro" if somente_leitura else caminho
+        conn.execute(f"ATTACH DATABASE ? AS {esquema_particao(ano)}", (alvo,))
+    if criar_view:
+        criar_view_despesas(conn, anos)
+    return anos
@@ -0,0 +1,346 @@
+import argparse
+import cProfile
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import sqlite3
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime
+from graphlib import TopologicalSorter
+
+try:
+    import resource
+except ImportError:  # Windows: sem ru_maxrss
+    resource = None
+
+import analitico
+import database
+import processor
+import scraper
+import transformer
+from formato import FORMATO_PADRAO, FORMATOS, PARQUET_DISPONIVEL, localizar_tabela
+
+if PARQUET_DISPONIVEL:
+    import pyarrow.parquet as pq
+
+# Os módulos do pipeline usam caminhos relativos à raiz do projeto (data/raw, data/processed)
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ESTADO_PATH = "data/processed/pipeline_estado.json"
+RELATORIOS_DIR = "data/processed/relatorios"
+CADASTRO_PATH = "data/raw/cadastro_operadoras.csv"
+TOP_ALOCACOES = 10
+OPCOES_SAIDA = ('incremental', 'formato', 'particionar_anos', 'parquet_analitico')  # opções que mudam o resultado (as demais só mudam o desempenho)
+
+Etapa = namedtuple('Etapa', ['nome', 'depende', 'executar', 'entradas', 'saidas', 'sempre_executar'])
+
+
+def _tabela(base):
+    caminho = localizar_tabela(base)
+    return [caminho] if caminho else []
+
+
+def _tabelas_estrela():
+    return _tabela(transformer.FILE_OPERADORAS) + _tabela(transformer.FILE_DESPESAS)
+
+
+def _bancos():
+    # Banco principal e, se particionado, os arquivos por ano (<banco>_<ano>.g<versão>.db); com a cópia Parquet,
+    # o geracao.json dela (reescrito a cada carga)
+    if not os.path.exists(database.DB_PATH):
+        return []
+    base, extensao = os.path.splitext(database.DB_PATH)
+    geracao_parquet = os.path.join(analitico.pasta_parquet(database.DB_PATH), analitico.ARQUIVO_GERACAO)
+    return ([database.DB_PATH] + sorted(glob.glob(f"{base}_[0-9][0-9][0-9][0-9]*{extensao}"))
+            + ([geracao_parquet] if os.path.exists(geracao_parquet) else []))
+
+
+def _zips():
+    return sorted(p for p in glob.glob(os.path.join(processor.RAW_DIR, '*.zip')) if processor.eh_zip_trimestre(p))
+
+
+def _executar_coleta(opcoes):
+    scraper.baixar_arquivos_recentes(processor.RAW_DIR, max_workers=opcoes['workers_download'])
+
+
+def _executar_processamento(opcoes):
+    # 0: modo incremental sem ZIP novo e com o consolidado conferido contra o manifesto (nada a reescrever)
+    total = processor.processar_arquivos(streaming=opcoes['streaming'], workers=opcoes['workers'],
+                                         incremental=opcoes['incremental'], formato=opcoes['formato'])
+    return total == 0
+
+
+def _executar_transformacao(opcoes):
+    transformer.main(incremental=opcoes['incremental'], formato=opcoes['formato'])
+
+
+def _executar_carga(opcoes):
+    database.criar_tabelas()
+    database.importar_dados(incremental=opcoes['incremental'], particionar=opcoes['particionar_anos'],
+                            parquet=opcoes['parquet_analitico'])
+
+
+# DAG das etapas: entradas/saídas definem quando uma etapa pode ser pulada.
+# A coleta sempre roda (a origem é remota; o scraper já evita baixar o que não mudou).
+ETAPAS = {
+    'coleta': Etapa('coleta', (), _executar_coleta, lambda: [], _zips, True),
+    'processamento': Etapa('processamento', ('coleta',), _executar_processamento,
+                           _zips, lambda: _tabela(transformer.FILE_CONSOLIDADO), False),
+    'transformacao': Etapa('transformacao', ('processamento',), _executar_transformacao,
+                           lambda: _tabela(transformer.FILE_CONSOLIDADO) + [p for p in [CADASTRO_PATH] if os.path.exists(p)],
+                           _tabelas_estrela, False),
+    'carga': Etapa('carga', ('transformacao',), _executar_carga,
+                   _tabelas_estrela, _bancos, False),
+}
+
+
+def ordem_execucao(selecionadas=None):
+    ordem = list(TopologicalSorter({nome: etapa.depende for nome, etapa in ETAPAS.items()}).static_order())
+    return [nome for nome in ordem if not selecionadas or nome in selecionadas]
+
+
+def estado_arquivos(caminhos):
+    return {c: (os.path.getsize(c), os.stat(c).st_mtime_ns) for c in caminhos if os.path.exists(c)}
+
+
+def impressao_digital(caminhos, opcoes):
+    # Muda quando qualquer entrada muda (tamanho/mtime) ou quando uma opção que afeta a saída muda
+    relevantes = {k: v for k, v in opcoes.items() if k in OPCOES_SAIDA}
+    dados = json.dumps({'arquivos': estado_arquivos(caminhos), 'opcoes': relevantes}, sort_keys=True)
+    return hashlib.sha1(dados.encode('utf-8')).hexdigest()
+
+
+def carregar_estado(caminho=ESTADO_PATH):
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def salvar_estado(estado, caminho=ESTADO_PATH):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(estado, f, indent=2, sort_keys=True)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def contar_linhas(caminho):
+    # Contagem barata: metadados do Parquet ou COUNT(*) no banco; CSV fica sem contagem
+    if caminho.endswith('.parquet') and PARQUET_DISPONIVEL:
+        return pq.ParquetFile(caminho).metadata.num_rows
+    if caminho.endswith('.db'):
+        try:
+            with sqlite3.connect(f"file:{caminho}?mode=ro", uri=True) as conn:
+                return conn.execute("SELECT COUNT(*) FROM despesas").fetchone()[0]
+        except sqlite3.Error:
+            return None
+    return None
+
+
+def somar_linhas(caminhos):
+    contagens = [contar_linhas(c) for c in caminhos]
+    contagens = [c for c in contagens if c is not None]
+    return sum(contagens) if contagens else None
+
+
+def pico_rss_mb():
+    # ru_maxrss do próprio processo e dos filhos (ex.: workers do processor); KB no Linux, bytes no macOS
+    if resource is None:
+        return None
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    pico = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(pico / divisor, 1)
+
+
+def _rodar_etapa(nome, opcoes, pasta_perfil, fila):
+    # Executado em um processo próprio por etapa: o pico de RSS medido é só desta etapa
+    perfilador = None
+    if pasta_perfil:
+        tracemalloc.start()
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+
+    erro, em_dia = None, False
+    try:
+        # As etapas podem devolver True quando conferiram que as saídas já estão em dia sem reescrevê-las
+        em_dia = ETAPAS[nome].executar(opcoes) is True
+    except Exception as e:
+        erro = f"{type(e).__name__}: {e}"
+
+    resultado = {'erro': erro, 'em_dia': em_dia, 'pico_rss_mb': pico_rss_mb()}
+    if perfilador is not None:
+        perfilador.disable()
+        _, pico_python = tracemalloc.get_traced_memory()
+        # Memória ainda alocada ao fim da etapa, sem o ruído do import e do próprio perfilador
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, cProfile.__file__),
+        ])
+        alocacoes = snapshot.statistics('lineno')[:TOP_ALOCACOES]
+        tracemalloc.stop()
+        caminho_prof = os.path.join(pasta_perfil, f"{nome}.prof")
+        perfilador.dump_stats(caminho_prof)
+        resultado['perfil'] = {
+            'cprofile': caminho_prof,
+            'pico_python_mb': round(pico_python / (1024 * 1024), 1),
+            'maiores_alocacoes': [{'local': str(a.traceback), 'mb': round(a.size / (1024 * 1024), 2)} for a in alocacoes],
+        }
+    fila.put(resultado)
+
+
+def executar_etapa(nome, opcoes, pasta_perfil=None):
+    ctx = multiprocessing.get_context('spawn')
+    fila = ctx.Queue()
+    processo = ctx.Process(target=_rodar_etapa, args=(nome, opcoes, pasta_perfil, fila))
+    processo.start()
+    resultado = None
+    while resultado is None:
+        try:
+            resultado = fila.get(timeout=1)
+        except queue.Empty:
+            if not processo.is_alive():
+                # Processo morreu sem reportar (ex.: OOM); última tentativa antes de desistir
+                try:
+                    resultado = fila.get_nowait()
+                except queue.Empty:
+                    break
+    processo.join()
+    if resultado is None or processo.exitcode != 0:
+        resultado = {'erro': f"processo da etapa terminou com código {processo.exitcode}", 'pico_rss_mb': None}
+    return resultado
+
+
+def executar_pipeline(etapas=None, opcoes=None, forcar=False, perfil=None, caminho_relatorio=None):
+    opcoes = opcoes or {}
+    estado = carregar_estado()
+    execucao = datetime.now().strftime('%Y%m%d_%H%M%S')
+    caminho_relatorio = caminho_relatorio or os.path.join(RELATORIOS_DIR, f"pipeline_{execucao}.json")
+    perfil = set(perfil or [])
+
+    relatorio = {'execucao': execucao, 'opcoes': opcoes, 'etapas': []}
+    inicio_total = time.perf_counter()
+
+    for nome in ordem_execucao(etapas):
+        etapa = ETAPAS[nome]
+        entradas = etapa.entradas()
+        impressao = impressao_digital(entradas, opcoes)
+        metrica = {'etapa': nome, 'status': None, 'segundos': 0.0,
+                   'linhas_entrada': somar_linhas(entradas),
+                   'bytes_lidos': sum(os.path.getsize(c) for c in entradas)}
+
+        perfilar = nome in perfil or 'todas' in perfil
+        saidas_antes = estado_arquivos(etapa.saidas())
+        if (not forcar and not etapa.sempre_executar and not perfilar
+                and estado.get(nome) == impressao and saidas_antes):
+            print(f"=== {nome}: entradas inalteradas, pulando")
+            metrica.update(status='pulada', linhas_saida=somar_linhas(list(saidas_antes)), bytes_lidos=0, bytes_escritos=0,
+                           pico_rss_mb=None)
+            relatorio['etapas'].append(metrica)
+            continue
+
+        print(f"=== {nome}")
+        pasta_perfil = None
+        if perfilar:
+            pasta_perfil = os.path.join(RELATORIOS_DIR, f"perfil_{execucao}")
+            os.makedirs(pasta_perfil, exist_ok=True)
+
+        inicio = time.perf_counter()
+        resultado = executar_etapa(nome, opcoes, pasta_perfil)
+        metrica['segundos'] = round(time.perf_counter() - inicio, 3)
+
+        saidas = estado_arquivos(etapa.saidas())
+        escritas = [c for c, assinatura in saidas.items() if saidas_antes.get(c) != assinatura]
+        metrica.update(
+            linhas_saida=somar_linhas(list(saidas)),
+            bytes_escritos=sum(saidas[c][0] for c in escritas),
+            pico_rss_mb=resultado['pico_rss_mb'],
+        )
+        if 'perfil' in resultado:
+            metrica['perfil'] = resultado['perfil']
+
+        # As etapas sinalizam falha só com print/return: sem saída, sem nenhuma saída reescrita (saídas antigas
+        # não contam, a menos que a etapa as tenha conferido) ou com exceção, a execução para aqui.
+        # A coleta pode legitimamente não baixar nada novo.
+        erro = resultado['erro']
+        if not erro and not saidas:
+            erro = 'etapa não gerou saída'
+        elif not erro and not escritas and not etapa.sempre_executar and not resultado.get('em_dia'):
+            erro = 'etapa não atualizou nenhuma saída'
+        if erro:
+            metrica.update(status='falha', erro=erro)
+            relatorio['etapas'].append(metrica)
+            break
+
+        metrica['status'] = 'executada'
+        relatorio['etapas'].append(metrica)
+        estado[nome] = impressao_digital(etapa.entradas(), opcoes)
+        salvar_estado(estado)
+
+    relatorio['segundos_total'] = round(time.perf_counter() - inicio_total, 3)
+    relatorio['sucesso'] = all(m['status'] != 'falha' for m in relatorio['etapas'])
+
+    os.makedirs(os.path.dirname(caminho_relatorio) or '.', exist_ok=True)
+    with open(caminho_relatorio, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+
+    imprimir_resumo(relatorio)
+    print(f"Relatório: {caminho_relatorio}")
+    return relatorio
+
+
+def _fmt(valor, formato='{:,}'):
+    return '-' if valor is None else formato.format(valor)
+
+
+def imprimir_resumo(relatorio):
+    print(f"\n{'etapa':<15}{'status':<11}{'tempo (s)':>10}{'linhas ent.':>13}{'linhas saí.':>13}"
+          f"{'MB lidos':>10}{'MB escritos':>12}{'pico RSS MB':>12}")
+    for m in relatorio['etapas']:
+        print(f"{m['etapa']:<15}{m['status']:<11}{m['segundos']:>10.2f}{_fmt(m['linhas_entrada']):>13}"
+              f"{_fmt(m['linhas_saida']):>13}{m['bytes_lidos'] / 1e6:>10.1f}{m['bytes_escritos'] / 1e6:>12.1f}"
+              f"{_fmt(m['pico_rss_mb'], '{:.1f}'):>12}")
+        if m.get('erro'):
+            print(f"    erro: {m['erro']}")
+    print(f"Total: {relatorio['segundos_total']:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa o pipeline completo (coleta -> processamento -> transformação -> carga).")
+    parser.add_argument('--etapas', nargs='+', choices=list(ETAPAS), help="Executa só estas etapas (na ordem do DAG).")
+    parser.add_argument('--forcar', action='store_true', help="Executa mesmo com entradas inalteradas.")
+    parser.add_argument('--incremental', action='store_true', help="Processa/carrega apenas partições novas ou alteradas.")
+    parser.add_argument('--streaming', action='store_true', help="Processor em chunks com memória limitada.")
+    parser.add_argument('--workers', type=int, default=1, help="Processos do processor.")
+    parser.add_argument('--workers-download', type=int, default=scraper.MAX_DOWNLOADS, help="Downloads simultâneos.")
+    parser.add_argument('--formato', choices=FORMATOS, default=FORMATO_PADRAO, help="Formato das tabelas intermediárias.")
+    parser.add_argument('--particionar-anos', action='store_true', help="Carga com as despesas em um arquivo SQLite por ano.")
+    parser.add_argument('--parquet-analitico', action='store_true',
+                        help="Carga grava também a cópia Parquet das despesas usada pelo backend DuckDB da API.")
+    parser.add_argument('--profile', nargs='*', metavar='ETAPA', choices=list(ETAPAS) + ['todas'],
+                        help="Executa as etapas (todas, se nenhuma for indicada) sob cProfile + tracemalloc.")
+    parser.add_argument('--relatorio', help=f"Caminho do relatório JSON (padrão: {RELATORIOS_DIR}/pipeline_<data>.json).")
+    parser.add_argument('--raiz', default=RAIZ, help="Raiz do projeto (onde ficam data/ e sql/).")
+    args = parser.parse_args()
+
+    caminho_relatorio = os.path.abspath(args.relatorio) if args.relatorio else None
+    os.chdir(args.raiz)
+    opcoes = {
+        'incremental': args.incremental,
+        'streaming': args.streaming,
+        'workers': args.workers,
+        'workers_download': args.workers_download,
+        'formato': args.formato,
+        'particionar_anos': args.particionar_anos,
+        'parquet_analitico': args.parquet_analitico,
+    }
+    perfil = None if args.profile is None else (args.profile or ['todas'])
+    relatorio = executar_pipeline(args.etapas, opcoes, forcar=args.forcar, perfil=perfil, caminho_relatorio=caminho_relatorio)
+    sys.exit(0 if relatorio['sucesso'] else 1)
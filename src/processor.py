@@ -1,39 +1,49 @@
 import pandas as pd
-import zipfile
+import numpy as np
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import os
 import io
 import re
+import indice_zip
+import manifest as mf
+from formato import FORMATO_PADRAO, FORMATOS, TIPOS_CONSOLIDADO, EscritorTabela, localizar_tabela, salvar_tabela
 
 
 RAW_DIR = "data/raw"
 PROCESSED_DIR = "data/processed"
+NOME_CONSOLIDADO = "consolidado"
+PADRAO_ZIP_TRIMESTRE = re.compile(r"\d{4}_[1-4][TQ]_.*\.zip", re.IGNORECASE)
+
+MEMORIA_MAX_MB = 256
+BYTES_POR_LINHA = 256
+
+MAPA_COLUNAS = {
+    'reg_ans': 'registro_ans',
+    'registro_ans': 'registro_ans',
+    'cd_operadora': 'registro_ans',
+
+    'cd_conta_contabil': 'conta',
+    'cd_conta': 'conta',
+    'conta': 'conta',
+
+    'vl_saldo_final': 'valor',
+    'vl_saldo_inicial': 'valor_inicial',
+    'saldo_final': 'valor',
+    'valor': 'valor',
+    'vl_saldo': 'valor',
+
+    'descricao': 'descricao',
+    'ds_conta': 'descricao',
+    'nm_conta_contabil': 'descricao'
+}
+
+PADRAO_DESPESAS = 'EVENTO|SINISTRO|DESPESA'
 
 def normalizar_colunas(df):
     df.columns = [col.strip().lower() for col in df.columns]
     
-    mapa_colunas = {
-    
-        'reg_ans': 'registro_ans',
-        'registro_ans': 'registro_ans',
-        'cd_operadora': 'registro_ans',
-    
-        'cd_conta_contabil': 'conta',
-        'cd_conta': 'conta',
-        'conta': 'conta',
-        
-        'vl_saldo_final': 'valor',
-        'vl_saldo_inicial': 'valor_inicial', 
-        'saldo_final': 'valor',
-        'valor': 'valor',
-        'vl_saldo': 'valor',
-        
-        'descricao': 'descricao',
-        'ds_conta': 'descricao',
-        'nm_conta_contabil': 'descricao'
-    }
-
-    
-    df.rename(columns=mapa_colunas, inplace=True)
+    df.rename(columns=MAPA_COLUNAS, inplace=True)
     
     
     if 'valor' not in df.columns:
@@ -54,63 +64,230 @@ def encontrar_arquivo_csv(zip_ref):
     return None
 
 
-def processar_arquivos():
-    print(">>> Iniciando processamento de dados (ETL)...")
+def extrair_periodo(arquivo):
+    partes = arquivo.split('_')
+    ano = partes[0]
+    trimestre = partes[1].replace('T', '').replace('Q', '') 
+    return ano, trimestre
+
+
+def filtrar_despesas(df, ano, trimestre, colunas_normalizadas=False):
+    if not colunas_normalizadas:
+        df = normalizar_colunas(df)
+    
+    col_desc = next((c for c in df.columns if 'desc' in c), None)
     
+    if col_desc and isinstance(df[col_desc].dtype, pd.CategoricalDtype):
+        # Regex avaliada uma vez por descrição distinta e propagada pelos códigos da categoria
+        serie = df[col_desc]
+        casa = serie.cat.categories.str.contains(PADRAO_DESPESAS, case=False, na=False)
+        codigos = serie.cat.codes.to_numpy()
+        df = df[np.where(codigos >= 0, np.append(casa, False)[codigos], False)]
+    elif col_desc:
+        filtro = df[col_desc].str.contains(PADRAO_DESPESAS, case=False, na=False)
+        df = df[filtro]
+    
+    df['ano'] = ano
+    df['trimestre'] = trimestre
+    return df
+
+
+def converter_valores(df):
+    if 'valor' in df.columns and pd.api.types.is_numeric_dtype(df['valor']):
+        # Já convertido na leitura (decimal=',' / thousands='.')
+        df['valor'] = df['valor'].astype('float64')
+    elif 'valor' in df.columns:
+        df['valor'] = df['valor'].str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        df['valor'] = pd.to_numeric(df['valor'], errors='coerce')
+    return df
+
+
+def formatar_saida(df):
+    colunas_finais = {
+        'valor': 'Valor Despesas',
+        'ano': 'Ano',
+        'trimestre': 'Trimestre',
+
+        'cnpj': 'CNPJ',
+        'razao_social': 'RazaoSocial'
+    }
+
+
+    if 'registro_ans' in df.columns:
+        df.rename(columns={'registro_ans': 'RegistroANS'}, inplace=True)
+    elif 'reg_ans' in df.columns:
+        df.rename(columns={'reg_ans': 'RegistroANS'}, inplace=True)
+    else:
+        df['RegistroANS'] = None
+
+    for col_old, col_new in colunas_finais.items():
+        if col_old not in df.columns:
+            df[col_new] = None 
+        else:
+            df.rename(columns={col_old: col_new}, inplace=True)
+
+    cols_to_save = ['RegistroANS', 'Ano', 'Trimestre', 'Valor Despesas']
+
+    return df[cols_to_save]
+
+
+def opcoes_leitura(cabecalho):
+    # Lê só as colunas usadas, com a descrição como categoria e o valor no formato brasileiro ("1.234,56")
+    normalizadas = {col: MAPA_COLUNAS.get(col.strip().lower(), col.strip().lower()) for col in cabecalho}
+    col_registro = next((c for c, n in normalizadas.items() if n == 'registro_ans'), None)
+    col_desc = next((c for c, n in normalizadas.items() if 'desc' in n), None)
+    col_valor = next((c for c, n in normalizadas.items() if n == 'valor'), None)
+
+    usecols = [c for c in (col_registro, col_desc, col_valor) if c]
+    if not usecols:
+        return {'dtype': 'str'}
+
+    dtype = {c: 'str' for c in usecols if c != col_valor}
+    if col_desc:
+        dtype[col_desc] = 'category'
+    return {'usecols': usecols, 'dtype': dtype, 'decimal': ',', 'thousands': '.'}
+
+
+def ler_csv_trimestre(z, arquivo_alvo, chunksize=None):
+    with z.open(arquivo_alvo) as f:
+        cabecalho = pd.read_csv(f, sep=';', encoding='latin1', nrows=0).columns
+
+    with z.open(arquivo_alvo) as f:
+        leitura = pd.read_csv(
+            f, 
+            sep=';', 
+            encoding='latin1', 
+            on_bad_lines='skip',
+            chunksize=chunksize,
+            **opcoes_leitura(cabecalho)
+        )
+        if chunksize is None:
+            yield leitura
+        else:
+            yield from leitura
+
+
+def layout_colunas(colunas):
+    # Decidido uma vez por ZIP e gravado no índice: opções do read_csv e nomes normalizados das colunas
+    renomear = {col: MAPA_COLUNAS.get(col.strip().lower(), col.strip().lower()) for col in colunas}
+    if 'valor' not in renomear.values():
+        print(f"ALERTA: Coluna de VALOR não encontrada! Colunas disponíveis: {list(renomear.values())}")
+    return {'opcoes': opcoes_leitura(colunas), 'renomear': renomear}
+
+
+def indice_trimestre(caminho_zip):
+    return indice_zip.obter_indice(caminho_zip, encontrar_arquivo_csv, layout_colunas)
+
+
+def ler_csv_indexado(caminho_zip, indice, chunksize=None):
+    # Vai direto ao membro pelo índice do ZIP; os chunks já saem com as colunas normalizadas
+    layout = indice['layout']
+    with indice_zip.abrir_membro(caminho_zip, indice) as f:
+        leitura = pd.read_csv(
+            f,
+            sep=indice['separador'],
+            encoding=indice['encoding'],
+            on_bad_lines='skip',
+            chunksize=chunksize,
+            **layout['opcoes']
+        )
+        for df in ([leitura] if chunksize is None else leitura):
+            yield df.rename(columns=layout['renomear'])
+
+
+def chunksize_para_memoria(memoria_max_mb):
+    # Cada linha lida (3 colunas tipadas) ocupa ~BYTES_POR_LINHA no pandas; o teto vale para um chunk por vez
+    return max(1000, int(memoria_max_mb * 1024 * 1024 / BYTES_POR_LINHA))
+
+
+def eh_zip_trimestre(nome):
+    # Só ZIPs nomeados pelo scraper (<ano>_<n>T_<original>.zip); outros ZIPs em data/raw são ignorados
+    return PADRAO_ZIP_TRIMESTRE.fullmatch(os.path.basename(nome)) is not None
+
+
+def listar_zips():
     if not os.path.exists(RAW_DIR):
         print(f"Pasta {RAW_DIR} não encontrada. Rode o scraper primeiro.")
+        return None
+    return sorted(f for f in os.listdir(RAW_DIR) if eh_zip_trimestre(f))
+
+
+def processar_arquivos(streaming=False, chunksize=None, memoria_max_mb=MEMORIA_MAX_MB, workers=1, incremental=False,
+                       formato=FORMATO_PADRAO, exportar_csv=False):
+    print(">>> Iniciando processamento de dados (ETL)...")
+    
+    arquivos_zip = listar_zips()
+    if arquivos_zip is None:
         return
 
     os.makedirs(PROCESSED_DIR, exist_ok=True)
     
-    dataframes = []
-    arquivos_zip = [f for f in os.listdir(RAW_DIR) if f.endswith('.zip')]
-    
     if not arquivos_zip:
         print("Nenhum arquivo ZIP encontrado para processar.")
         return
 
+    saida = {'base': os.path.join(PROCESSED_DIR, NOME_CONSOLIDADO), 'formato': formato, 'exportar_csv': exportar_csv}
+    manifest = None
+    reconstruir = False
+    if incremental:
+        manifest = mf.carregar_manifest()
+        alterados = [a for a in arquivos_zip if mf.arquivo_alterado(manifest, a, os.path.join(RAW_DIR, a))]
+        print(f"Modo incremental: {len(alterados)} de {len(arquivos_zip)} arquivos novos ou alterados.")
+        if alterados:
+            arquivos_zip = alterados
+        elif mf.consolidado_em_dia(manifest, localizar_tabela(saida['base'])):
+            mf.salvar_manifest(manifest)
+            print("Nada a processar.")
+            return 0
+        else:
+            # Consolidado apagado ou substituído depois do manifesto: refeito a partir dos trimestres já
+            # registrados, sem mudar o status deles (continuam carregados, a carga não os repete)
+            print("Nada a processar, mas o consolidado não corresponde ao manifesto: reconstruindo.")
+            arquivos_zip = [a for a in arquivos_zip if a in manifest['arquivos']]
+            reconstruir = True
+
+    processados = []
+    if workers > 1:
+        total = processar_arquivos_paralelo(arquivos_zip, workers, chunksize or (chunksize_para_memoria(memoria_max_mb) if streaming else None), processados, saida)
+    elif streaming:
+        total = processar_arquivos_streaming(arquivos_zip, chunksize or chunksize_para_memoria(memoria_max_mb), processados, saida)
+    else:
+        total = processar_arquivos_serial(arquivos_zip, processados, saida)
+
+    if manifest is not None and total is not None:
+        for arquivo, linhas in ([] if reconstruir else processados):
+            ano, trimestre = extrair_periodo(arquivo)
+            mf.registrar_processado(manifest, arquivo, os.path.join(RAW_DIR, arquivo), ano, trimestre, linhas)
+        mf.registrar_consolidado(manifest, localizar_tabela(saida['base']))
+        mf.salvar_manifest(manifest)
+
+    return total
+
+
+def processar_arquivos_serial(arquivos_zip, processados, saida):
+    dataframes = []
+
     for arquivo in arquivos_zip:
         caminho_completo = os.path.join(RAW_DIR, arquivo)
         print(f"Processando {arquivo}...")
         
-        partes = arquivo.split('_')
-        ano = partes[0]
-        trimestre = partes[1].replace('T', '').replace('Q', '') 
+        ano, trimestre = extrair_periodo(arquivo)
 
         try:
-            with zipfile.ZipFile(caminho_completo, 'r') as z:
-                arquivo_alvo = encontrar_arquivo_csv(z)
-                
-                if not arquivo_alvo:
-                    print(f"  -> Nenhum CSV encontrado dentro de {arquivo}")
-                    continue
-                
-                print(f"  -> Lendo arquivo interno: {arquivo_alvo}")
-                
-                with z.open(arquivo_alvo) as f:
-
-                    df = pd.read_csv(
-                        f, 
-                        sep=';', 
-                        encoding='latin1', 
-                        dtype=str, 
-                        on_bad_lines='skip'
-                    )
-                    
-                    df = normalizar_colunas(df)
-                    
-                    col_desc = next((c for c in df.columns if 'desc' in c), None)
-                    
-                    if col_desc:
-                        filtro = df[col_desc].str.contains('EVENTO|SINISTRO|DESPESA', case=False, na=False)
-                        df = df[filtro]
-                    
-                    df['ano'] = ano
-                    df['trimestre'] = trimestre
-                    
-                    dataframes.append(df)
-                    print(f"  -> {len(df)} linhas extraídas.")
+            indice = indice_trimestre(caminho_completo)
+
+            if not indice['membro']:
+                print(f"  -> Nenhum CSV encontrado dentro de {arquivo}")
+                continue
+
+            print(f"  -> Lendo arquivo interno: {indice['membro']}")
+
+            for df in ler_csv_indexado(caminho_completo, indice):
+                df = converter_valores(filtrar_despesas(df, ano, trimestre, colunas_normalizadas=True))
+
+                dataframes.append(df)
+                processados.append((arquivo, len(df)))
+                print(f"  -> {len(df)} linhas extraídas.")
 
         except Exception as e:
             print(f"  -> Erro ao processar {arquivo}: {e}")
@@ -122,42 +299,124 @@ def processar_arquivos():
     print("Consolidando DataFrames...")
     df_final = pd.concat(dataframes, ignore_index=True)
     
-    if 'valor' in df_final.columns:
-        df_final['valor'] = df_final['valor'].str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
-        df_final['valor'] = pd.to_numeric(df_final['valor'], errors='coerce')
- 
-    colunas_finais = {
-        'valor': 'Valor Despesas',
-        'ano': 'Ano',
-        'trimestre': 'Trimestre',
+    df_final = formatar_saida(df_final)
+    
+    output_path = salvar_tabela(df_final, saida['base'], TIPOS_CONSOLIDADO, saida['formato'], saida['exportar_csv'])
+    
+    print(f"Arquivo consolidado salvo em: {output_path}")
+    print(f"Total de registros: {len(df_final)}")
+    return len(df_final)
 
-        'cnpj': 'CNPJ',
-        'razao_social': 'RazaoSocial'
-    }
 
+def processar_arquivos_streaming(arquivos_zip, chunksize, processados, saida):
+    # Cada chunk é filtrado, convertido e anexado ao arquivo de saída: só um chunk fica em memória por vez
+    print(f"Modo streaming: chunks de {chunksize} linhas.")
 
-    if 'registro_ans' in df_final.columns:
-        df_final.rename(columns={'registro_ans': 'RegistroANS'}, inplace=True)
-    elif 'reg_ans' in df_final.columns:
-        df_final.rename(columns={'reg_ans': 'RegistroANS'}, inplace=True)
-    else:
-        df_final['RegistroANS'] = None
+    with EscritorTabela(saida['base'], TIPOS_CONSOLIDADO, saida['formato'], saida['exportar_csv']) as escritor:
+        for arquivo in arquivos_zip:
+            caminho_completo = os.path.join(RAW_DIR, arquivo)
+            print(f"Processando {arquivo}...")
 
-    for col_old, col_new in colunas_finais.items():
-        if col_old not in df_final.columns:
-            df_final[col_new] = None 
-        else:
-            df_final.rename(columns={col_old: col_new}, inplace=True)
+            ano, trimestre = extrair_periodo(arquivo)
+            linhas_arquivo = 0
 
-    cols_to_save = ['RegistroANS', 'Ano', 'Trimestre', 'Valor Despesas']
+            try:
+                indice = indice_trimestre(caminho_completo)
+
+                if not indice['membro']:
+                    print(f"  -> Nenhum CSV encontrado dentro de {arquivo}")
+                    continue
+
+                print(f"  -> Lendo arquivo interno: {indice['membro']}")
+
+                for chunk in ler_csv_indexado(caminho_completo, indice, chunksize=chunksize):
+                    chunk = formatar_saida(converter_valores(filtrar_despesas(chunk, ano, trimestre, colunas_normalizadas=True)))
+                    escritor.escrever(chunk)
+                    linhas_arquivo += len(chunk)
+
+                processados.append((arquivo, linhas_arquivo))
+                print(f"  -> {linhas_arquivo} linhas extraídas.")
+
+            except Exception as e:
+                print(f"  -> Erro ao processar {arquivo}: {e}")
+
+    if not escritor.linhas:
+        print("Nenhum dado foi extraído.")
+        return
+
+    print(f"Arquivo consolidado salvo em: {saida['base']}.{saida['formato']}")
+    print(f"Total de registros: {escritor.linhas}")
+    return escritor.linhas
+
+
+def processar_trimestre_colunar(arquivo, chunksize=None):
+    # Executado nos processos filhos: devolve arrays NumPy tipados em vez de um DataFrame de strings
+    caminho_completo = os.path.join(RAW_DIR, arquivo)
+    print(f"Processando {arquivo}...")
+
+    ano, trimestre = extrair_periodo(arquivo)
+    registros, valores = [], []
+
+    try:
+        indice = indice_trimestre(caminho_completo)
+
+        if not indice['membro']:
+            print(f"  -> Nenhum CSV encontrado dentro de {arquivo}")
+            return None
+
+        for chunk in ler_csv_indexado(caminho_completo, indice, chunksize=chunksize):
+            chunk = formatar_saida(converter_valores(filtrar_despesas(chunk, ano, trimestre, colunas_normalizadas=True)))
+            registros.append(pd.to_numeric(chunk['RegistroANS'], errors='coerce').to_numpy(dtype='float64'))
+            valores.append(pd.to_numeric(chunk['Valor Despesas']).to_numpy(dtype='float64'))
+
+    except Exception as e:
+        print(f"  -> Erro ao processar {arquivo}: {e}")
+        return None
+
+    registro = np.concatenate(registros) if registros else np.array([], dtype='float64')
+    valor = np.concatenate(valores) if valores else np.array([], dtype='float64')
+    print(f"  -> {arquivo}: {len(registro)} linhas extraídas.")
+    return {'arquivo': arquivo, 'ano': ano, 'trimestre': trimestre, 'registro': registro, 'valor': valor}
+
+
+def processar_arquivos_paralelo(arquivos_zip, workers, chunksize, processados, saida):
+    print(f"Modo paralelo: {workers} processos.")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map preserva a ordem de entrada (ordenada), então o merge é determinístico
+        resultados = [r for r in executor.map(processar_trimestre_colunar, arquivos_zip, [chunksize] * len(arquivos_zip)) if r is not None]
+
+    if not resultados:
+        print("Nenhum dado foi extraído.")
+        return
+
+    processados.extend((r['arquivo'], len(r['registro'])) for r in resultados)
+
+    print("Consolidando resultados...")
+    df_final = pd.DataFrame({
+        'RegistroANS': np.concatenate([r['registro'] for r in resultados]),
+        'Ano': np.concatenate([np.repeat(int(r['ano']), len(r['registro'])) for r in resultados]),
+        'Trimestre': np.concatenate([np.repeat(int(r['trimestre']), len(r['registro'])) for r in resultados]),
+        'Valor Despesas': np.concatenate([r['valor'] for r in resultados]),
+    })
+
+    output_path = salvar_tabela(df_final, saida['base'], TIPOS_CONSOLIDADO, saida['formato'], saida['exportar_csv'])
 
-    df_final = df_final[cols_to_save]
-    
-    output_path = os.path.join(PROCESSED_DIR, "consolidado.csv")
-    df_final.to_csv(output_path, index=False, encoding='utf-8', sep=';')
-    
     print(f"Arquivo consolidado salvo em: {output_path}")
     print(f"Total de registros: {len(df_final)}")
+    return len(df_final)
+
 
 if __name__ == "__main__":
-    processar_arquivos()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Extrai e consolida as despesas dos ZIPs trimestrais.")
+    parser.add_argument('--streaming', action='store_true', help="Processa em chunks com memória limitada.")
+    parser.add_argument('--chunksize', type=int, default=None, help="Linhas por chunk no modo streaming.")
+    parser.add_argument('--memoria-max-mb', type=int, default=MEMORIA_MAX_MB, help="Teto de memória por chunk (define o chunksize).")
+    parser.add_argument('--workers', type=int, default=1, help="Processa os ZIPs em paralelo com N processos.")
+    parser.add_argument('--incremental', action='store_true', help="Processa apenas ZIPs novos ou alterados (manifesto).")
+    parser.add_argument('--formato', choices=FORMATOS, default=FORMATO_PADRAO, help="Formato do consolidado.")
+    parser.add_argument('--exportar-csv', action='store_true', help="Grava também o consolidado.csv.")
+    args = parser.parse_args()
+
+    processar_arquivos(streaming=args.streaming, chunksize=args.chunksize, memoria_max_mb=args.memoria_max_mb, workers=args.workers,
+                       incremental=args.incremental, formato=args.formato, exportar_csv=args.exportar_csv)
@@ -1,11 +1,38 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import hashlib
+import html
+import json
 import os
+import re
+import time
 from datetime import datetime
 
 BASE_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/demonstracoes_contabeis/"
 HEADERS = {'User-Agent': 'Mozilla/5.0 (compatible; scraper/1.0; +https://example.com)'}
 
+MAX_DOWNLOADS = 4
+TAMANHO_CHUNK = 1024 * 1024
+TIMEOUT_DOWNLOAD = 30
+
+CACHE_LISTAGENS_DIR = "data/raw/.cache_listagens"
+TTL_LISTAGEM = 3600
+
+# Índices no estilo Apache: <a href="1T2024.zip">1T2024.zip</a>
+RE_HREF = re.compile(r'<a\s[^>]*?href\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+
+def criar_sessao(max_conexoes=MAX_DOWNLOADS):
+    # Uma única sessão com pool de conexões compartilhado entre as threads de download
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=max_conexoes, pool_maxsize=max_conexoes, max_retries=3)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
 def obter_trimestres_recentes(qtd=3, incluir_atual=False):
     
     hoje = datetime.now()
@@ -27,32 +54,232 @@ def obter_trimestres_recentes(qtd=3, incluir_atual=False):
 
     return trimestres
 
-def listar_hrefs(url):
+def extrair_hrefs(texto):
+    return [html.unescape(h) for h in RE_HREF.findall(texto) if h != '../']
+
+def extrair_hrefs_bs4(texto):
+    soup = BeautifulSoup(texto, 'html.parser')
+    hrefs = []
+    for a in soup.find_all('a'):
+        href = a.get('href')
+        if href and href != '../':
+            hrefs.append(href)
+    return hrefs
+
+def _caminho_cache_listagem(url):
+    chave = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_LISTAGENS_DIR, f"{chave}.json")
+
+def _ler_cache_listagem(url):
+    try:
+        with open(_caminho_cache_listagem(url), 'r', encoding='utf-8') as f:
+            entrada = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return entrada if entrada.get('url') == url else None
+
+def _salvar_cache_listagem(url, entrada):
+    os.makedirs(CACHE_LISTAGENS_DIR, exist_ok=True)
+    caminho = _caminho_cache_listagem(url)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(entrada, f)
+    os.replace(caminho + '.tmp', caminho)
+
+def listar_hrefs(url, session=None, verify=True, ttl=TTL_LISTAGEM, usar_cache=True):
+
+    entrada = _ler_cache_listagem(url) if usar_cache else None
+    if entrada and time.time() - entrada.get('verificado_em', 0) < ttl:
+        return entrada['hrefs']
 
+    headers = dict(HEADERS)
+    if entrada:
+        # Requisição condicional: se nada mudou o servidor responde 304 sem corpo
+        if entrada.get('etag'):
+            headers['If-None-Match'] = entrada['etag']
+        if entrada.get('last_modified'):
+            headers['If-Modified-Since'] = entrada['last_modified']
+
+    http = session or requests
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
+        response = http.get(url, headers=headers, timeout=10, verify=verify)
     except requests.RequestException as e:
         print(f"Erro de conexão em {url}: {e}")
+        if entrada:
+            print(f"Usando listagem em cache de {url}.")
+            return entrada['hrefs']
         return []
+
+    if response.status_code == 304 and entrada:
+        entrada['verificado_em'] = time.time()
+        _salvar_cache_listagem(url, entrada)
+        return entrada['hrefs']
         
     if response.status_code != 200:
         print(f"Erro ao acessar {url}: status {response.status_code}")
         return []
         
-    soup = BeautifulSoup(response.text, 'html.parser')
-    hrefs = []
-    for a in soup.find_all('a'):
-        href = a.get('href')
-        if href and href != '../':
-            hrefs.append(href)
+    hrefs = extrair_hrefs(response.text) or extrair_hrefs_bs4(response.text)
+    if usar_cache:
+        _salvar_cache_listagem(url, {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'verificado_em': time.time(),
+            'hrefs': hrefs
+        })
     return hrefs
 
-def baixar_arquivos_recentes(pasta_destino):
+def _caminho_meta(caminho):
+    return caminho + '.meta.json'
+
+def _ler_meta(caminho):
+    try:
+        with open(_caminho_meta(caminho), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _salvar_meta(caminho, tamanho, etag):
+    with open(_caminho_meta(caminho), 'w', encoding='utf-8') as f:
+        json.dump({'tamanho': tamanho, 'etag': etag}, f)
+
+def _arquivo_atualizado(caminho, meta, tamanho_remoto, etag_remoto):
+    # Compara apenas metadados (ETag / tamanho), sem reler o conteúdo do arquivo local
+    tamanho_local = os.path.getsize(caminho)
+    if etag_remoto and meta.get('etag'):
+        return etag_remoto == meta['etag'] and tamanho_local == meta.get('tamanho', tamanho_local)
+    if tamanho_remoto is not None:
+        return tamanho_local == tamanho_remoto
+    return True
+
+def _descartar_parcial(parcial):
+    for caminho in (parcial, _caminho_meta(parcial)):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+def _tamanho_content_range(valor):
+    # "bytes */1234" (416) ou "bytes 0-99/1234" (206): tamanho total, se o servidor informar
+    if valor and '/' in valor:
+        total = valor.rsplit('/', 1)[1].strip()
+        if total.isdigit():
+            return int(total)
+    return None
+
+def _finalizar(parcial, caminho_salvar, etag, resultado, baixados, inicio):
+    nome = os.path.basename(caminho_salvar)
+    tamanho_final = os.path.getsize(parcial)
+    os.replace(parcial, caminho_salvar)
+    if os.path.exists(_caminho_meta(parcial)):
+        os.remove(_caminho_meta(parcial))
+    _salvar_meta(caminho_salvar, tamanho_final, etag)
+
+    segundos = time.perf_counter() - inicio
+    mb_s = (baixados / (1024 * 1024)) / segundos if segundos > 0 else 0.0
+    resultado.update({'status': 'baixado', 'bytes': baixados, 'segundos': segundos, 'mb_s': mb_s})
+    print(f"Sucesso: {nome} - {baixados / (1024 * 1024):.2f} MB em {segundos:.2f}s ({mb_s:.2f} MB/s)")
+    return resultado
+
+def baixar_arquivo(session, url, caminho_salvar, timeout=TIMEOUT_DOWNLOAD):
+    nome = os.path.basename(caminho_salvar)
+    resultado = {'arquivo': caminho_salvar, 'status': 'falha', 'bytes': 0, 'segundos': 0.0, 'mb_s': 0.0}
+    inicio = time.perf_counter()
+
+    tamanho_remoto, etag_remoto = None, None
+    try:
+        head = session.head(url, timeout=timeout, allow_redirects=True)
+        if head.status_code == 200:
+            if head.headers.get('Content-Length'):
+                tamanho_remoto = int(head.headers['Content-Length'])
+            etag_remoto = head.headers.get('ETag')
+    except requests.RequestException as e:
+        print(f"HEAD falhou para {nome}: {e}")
+
+    if os.path.exists(caminho_salvar) and _arquivo_atualizado(caminho_salvar, _ler_meta(caminho_salvar), tamanho_remoto, etag_remoto):
+        print(f"Arquivo já existente: {nome}")
+        resultado['status'] = 'existente'
+        return resultado
+
+    # O .part guarda ao lado (.part.meta.json) o ETag da versão que começou a ser baixada
+    parcial = caminho_salvar + '.part'
+    offset = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+    etag_parcial = _ler_meta(parcial).get('etag')
+    if offset and etag_remoto and etag_parcial and etag_parcial != etag_remoto:
+        # Parcial de outra versão do arquivo remoto
+        _descartar_parcial(parcial)
+        offset = 0
+    if offset and tamanho_remoto is not None:
+        if offset == tamanho_remoto:
+            # Baixado por inteiro numa execução anterior que parou antes de renomear
+            print(f"Parcial de {nome} já completo ({offset} bytes).")
+            return _finalizar(parcial, caminho_salvar, etag_remoto or etag_parcial, resultado, 0, inicio)
+        if offset > tamanho_remoto:
+            _descartar_parcial(parcial)
+            offset = 0
+
+    headers = {}
+    if offset:
+        headers['Range'] = f"bytes={offset}-"
+        if etag_remoto:
+            headers['If-Range'] = etag_remoto
+
+    print(f"Baixando {nome}" + (f" (retomando de {offset} bytes)" if offset else "") + "...")
+    baixados = 0
+    try:
+        with session.get(url, headers=headers, stream=True, timeout=timeout) as resp:
+            if resp.status_code == 416 and offset:
+                # Range além do fim: o parcial está completo se o tamanho bate; senão recomeça do zero
+                total = _tamanho_content_range(resp.headers.get('Content-Range'))
+                total = tamanho_remoto if total is None else total
+                if total == offset:
+                    print(f"Parcial de {nome} já completo ({offset} bytes).")
+                    return _finalizar(parcial, caminho_salvar, etag_remoto or etag_parcial, resultado, 0, inicio)
+                print(f"Parcial de {nome} não corresponde ao arquivo remoto: recomeçando do zero.")
+                _descartar_parcial(parcial)
+                return baixar_arquivo(session, url, caminho_salvar, timeout)
+            if resp.status_code == 206:
+                modo = 'ab'
+            elif resp.status_code == 200:
+                # Servidor ignorou o Range (ou o arquivo mudou): recomeça do zero
+                modo = 'wb'
+                offset = 0
+            else:
+                print(f"Falha no download de {nome}. Status: {resp.status_code}")
+                return resultado
+
+            if etag_remoto is None:
+                etag_remoto = resp.headers.get('ETag')
+            if tamanho_remoto is None:
+                tamanho_remoto = _tamanho_content_range(resp.headers.get('Content-Range'))
+                if (tamanho_remoto is None and modo == 'wb' and resp.headers.get('Content-Length')
+                        and not resp.headers.get('Content-Encoding')):
+                    tamanho_remoto = int(resp.headers['Content-Length'])
+            if modo == 'wb':
+                _salvar_meta(parcial, tamanho_remoto, etag_remoto)
+
+            with open(parcial, modo) as f:
+                for chunk in resp.iter_content(chunk_size=TAMANHO_CHUNK):
+                    f.write(chunk)
+                    baixados += len(chunk)
+    except requests.RequestException as e:
+        print(f"Download de {nome} interrompido após {baixados} bytes (parcial mantido): {e}")
+        resultado['bytes'] = baixados
+        return resultado
+
+    tamanho_final = os.path.getsize(parcial)
+    if tamanho_remoto is not None and tamanho_final != tamanho_remoto:
+        print(f"Download incompleto de {nome}: {tamanho_final}/{tamanho_remoto} bytes (parcial mantido).")
+        resultado['bytes'] = baixados
+        return resultado
+
+    return _finalizar(parcial, caminho_salvar, etag_remoto, resultado, baixados, inicio)
+
+def baixar_arquivos_recentes(pasta_destino, base_url=BASE_URL, trimestres=None, max_workers=MAX_DOWNLOADS):
     print("Iniciando processo de download...")
-    trimestres = obter_trimestres_recentes()
-    arquivos_baixados = []
+    trimestres = trimestres or obter_trimestres_recentes()
     os.makedirs(pasta_destino, exist_ok=True)
+    session = criar_sessao(max_workers)
 
+    tarefas = []
     for trimestre in trimestres:
         try:
             parts = trimestre.split('/Q')
@@ -60,10 +287,10 @@ def baixar_arquivos_recentes(pasta_destino):
                 continue
             
             ano, q = parts[0], parts[1]
-            url_ano = f"{BASE_URL}{ano}/"
+            url_ano = f"{base_url}{ano}/"
             
             print(f"Verificando {url_ano}...")
-            hrefs = listar_hrefs(url_ano)
+            hrefs = listar_hrefs(url_ano, session)
             
             # Padrão esperado: 1T2024.zip, 2T2023.zip, etc.
             target_filename = f"{q}T{ano}.zip"
@@ -74,30 +301,32 @@ def baixar_arquivos_recentes(pasta_destino):
                 continue
 
             for filename in candidatos:
-                link_download = url_ano + filename
                 nome_final = f"{ano}_{q}T_{filename}"
-                caminho_salvar = os.path.join(pasta_destino, nome_final)
-                
-                if os.path.exists(caminho_salvar):
-                    print(f"Arquivo já existente: {nome_final}")
-                    arquivos_baixados.append(caminho_salvar)
-                    continue
-                
-                print(f"Baixando {filename}...")
-                resp_file = requests.get(link_download, headers=HEADERS, timeout=30)
-                
-                if resp_file.status_code == 200:
-                    with open(caminho_salvar, 'wb') as f:
-                        f.write(resp_file.content)
-                    arquivos_baixados.append(caminho_salvar)
-                    print(f"Sucesso: {nome_final}")
-                else:
-                    print(f"Falha no download. Status: {resp_file.status_code}")
+                tarefas.append((url_ano + filename, os.path.join(pasta_destino, nome_final)))
 
         except Exception as e:
             print(f"Erro ao processar trimestre {trimestre}: {e}")
 
+    arquivos_baixados = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = [executor.submit(baixar_arquivo, session, url, caminho) for url, caminho in tarefas]
+        for futuro in futuros:
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                print(f"Erro no download: {e}")
+                continue
+            if resultado['status'] != 'falha':
+                arquivos_baixados.append(resultado['arquivo'])
+
+    session.close()
     return arquivos_baixados
 
 if __name__ == "__main__":
-    baixar_arquivos_recentes("data/raw")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Baixa as demonstrações contábeis mais recentes da ANS.")
+    parser.add_argument('--destino', default="data/raw")
+    parser.add_argument('--base-url', default=BASE_URL)
+    parser.add_argument('--workers', type=int, default=MAX_DOWNLOADS)
+    args = parser.parse_args()
+
+    baixar_arquivos_recentes(args.destino, base_url=args.base_url, max_workers=args.workers)
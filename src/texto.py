@@ -0,0 +1,14 @@
+import re
+import unicodedata
+
+
+def normalizar_texto(texto):
+    # Minúsculas e sem acentos: usado tanto na carga do índice de busca quanto nas consultas da API
+    if texto is None:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower().strip()
+
+
+def somente_digitos(texto):
+    return re.sub(r'[^0-9]', '', str(texto)) if texto is not None else ''
@@ -1,16 +1,26 @@
 import pandas as pd
+import numpy as np
 import requests
 import os
-import zipfile
-import io
+import shutil
+import tempfile
 import re
 import urllib3
+import argparse
+import indice_zip
+from scraper import TAMANHO_CHUNK, TIMEOUT_DOWNLOAD, listar_hrefs
+from formato import (FORMATO_PADRAO, FORMATOS, TIPOS_CONSOLIDADO, TIPOS_DESPESAS, TIPOS_FINAL, TIPOS_OPERADORAS,
+                     aplicar_tipos, ler_tabela, salvar_tabela)
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 URL_CADASTRO = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/"
-FILE_CONSOLIDADO = "data/processed/consolidado.csv"
+FILE_CONSOLIDADO = "data/processed/consolidado"
+FILE_FINAL = "data/processed/consolidado_despesas_final"
+FILE_OPERADORAS = "data/processed/dim_operadoras"
+FILE_DESPESAS = "data/processed/fato_despesas"
 DIR_PROCESSED = "data/processed"
+CADASTRO_ZIP_ANTIGO = "data/raw/cadastro_operadoras.zip"
 
 def validar_cnpj(cnpj):
     cnpj = re.sub(r'[^0-9]', '', str(cnpj))
@@ -30,19 +40,47 @@ def validar_cnpj(cnpj):
 
     return True
 
+PESOS_DV1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+PESOS_DV2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+def _digito_verificador(soma):
+    resto = soma % 11
+    return np.where(resto < 2, 0, 11 - resto)
+
+def validar_cnpj_vetorizado(cnpjs):
+    # Mesmo resultado de validar_cnpj, mas calculado uma vez por CNPJ distinto e com produto escalar em NumPy
+    serie = pd.Series(cnpjs)
+    codigos, unicos = pd.factorize(serie.astype(object).where(serie.notna(), ''))
+
+    limpos = pd.Series(unicos, dtype=object).astype(str).str.replace(r'[^0-9]', '', regex=True).to_numpy(dtype=str)
+    validos = np.zeros(len(limpos), dtype=bool)
+
+    tam14 = np.char.str_len(limpos) == 14 if len(limpos) else np.zeros(0, dtype=bool)
+    if tam14.any():
+        digitos = np.frombuffer(''.join(limpos[tam14]).encode('ascii'), dtype=np.uint8).reshape(-1, 14) - ord('0')
+        digitos = digitos.astype(np.int64)
+        ok = digitos[:, 12] == _digito_verificador(digitos[:, :12] @ PESOS_DV1)
+        ok &= digitos[:, 13] == _digito_verificador(digitos[:, :13] @ PESOS_DV2)
+        validos[tam14] = ok
+
+    return pd.Series(validos[codigos], index=serie.index)
+
+def _baixar(url, caminho, timeout=TIMEOUT_DOWNLOAD):
+    # Timeout de conexão/leitura como no scraper; grava em .part para que um download interrompido
+    # não deixe um cadastro truncado que as próximas execuções tomariam como completo
+    with requests.get(url, verify=False, stream=True, timeout=timeout) as r_arquivo:
+        r_arquivo.raise_for_status()
+        with open(caminho + '.part', 'wb') as f:
+            for bloco in r_arquivo.iter_content(chunk_size=TAMANHO_CHUNK):
+                f.write(bloco)
+    os.replace(caminho + '.part', caminho)
+
 def baixar_cadastro_simples():
     print(">>> Tentando baixar cadastro...")
     try:
-        r = requests.get(URL_CADASTRO, verify=False, timeout=30)
-        
-        texto = r.text
         link_csv = None
         
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(texto, 'html.parser')
-        
-        for a in soup.find_all('a'):
-            href = a.get('href')
+        for href in listar_hrefs(URL_CADASTRO, verify=False):
             if href:
                 if 'relatorio' in href.lower() or 'cadop' in href.lower():
                     if href.endswith('.csv') or href.endswith('.zip'):
@@ -54,33 +92,105 @@ def baixar_cadastro_simples():
             return None
             
         print(f"Baixando de: {link_csv}")
-        r_arquivo = requests.get(link_csv, verify=False)
-        
         caminho_final = "data/raw/cadastro_operadoras.csv"
-        
-        if link_csv.endswith('.zip'):
-            z = zipfile.ZipFile(io.BytesIO(r_arquivo.content))
-            nome_csv = [n for n in z.namelist() if n.endswith('.csv')][0]
-            with z.open(nome_csv) as f:
+        # ZIPs de versões antigas em data/raw seriam lidos pelo processor como trimestre
+        for antigo in (CADASTRO_ZIP_ANTIGO, indice_zip.caminho_indice(CADASTRO_ZIP_ANTIGO)):
+            if os.path.exists(antigo):
+                os.remove(antigo)
+
+        if not link_csv.endswith('.zip'):
+            _baixar(link_csv, caminho_final)
+            return caminho_final
+
+        # Download e extração em blocos: nem o ZIP nem o CSV passam inteiros pela memória. O ZIP fica
+        # num temporário fora de data/raw (sem índice lateral) e é apagado depois da extração
+        fd, caminho_zip = tempfile.mkstemp(suffix='.zip')
+        os.close(fd)
+        try:
+            _baixar(link_csv, caminho_zip)
+            indice = indice_zip.construir_indice(caminho_zip, lambda z: next(n for n in z.namelist() if n.endswith('.csv')))
+            with indice_zip.abrir_membro(caminho_zip, indice) as f:
                 with open(caminho_final, 'wb') as out:
-                    out.write(f.read())
-        else:
-            with open(caminho_final, 'wb') as f:
-                f.write(r_arquivo.content)
-                
+                    shutil.copyfileobj(f, out, TAMANHO_CHUNK)
+        finally:
+            os.remove(caminho_zip)
+
         return caminho_final
 
     except Exception as e:
         print(f"Erro no download: {e}")
         return None
 
-def main():
+def montar_dimensao(df_cadastro):
+    # Uma linha por RegistroANS (int32, ordenada), com atributos categóricos e o CNPJ validado uma única vez
+    registros = pd.to_numeric(df_cadastro['RegistroANS'], errors='coerce')
+    df = df_cadastro.loc[registros.notna()].copy()
+    df['RegistroANS'] = registros[registros.notna()].astype('int32')
+    df = df.drop_duplicates(subset=['RegistroANS']).sort_values('RegistroANS', ignore_index=True)
+
+    for col, padrao in (('CNPJ', None), ('RazaoSocial', "DESCONHECIDO"), ('Modalidade', "Desconhecida"), ('UF', "IND")):
+        if col not in df.columns:
+            df[col] = padrao
+        elif padrao is not None:
+            df[col] = df[col].fillna(padrao)
+    df['CNPJ_Valido'] = validar_cnpj_vetorizado(df['CNPJ'])
+    return aplicar_tipos(df[list(TIPOS_OPERADORAS)], TIPOS_OPERADORAS)
+
+def montar_fato(df_despesas):
+    # Só chaves inteiras e valor: registro int32, período int16 (ano * 4 + trimestre - 1), valor float64
+    validas = df_despesas['RegistroANS'].notna() & df_despesas['Ano'].notna() & df_despesas['Trimestre'].notna()
+    df = df_despesas.loc[validas]
+    return pd.DataFrame({
+        'RegistroANS': df['RegistroANS'].to_numpy(dtype='int32'),
+        'Periodo': (df['Ano'].to_numpy(dtype='int16') * 4 + df['Trimestre'].to_numpy(dtype='int16') - 1).astype('int16'),
+        'Valor Despesas': df['Valor Despesas'].to_numpy(dtype='float64'),
+    })
+
+def indice_operadoras(registros_dimensao, registros):
+    # Posição de cada registro na dimensão (ordenada): o "join" vira um searchsorted, sem copiar atributos
+    return np.searchsorted(registros_dimensao, registros)
+
+def completar_dimensao(df_operadoras, registros_fato):
+    # Registros com despesa mas fora do cadastro entram na dimensão com atributos padrão (como o antigo left join)
+    registros_dimensao = df_operadoras['RegistroANS'].to_numpy()
+    unicos = np.unique(registros_fato)
+    posicoes = np.minimum(indice_operadoras(registros_dimensao, unicos), max(len(registros_dimensao) - 1, 0))
+    faltantes = unicos if len(registros_dimensao) == 0 else unicos[registros_dimensao[posicoes] != unicos]
+    if len(faltantes) == 0:
+        return df_operadoras
+
+    extras = pd.DataFrame({
+        'RegistroANS': faltantes.astype('int32'),
+        'CNPJ': pd.NA,
+        'RazaoSocial': "DESCONHECIDO",
+        'Modalidade': "Desconhecida",
+        'UF': "IND",
+        'CNPJ_Valido': False,
+    })
+    df = pd.concat([df_operadoras.astype({'Modalidade': object, 'UF': object}), extras], ignore_index=True)
+    df = df.sort_values('RegistroANS', ignore_index=True)
+    return aplicar_tipos(df, TIPOS_OPERADORAS)
+
+def desnormalizar(df_operadoras, df_fato):
+    # Atributos da operadora levados a cada despesa por índice (take), no layout da tabela final antiga
+    posicoes = indice_operadoras(df_operadoras['RegistroANS'].to_numpy(), df_fato['RegistroANS'].to_numpy())
+    periodo = df_fato['Periodo'].to_numpy()
+    df = pd.DataFrame({
+        'RegistroANS': df_fato['RegistroANS'].to_numpy(),
+        'Ano': periodo // 4,
+        'Trimestre': periodo % 4 + 1,
+        'Valor Despesas': df_fato['Valor Despesas'].to_numpy(),
+    })
+    for col in ('CNPJ', 'RazaoSocial', 'Modalidade', 'UF', 'CNPJ_Valido'):
+        df[col] = df_operadoras[col].take(posicoes).reset_index(drop=True)
+    return df
+
+def main(incremental=False, formato=FORMATO_PADRAO, exportar_csv=False):
     print(">>> Lendo consolidado...")
-    if not os.path.exists(FILE_CONSOLIDADO):
+    df_despesas = ler_tabela(FILE_CONSOLIDADO, TIPOS_CONSOLIDADO)
+    if df_despesas is None:
         print("Arquivo consolidado não existe!")
         return
-        
-    df_despesas = pd.read_csv(FILE_CONSOLIDADO, sep=';', encoding='utf-8', dtype=str)
 
     path_cadastro = "data/raw/cadastro_operadoras.csv"
     if not os.path.exists(path_cadastro):
@@ -125,51 +235,44 @@ def main():
         print("Erro: Não achei a coluna RegistroANS no cadastro.")
         return
 
-    print(">>> Padronizando chaves...")
-    
-    df_despesas['RegistroANS'] = pd.to_numeric(df_despesas['RegistroANS'], errors='coerce')
-    df_cadastro['RegistroANS'] = pd.to_numeric(df_cadastro['RegistroANS'], errors='coerce')
-    
-    df_despesas = df_despesas.dropna(subset=['RegistroANS'])
-    df_cadastro = df_cadastro.dropna(subset=['RegistroANS'])
-    
-    df_despesas['RegistroANS'] = df_despesas['RegistroANS'].astype(int).astype(str)
-    df_cadastro['RegistroANS'] = df_cadastro['RegistroANS'].astype(int).astype(str)
-
-    print(">>> Fazendo o Join...")
-    cols_para_pegar = ['RegistroANS', 'CNPJ', 'RazaoSocial', 'Modalidade', 'UF']
-    cols_existentes = [c for c in cols_para_pegar if c in df_cadastro.columns]
-    
-    if 'RazaoSocial' in df_despesas.columns:
-        df_despesas = df_despesas.drop(columns=['RazaoSocial', 'CNPJ'])
+    print(">>> Montando dimensão de operadoras...")
+    df_operadoras = montar_dimensao(df_cadastro)
 
-    df_final = pd.merge(df_despesas, df_cadastro[cols_existentes], on='RegistroANS', how='left')
-    
-    df_final['RazaoSocial'] = df_final['RazaoSocial'].fillna("DESCONHECIDO")
-    df_final['UF'] = df_final['UF'].fillna("IND")
-    
-    if 'Modalidade' not in df_final.columns:
-        df_final['Modalidade'] = 'Desconhecida'
-    else:
-        df_final['Modalidade'] = df_final['Modalidade'].fillna("Desconhecida")
+    print(">>> Montando fato de despesas...")
+    df_fato = montar_fato(df_despesas)
+    df_operadoras = completar_dimensao(df_operadoras, df_fato['RegistroANS'].to_numpy())
 
     print(">>> Salvando arquivos...")
-    
-    if 'CNPJ' in df_final.columns:
-        df_final['CNPJ_Limpo'] = df_final['CNPJ'].astype(str).str.replace(r'[^0-9]', '', regex=True)
-        df_final['CNPJ_Valido'] = df_final['CNPJ_Limpo'].apply(validar_cnpj)
-        df_final = df_final.drop(columns=['CNPJ_Limpo'])
+    salvar_tabela(df_operadoras, FILE_OPERADORAS, TIPOS_OPERADORAS, formato, exportar_csv)
+    salvar_tabela(df_fato, FILE_DESPESAS, TIPOS_DESPESAS, formato, exportar_csv)
 
-    df_final.to_csv("data/processed/consolidado_despesas_final.csv", index=False, sep=';', encoding='utf-8')
-    
-    if 'Valor Despesas' in df_final.columns:
-        df_final['Valor Despesas'] = pd.to_numeric(df_final['Valor Despesas'], errors='coerce').fillna(0)
-        
-        agregado = df_final.groupby(['RazaoSocial', 'UF'])['Valor Despesas'].sum().reset_index()
+    if exportar_csv:
+        # Visão desnormalizada (uma linha por despesa com os dados da operadora) só para consumo externo
+        salvar_tabela(desnormalizar(df_operadoras, df_fato), FILE_FINAL, TIPOS_FINAL, 'csv')
+
+    if incremental:
+        # No modo incremental o consolidado contém só o delta; o agregado completo sairia errado
+        print("Modo incremental: despesas_agregadas.csv não é regerado.")
+    else:
+        # Soma por operadora direto nos índices da dimensão; o groupby final roda só sobre as operadoras
+        # que têm despesas (as do cadastro sem nenhuma linha no fato ficam fora, como na visão desnormalizada)
+        posicoes = indice_operadoras(df_operadoras['RegistroANS'].to_numpy(), df_fato['RegistroANS'].to_numpy())
+        valores = pd.Series(np.nan_to_num(df_fato['Valor Despesas'].to_numpy()))
+        por_operadora = valores.groupby(posicoes).sum()
+        totais = (df_operadoras[['RazaoSocial', 'UF']].iloc[por_operadora.index.to_numpy()].astype(object)
+                  .assign(**{'Valor Despesas': por_operadora.to_numpy()}))
+
+        agregado = totais.groupby(['RazaoSocial', 'UF'])['Valor Despesas'].sum().reset_index()
         agregado = agregado.sort_values(by='Valor Despesas', ascending=False)
         agregado.to_csv("data/processed/despesas_agregadas.csv", index=False, sep=';', encoding='utf-8')
-        
+
     print("Concluído!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Enriquece o consolidado com o cadastro de operadoras.")
+    parser.add_argument('--incremental', action='store_true', help="O consolidado contém apenas o delta do processor.")
+    parser.add_argument('--formato', choices=FORMATOS, default=FORMATO_PADRAO, help="Formato da base final.")
+    parser.add_argument('--exportar-csv', action='store_true', help="Grava também as tabelas em CSV e a visão desnormalizada consolidado_despesas_final.csv.")
+    args = parser.parse_args()
+
+    main(incremental=args.incremental, formato=args.formato, exportar_csv=args.exportar_csv)
\ No newline at end of file
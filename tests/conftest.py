@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(RAIZ, 'src'))
+sys.path.insert(0, os.path.join(RAIZ, 'src', 'api'))
+
+OPERADORAS_API = 30
+TRIMESTRES_API = [(2024, 3), (2024, 4), (2025, 1), (2025, 2)]
+
+
+def montar_base(pasta):
+    # Base pequena montada pela carga real (database.importar_dados): índices de busca, resumos, séries e,
+    # com pyarrow, a cópia Parquet do backend DuckDB. Retorna o caminho absoluto do banco.
+    import database
+    from formato import PARQUET_DISPONIVEL, TIPOS_DESPESAS, TIPOS_OPERADORAS, salvar_tabela
+
+    operadoras = pd.DataFrame({
+        'RegistroANS': [300000 + i for i in range(OPERADORAS_API)],
+        'CNPJ': [f"{10_000_000_000_000 + i:014d}" for i in range(OPERADORAS_API)],
+        'RazaoSocial': [f"{('SAUDE', 'VIDA', 'CLINICA')[i % 3]} OPERADORA {i:02d} LTDA" for i in range(OPERADORAS_API)],
+        'Modalidade': 'Medicina de Grupo',
+        'UF': [('SP', 'RJ', 'MG', 'RS')[i % 4] for i in range(OPERADORAS_API)],
+        'CNPJ_Valido': False,
+    })
+    despesas = pd.DataFrame([
+        {'RegistroANS': 300000 + i, 'Periodo': ano * 4 + trimestre - 1, 'Valor Despesas': 1000.1 * (i + 1) + 7.35 * trimestre}
+        for i in range(OPERADORAS_API) for ano, trimestre in TRIMESTRES_API
+    ])
+    despesas.loc[5, 'Valor Despesas'] = None  # valor ausente: fica fora das somas e das contagens
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(database, 'DB_PATH', str(pasta / 'intuitive_care.db'))
+        mp.setattr(database, 'SQL_SCRIPT_PATH', os.path.join(RAIZ, 'sql', 'querys.sql'))
+        mp.setattr(database, 'OPERADORAS_DIM', str(pasta / 'dim_operadoras'))
+        mp.setattr(database, 'DESPESAS_FATO', str(pasta / 'fato_despesas'))
+        salvar_tabela(operadoras, database.OPERADORAS_DIM, TIPOS_OPERADORAS, 'csv')
+        salvar_tabela(despesas, database.DESPESAS_FATO, TIPOS_DESPESAS, 'csv')
+        database.criar_tabelas()
+        database.importar_dados(parquet=PARQUET_DISPONIVEL)
+        return database.DB_PATH
+
+
+@pytest.fixture(scope='session')
+def base_api(tmp_path_factory):
+    return montar_base(tmp_path_factory.mktemp('base_api'))
+
+
+@pytest.fixture(scope='session')
+def app_api(base_api):
+    # O app lê o caminho do banco no import
+    os.environ['INTUITIVE_DB_PATH'] = base_api
+    import app
+    return app
+
+
+@pytest.fixture
+def cliente(app_api):
+    app_api.cache_respostas.limpar()
+    return app_api.app.test_client()
@@ -0,0 +1,45 @@
+import json
+import sqlite3
+
+import pytest
+
+from conftest import montar_base
+
+pytest.importorskip('duckdb')
+pytest.importorskip('pyarrow')
+
+from agregados import AgregadosDuckDB, AgregadosSQLite  # noqa: E402
+
+FILTROS_UF = [(None, None), (2025, None), (None, 3), (2024, 4), (2030, 1)]
+
+
+@pytest.fixture(scope='module')
+def conexao(tmp_path_factory):
+    # Base própria: o teste de cache da API incrementa a geração da base compartilhada (e o DuckDB cairia no SQLite)
+    conn = sqlite3.connect(montar_base(tmp_path_factory.mktemp('base_agregados')))
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def backends(conexao):
+    duckdb = AgregadosDuckDB(conexao.execute("PRAGMA database_list").fetchone()['file'])
+    assert duckdb._em_dia(conexao), "a cópia Parquet deveria ser da geração atual"
+    yield AgregadosSQLite(), duckdb
+    duckdb.fechar()
+
+
+def test_estatisticas_iguais_nos_dois_backends(conexao, backends):
+    sqlite, duckdb = backends
+    esperado = json.dumps(sqlite.estatisticas(conexao))
+    # Direto no DuckDB: a rota pública cairia no SQLite em caso de erro e o teste passaria sem comparar nada
+    assert json.dumps(duckdb._estatisticas(duckdb._cursor())) == esperado
+    assert json.loads(esperado)['top_operadoras']
+
+
+@pytest.mark.parametrize('ano, trimestre', FILTROS_UF)
+def test_estatisticas_uf_iguais_nos_dois_backends(conexao, backends, ano, trimestre):
+    sqlite, duckdb = backends
+    esperado = json.dumps(sqlite.estatisticas_uf(conexao, ano, trimestre))
+    assert json.dumps(duckdb._estatisticas_uf(duckdb._cursor(), ano, trimestre)) == esperado
@@ -0,0 +1,151 @@
+import base64
+import gzip
+import json
+import sqlite3
+
+import pytest
+
+import database
+from conftest import OPERADORAS_API
+
+
+def test_estatisticas_uf_filtra_por_periodo(cliente):
+    resposta = cliente.get('/api/estatisticas/uf?ano=2025&trimestre=1')
+    assert resposta.status_code == 200
+    linhas = resposta.get_json()
+    assert linhas and all((l['ano'], l['trimestre']) == (2025, 1) for l in linhas)
+
+
+@pytest.mark.parametrize('query', ['ano=abc', 'trimestre=1T', 'ano=2025&trimestre=x'])
+def test_estatisticas_uf_parametro_invalido(cliente, query):
+    resposta = cliente.get(f'/api/estatisticas/uf?{query}')
+    assert resposta.status_code == 400
+    assert 'error' in resposta.get_json()
+
+
+@pytest.mark.parametrize('n, esperado', [('-1', 1), ('0', 1), ('3', 3), ('100000', 30)])
+def test_top_crescimento_limita_n(cliente, n, esperado):
+    resposta = cliente.get(f'/api/analises/top-crescimento?n={n}')
+    assert resposta.status_code == 200
+    assert len(resposta.get_json()['data']) == esperado
+
+
+def test_top_crescimento_n_invalido(cliente):
+    resposta = cliente.get('/api/analises/top-crescimento?n=abc')
+    assert resposta.status_code == 400
+    assert resposta.get_json()['error'] == 'n deve ser um número inteiro'
+
+
+def test_operadoras_keyset_percorre_todas(cliente):
+    vistos, cursor = [], None
+    while True:
+        resposta = cliente.get('/api/operadoras?limit=7' + (f'&cursor={cursor}' if cursor else ''))
+        assert resposta.status_code == 200
+        corpo = resposta.get_json()
+        vistos += [o['registro_ans'] for o in corpo['data']]
+        cursor = corpo['meta']['next_cursor']
+        if not cursor:
+            break
+    assert vistos == sorted(vistos) and len(set(vistos)) == OPERADORAS_API
+
+
+@pytest.mark.parametrize('posicao', [{'r': [1, 2]}, {'r': {'a': 1}}, {'r': None}, {'r': True}, {'o': -1}])
+def test_operadoras_cursor_com_tipo_invalido(cliente, posicao):
+    cursor = base64.urlsafe_b64encode(json.dumps(posicao).encode('utf-8')).decode('ascii')
+    resposta = cliente.get(f'/api/operadoras?cursor={cursor}')
+    assert resposta.status_code == 400
+    assert resposta.get_json()['error'] == 'Cursor inválido'
+
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=-5', 'page=0', 'limit=abc', 'page=1.5'])
+def test_operadoras_paginacao_invalida(cliente, query):
+    resposta = cliente.get(f'/api/operadoras?{query}')
+    assert resposta.status_code == 400
+    assert 'error' in resposta.get_json()
+
+
+def test_etag_e_304(cliente):
+    primeira = cliente.get('/api/estatisticas')
+    assert primeira.status_code == 200
+    etag = primeira.headers['ETag']
+    assert primeira.headers['Cache-Control'] == 'no-cache'
+
+    repetida = cliente.get('/api/estatisticas')
+    assert repetida.headers['ETag'] == etag and repetida.data == primeira.data
+
+    nao_modificada = cliente.get('/api/estatisticas', headers={'If-None-Match': etag})
+    assert nao_modificada.status_code == 304
+    assert nao_modificada.data == b''
+    assert nao_modificada.headers['ETag'] == etag
+
+    assert cliente.get('/api/estatisticas', headers={'If-None-Match': '"outro"'}).status_code == 200
+
+
+def test_nova_geracao_invalida_o_cache(cliente, app_api, base_api, monkeypatch):
+    monkeypatch.setattr(app_api.monitor_geracao, 'intervalo', 0)
+    etag = cliente.get('/api/estatisticas').headers['ETag']
+    hits = app_api.cache_respostas.hits
+    assert cliente.get('/api/estatisticas').headers['ETag'] == etag
+    assert app_api.cache_respostas.hits == hits + 1
+
+    conn = sqlite3.connect(base_api)
+    database.incrementar_geracao(conn)
+    conn.commit()
+    conn.close()
+
+    resposta = cliente.get('/api/estatisticas', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert resposta.headers['ETag'] != etag
+    assert app_api.cache_respostas.hits == hits + 1
+
+
+def series_esperadas(base_api, registros):
+    conn = sqlite3.connect(base_api)
+    try:
+        return [
+            {'registro_ans': r, 'despesas': [
+                {'ano': a, 'trimestre': t, 'valor_despesas': v} for a, t, v in conn.execute(
+                    "SELECT ano, trimestre, valor_despesas FROM despesas WHERE registro_ans = ? "
+                    "ORDER BY ano DESC, trimestre DESC", (r,))
+            ]}
+            for r in sorted(registros)
+        ]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('requisicao', [
+    {'path': '/api/despesas/lote'},
+    {'path': '/api/despesas/lote?registros=,,'},
+    {'path': '/api/despesas/lote?registros=300001&ano_inicio=abc'},
+    {'path': '/api/despesas/lote', 'method': 'POST', 'json': ['300001']},
+    {'path': '/api/despesas/lote', 'method': 'POST', 'json': {'registros': '300001'}},
+    {'path': '/api/despesas/lote', 'method': 'POST', 'json': {'registros': [['300001']]}},
+    {'path': '/api/despesas/lote', 'method': 'POST', 'json': {'registros': [str(i) for i in range(1001)]}},
+])
+def test_lote_parametros_invalidos(cliente, requisicao):
+    resposta = cliente.open(**requisicao)
+    assert resposta.status_code == 400
+    assert 'error' in resposta.get_json()
+
+
+def test_lote_json_e_ndjson_devolvem_as_mesmas_series(cliente, base_api):
+    registros = ['300005', '300001', '300002', '999999']
+    esperado = series_esperadas(base_api, registros[:3])
+
+    assert cliente.get(f"/api/despesas/lote?registros={','.join(registros)}").get_json() == esperado
+    assert cliente.post('/api/despesas/lote', json={'registros': registros}).get_json() == esperado
+
+    ndjson = cliente.get(f"/api/despesas/lote?formato=ndjson&registros={','.join(registros)}")
+    assert ndjson.mimetype == 'application/x-ndjson'
+    assert [json.loads(linha) for linha in ndjson.data.splitlines()] == esperado
+
+    comprimida = cliente.get(f"/api/despesas/lote?formato=ndjson&registros={','.join(registros)}",
+                             headers={'Accept-Encoding': 'gzip'})
+    assert comprimida.headers['Content-Encoding'] == 'gzip'
+    assert [json.loads(linha) for linha in gzip.decompress(comprimida.data).splitlines()] == esperado
+
+
+def test_lote_filtra_periodo(cliente, base_api):
+    series = cliente.get('/api/despesas/lote?registros=300001&ano_inicio=2025&trimestre_fim=1&ano_fim=2025').get_json()
+    assert [(d['ano'], d['trimestre']) for d in series[0]['despesas']] == [(2025, 1)]
@@ -0,0 +1,77 @@
+import csv
+import gzip
+import io
+import json
+import sqlite3
+
+import pytest
+
+import exportacao
+from exportacao import COLUNAS_EXPORTACAO
+
+CONSULTA = ("SELECT d.registro_ans, o.cnpj, o.razao_social, o.modalidade, o.uf, d.ano, d.trimestre, d.valor_despesas "
+            "FROM despesas d LEFT JOIN operadoras o ON o.registro_ans = d.registro_ans ")
+
+
+def linhas_esperadas(base_api, where="", params=()):
+    conn = sqlite3.connect(base_api)
+    try:
+        return sorted(conn.execute(CONSULTA + where, params).fetchall(), key=repr)
+    finally:
+        conn.close()
+
+
+def ler_csv(corpo):
+    leitor = csv.reader(io.StringIO(corpo.decode('utf-8')), delimiter=';')
+    assert next(leitor) == COLUNAS_EXPORTACAO
+    return sorted((tuple(linha) for linha in leitor), key=repr)
+
+
+def como_texto(linhas):
+    # O CSV não tem tipos: NULL vira vazio e os números, o repr do Python
+    return sorted((tuple('' if v is None else str(v) for v in linha) for linha in linhas), key=repr)
+
+
+def ler_ndjson(corpo):
+    return sorted((tuple(json.loads(l)[c] for c in COLUNAS_EXPORTACAO) for l in corpo.splitlines()), key=repr)
+
+
+@pytest.fixture
+def lote_pequeno(monkeypatch):
+    # Vários fetchmany (e row groups no Parquet) mesmo com a base pequena
+    monkeypatch.setattr(exportacao, 'TAMANHO_FETCH_EXPORTACAO', 7)
+
+
+@pytest.mark.parametrize('query', ['formato=xml', 'ano=abc', 'trimestre=1.5'])
+def test_exportar_parametros_invalidos(cliente, query):
+    resposta = cliente.get(f'/api/despesas/exportar?{query}')
+    assert resposta.status_code == 400
+    assert 'error' in resposta.get_json()
+
+
+def test_exportar_csv(cliente, base_api, lote_pequeno):
+    resposta = cliente.get('/api/despesas/exportar')
+    assert resposta.mimetype == 'text/csv'
+    assert resposta.headers['Content-Disposition'] == 'attachment; filename="despesas.csv"'
+    assert ler_csv(resposta.data) == como_texto(linhas_esperadas(base_api))
+
+    comprimida = cliente.get('/api/despesas/exportar?formato=csv', headers={'Accept-Encoding': 'gzip'})
+    assert comprimida.headers['Content-Encoding'] == 'gzip'
+    assert ler_csv(gzip.decompress(comprimida.data)) == como_texto(linhas_esperadas(base_api))
+
+
+def test_exportar_ndjson_com_filtros(cliente, base_api, lote_pequeno):
+    resposta = cliente.get('/api/despesas/exportar?formato=ndjson&ano=2025&uf=SP')
+    assert resposta.mimetype == 'application/x-ndjson'
+    esperado = linhas_esperadas(base_api, "WHERE d.ano = ? AND o.uf = ?", (2025, 'SP'))
+    assert esperado and ler_ndjson(resposta.data) == esperado
+
+
+def test_exportar_parquet(cliente, base_api, lote_pequeno):
+    pq = pytest.importorskip('pyarrow.parquet')
+    resposta = cliente.get('/api/despesas/exportar?formato=parquet')
+    assert 'Content-Encoding' not in resposta.headers
+    arquivo = pq.ParquetFile(io.BytesIO(resposta.data))
+    assert arquivo.metadata.num_row_groups > 1
+    linhas = sorted((tuple(r[c] for c in COLUNAS_EXPORTACAO) for r in arquivo.read().to_pylist()), key=repr)
+    assert linhas == linhas_esperadas(base_api)
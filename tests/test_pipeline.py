@@ -0,0 +1,68 @@
+import pytest
+
+import pipeline
+
+
+def _em_processo(nome, opcoes, pasta_perfil=None):
+    # Mesmo contrato de pipeline.executar_etapa, mas no próprio processo (as etapas de teste não são picklable)
+    erro, em_dia = None, False
+    try:
+        em_dia = pipeline.ETAPAS[nome].executar(opcoes) is True
+    except Exception as e:
+        erro = f"{type(e).__name__}: {e}"
+    return {'erro': erro, 'em_dia': em_dia, 'pico_rss_mb': None}
+
+
+@pytest.fixture
+def area(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pipeline, 'executar_etapa', _em_processo)
+    entrada = tmp_path / 'entrada.csv'
+    saida = tmp_path / 'saida.csv'
+    entrada.write_text('a;b\n1;2\n')
+    saida.write_text('saída antiga\n')
+
+    def configurar(executar):
+        etapa = pipeline.Etapa('processamento', (), executar, lambda: [str(entrada)], lambda: [str(saida)], False)
+        monkeypatch.setattr(pipeline, 'ETAPAS', {'processamento': etapa})
+
+    return configurar, saida, str(tmp_path / 'relatorio.json')
+
+
+def test_falha_silenciosa_com_saida_antiga_nao_salva_estado(area):
+    configurar, saida, relatorio = area
+
+    def falhar(opcoes):
+        print("Erro: arquivo de entrada inválido.")
+        return
+
+    configurar(falhar)
+    resultado = pipeline.executar_pipeline(caminho_relatorio=relatorio)
+
+    assert not resultado['sucesso']
+    assert resultado['etapas'][0]['status'] == 'falha'
+    assert resultado['etapas'][0]['erro'] == 'etapa não atualizou nenhuma saída'
+    assert 'processamento' not in pipeline.carregar_estado()
+
+    # Na próxima execução a etapa não é pulada
+    resultado = pipeline.executar_pipeline(caminho_relatorio=relatorio)
+    assert resultado['etapas'][0]['status'] == 'falha'
+
+
+def test_etapa_que_reescreve_a_saida_e_pulada_depois(area):
+    configurar, saida, relatorio = area
+    configurar(lambda opcoes: saida.write_text('saída nova, mais longa\n'))
+
+    assert pipeline.executar_pipeline(caminho_relatorio=relatorio)['etapas'][0]['status'] == 'executada'
+    assert 'processamento' in pipeline.carregar_estado()
+    assert pipeline.executar_pipeline(caminho_relatorio=relatorio)['etapas'][0]['status'] == 'pulada'
+
+
+def test_etapa_que_conferiu_a_saida_sem_reescrever(area):
+    configurar, saida, relatorio = area
+    # Ex.: processor incremental sem ZIP novo e com o consolidado em dia
+    configurar(lambda opcoes: True)
+
+    resultado = pipeline.executar_pipeline(caminho_relatorio=relatorio, forcar=True)
+    assert resultado['sucesso'] and resultado['etapas'][0]['status'] == 'executada'
+    assert 'processamento' in pipeline.carregar_estado()
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+import database
+from conftest import RAIZ
+
+OPERADORAS = 50
+TRIMESTRES = [(2024, 3), (2024, 4), (2025, 1), (2025, 2)]
+# Buscas por operadora: verificar_planos aceita varrer um índice de cobertura, aqui nem isso
+CONSULTAS_PONTUAIS = ('operadora por registro ou CNPJ', 'despesas da operadora')
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch, capsys):
+    # Banco pequeno com o esquema do querys.sql: os planos (EXPLAIN QUERY PLAN) dependem dos índices, não do volume
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'intuitive_care.db'))
+    monkeypatch.setattr(database, 'SQL_SCRIPT_PATH', os.path.join(RAIZ, 'sql', 'querys.sql'))
+    database.criar_tabelas()
+
+    conn = database.get_connection()
+    conn.executemany("INSERT INTO operadoras (registro_ans, cnpj, razao_social, modalidade, uf) VALUES (?, ?, ?, ?, ?)", [
+        (str(300000 + i), f"{i:014d}", f"OPERADORA {i}", 'Medicina de Grupo', ('SP', 'RJ', 'MG')[i % 3])
+        for i in range(OPERADORAS)
+    ])
+    conn.executemany("INSERT INTO despesas (registro_ans, ano, trimestre, valor_despesas) VALUES (?, ?, ?, ?)", [
+        (str(300000 + i), ano, trimestre, 1000.0 + i)
+        for i in range(OPERADORAS) for ano, trimestre in TRIMESTRES
+    ])
+    database.incrementar_geracao(conn)
+    conn.commit()
+    conn.execute("ANALYZE")
+    yield conn
+    conn.close()
+    capsys.readouterr()
+
+
+def test_planos_sem_varredura(banco):
+    assert database.verificar_planos(banco, detalhado=False) == []
+
+
+def test_planos_sem_varredura_particionado(banco):
+    database.particionar_banco(banco)
+    conn = database.get_connection()
+    try:
+        database.anexar_particoes(conn, database.DB_PATH, somente_leitura=False)
+        assert conn.execute("SELECT COUNT(*) FROM despesas").fetchone()[0] == OPERADORAS * len(TRIMESTRES)
+        assert database.verificar_planos(conn, detalhado=False) == []
+    finally:
+        conn.close()
+
+
+def test_consultas_pontuais_sem_scan(banco):
+    for nome, sql, params in database.CONSULTAS_API:
+        if nome in CONSULTAS_PONTUAIS:
+            plano = [linha[3] for linha in banco.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            assert not [detalhe for detalhe in plano if detalhe.startswith('SCAN')], (nome, plano)
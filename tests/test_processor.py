@@ -0,0 +1,104 @@
+import os
+import sys
+import zipfile
+
+import pandas as pd
+import pytest
+
+import indice_zip
+import manifest as mf
+import processor
+from conftest import RAIZ
+from formato import TIPOS_CONSOLIDADO, ler_tabela, localizar_tabela
+
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+from dados_sinteticos import gerar_dados  # noqa: E402
+
+LINHAS = 30_000
+CONSOLIDADO = os.path.join(processor.PROCESSED_DIR, processor.NOME_CONSOLIDADO)
+
+
+@pytest.fixture
+def area(tmp_path, monkeypatch, capsys):
+    # Caminhos relativos (data/raw, data/processed) como no pipeline: valem também nos processos filhos
+    monkeypatch.chdir(tmp_path)
+    gerar_dados(processor.RAW_DIR, LINHAS, trimestres=3, operadoras=200, seed=7)
+    yield
+    capsys.readouterr()
+
+
+def consolidar(**opcoes):
+    processor.processar_arquivos(**opcoes)
+    return ler_tabela(CONSOLIDADO, TIPOS_CONSOLIDADO)
+
+
+@pytest.mark.parametrize('opcoes', [
+    {'workers': 2},
+    {'workers': 2, 'streaming': True, 'chunksize': 4_000},
+    {'streaming': True, 'chunksize': 4_000},
+])
+def test_modos_geram_o_mesmo_consolidado_que_o_serial(area, opcoes):
+    serial = consolidar()
+    assert len(serial) > 0 and set(serial['Trimestre']) == {2, 3, 4}
+
+    pd.testing.assert_frame_equal(consolidar(**opcoes), serial)
+
+
+
+def test_incremental_sem_alteracoes_refaz_consolidado_ausente(area):
+    completo = consolidar()
+    assert processor.processar_arquivos(incremental=True) == len(completo)
+    manifest = mf.carregar_manifest()
+    mf.marcar_carregados(manifest)  # o que a carga incremental faz depois de gravar as partições
+    mf.salvar_manifest(manifest)
+
+    caminho = localizar_tabela(CONSOLIDADO)
+    mtime = os.stat(caminho).st_mtime_ns
+    assert processor.processar_arquivos(incremental=True) == 0
+    assert os.stat(caminho).st_mtime_ns == mtime
+
+    os.remove(caminho)
+    assert processor.processar_arquivos(incremental=True) == len(completo)
+    pd.testing.assert_frame_equal(ler_tabela(CONSOLIDADO, TIPOS_CONSOLIDADO), completo)
+    # Reconstruído sem voltar a marcar os trimestres como pendentes
+    assert mf.particoes_pendentes(mf.carregar_manifest()) == []
+    assert processor.processar_arquivos(incremental=True) == 0
+
+
+def escrever_zip(caminho, conteudo):
+    with zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('1T2025.csv', conteudo)
+
+
+def ler_trimestre(caminho):
+    indice = processor.indice_trimestre(caminho)
+    return indice, pd.concat(processor.ler_csv_indexado(caminho, indice, chunksize=1_000), ignore_index=True)
+
+
+def test_byte_latin1_depois_da_amostra(tmp_path):
+    # Em latin1, 'Ã§' são os bytes c3 a7, UTF-8 válido: a amostra inicial inteira decodifica como UTF-8,
+    # mas o 'Ç' isolado (c7) bem depois dela não
+    cabecalho = '"DATA";"REG_ANS";"CD_CONTA_CONTABIL";"DESCRICAO";"VL_SALDO_INICIAL";"VL_SALDO_FINAL"\n'
+    linha = '"2025-01-01";"300001";"4111";"EVENTOS CONHECIDOS Ã§";"0";"1.234,56"\n'
+    repeticoes = 2 * indice_zip.TAMANHO_AMOSTRA // len(linha)
+    conteudo = (cabecalho + linha * repeticoes).encode('latin1') + \
+        '"2025-01-01";"300002";"4112";"DESPESAS DE COMERCIALIZAÇÃO";"0";"10,00"\n'.encode('latin1')
+    caminho = str(tmp_path / '2025_1T_1T2025.zip')
+    escrever_zip(caminho, conteudo)
+
+    indice, df = ler_trimestre(caminho)
+    assert indice['encoding'] == 'latin1'
+    assert len(df) == repeticoes + 1
+    assert df['descricao'].iloc[-1] == 'DESPESAS DE COMERCIALIZAÇÃO'
+
+
+def test_utf8_com_bom(tmp_path):
+    conteudo = ('REG_ANS;DESCRICAO;VL_SALDO_FINAL\n300001;DESPESAS ASSISTÊNCIA MÉDICA;"1.000,50"\n').encode('utf-8-sig')
+    caminho = str(tmp_path / '2025_1T_1T2025.zip')
+    escrever_zip(caminho, conteudo)
+
+    indice, df = ler_trimestre(caminho)
+    assert indice['encoding'] == 'utf-8-sig'
+    assert indice['colunas'][0] == 'REG_ANS'
+    assert df['descricao'].tolist() == ['DESPESAS ASSISTÊNCIA MÉDICA']
+    assert df['valor'].tolist() == [1000.5]
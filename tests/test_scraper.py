@@ -0,0 +1,137 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import scraper
+
+CONTEUDO = os.urandom(300_000)
+ETAG = '"v1"'
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Servidor com suporte a Range; `config` do servidor controla HEAD sem tamanho e interrupção do GET
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        config = self.server.config
+        if not config['head']:
+            self.send_response(405)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(CONTEUDO)))
+        self.send_header('ETag', ETAG)
+        self.end_headers()
+
+    def do_GET(self):
+        config = self.server.config
+        config['ranges'].append(self.headers.get('Range'))
+        inicio = 0
+        if self.headers.get('Range'):
+            inicio = int(self.headers['Range'].split('=')[1].split('-')[0])
+            if inicio >= len(CONTEUDO):
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{len(CONTEUDO)}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {inicio}-{len(CONTEUDO) - 1}/{len(CONTEUDO)}")
+        else:
+            self.send_response(200)
+        corpo = CONTEUDO[inicio:]
+        self.send_header('Content-Length', str(len(corpo)))
+        self.send_header('ETag', ETAG)
+        self.end_headers()
+        if config['interromper_em'] is not None:
+            # Envia só uma parte do corpo anunciado e derruba a conexão
+            self.wfile.write(corpo[:config['interromper_em']])
+            config['interromper_em'] = None
+            self.close_connection = True
+            return
+        self.wfile.write(corpo)
+
+
+@pytest.fixture
+def servidor():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.config = {'head': True, 'interromper_em': None, 'ranges': []}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd, f"http://127.0.0.1:{httpd.server_address[1]}/2025/1T2025.zip"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def sessao():
+    session = scraper.criar_sessao()
+    yield session
+    session.close()
+
+
+def ler(caminho):
+    with open(caminho, 'rb') as f:
+        return f.read()
+
+
+def test_retoma_download_interrompido(servidor, sessao, tmp_path, monkeypatch, capsys):
+    httpd, url = servidor
+    destino = str(tmp_path / '2025_1T_1T2025.zip')
+    httpd.config['interromper_em'] = 100_000
+    # Blocos pequenos: o bloco em curso quando a conexão cai se perde, os anteriores ficam no .part
+    monkeypatch.setattr(scraper, 'TAMANHO_CHUNK', 16 * 1024)
+
+    assert scraper.baixar_arquivo(sessao, url, destino, timeout=5)['status'] == 'falha'
+    offset = os.path.getsize(destino + '.part')
+    assert 0 < offset <= 100_000
+
+    resultado = scraper.baixar_arquivo(sessao, url, destino, timeout=5)
+    assert resultado['status'] == 'baixado'
+    assert resultado['bytes'] == len(CONTEUDO) - offset
+    assert httpd.config['ranges'] == [None, f"bytes={offset}-"]
+    assert ler(destino) == CONTEUDO
+    assert not os.path.exists(destino + '.part')
+
+    assert scraper.baixar_arquivo(sessao, url, destino, timeout=5)['status'] == 'existente'
+
+
+def test_parcial_completo_e_finalizado_sem_novo_get(servidor, sessao, tmp_path, capsys):
+    httpd, url = servidor
+    destino = str(tmp_path / '2025_1T_1T2025.zip')
+    with open(destino + '.part', 'wb') as f:
+        f.write(CONTEUDO)
+
+    assert scraper.baixar_arquivo(sessao, url, destino, timeout=5)['status'] == 'baixado'
+    assert httpd.config['ranges'] == []
+    assert ler(destino) == CONTEUDO
+
+
+def test_416_sem_tamanho_no_head_finaliza_parcial_completo(servidor, sessao, tmp_path, capsys):
+    httpd, url = servidor
+    httpd.config['head'] = False
+    destino = str(tmp_path / '2025_1T_1T2025.zip')
+    with open(destino + '.part', 'wb') as f:
+        f.write(CONTEUDO)
+
+    assert scraper.baixar_arquivo(sessao, url, destino, timeout=5)['status'] == 'baixado'
+    assert httpd.config['ranges'] == [f"bytes={len(CONTEUDO)}-"]
+    assert ler(destino) == CONTEUDO
+
+
+def test_416_com_tamanho_diferente_recomeca_do_zero(servidor, sessao, tmp_path, capsys):
+    httpd, url = servidor
+    httpd.config['head'] = False
+    destino = str(tmp_path / '2025_1T_1T2025.zip')
+    with open(destino + '.part', 'wb') as f:
+        f.write(CONTEUDO + b'lixo')
+
+    assert scraper.baixar_arquivo(sessao, url, destino, timeout=5)['status'] == 'baixado'
+    assert httpd.config['ranges'] == [f"bytes={len(CONTEUDO) + 4}-", None]
+    assert ler(destino) == CONTEUDO
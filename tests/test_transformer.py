@@ -0,0 +1,89 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+import transformer
+
+CNPJS = [
+    '11222333000181',          # válido
+    '11.222.333/0001-81',      # válido com máscara
+    11222333000181,            # válido como número
+    '11222333000182',          # segundo dígito verificador errado
+    '11222333000191',          # primeiro dígito verificador errado
+    '1122233300018',           # curto
+    '112223330001810',         # longo
+    '',
+    'ABCDEFGHIJKLMN',          # sem dígitos
+    '11A222333000181',         # dígitos com letra no meio
+    '00000000000000',          # dígitos repetidos
+    '11111111111111',
+    '99999999999999',
+    np.nan,
+    None,
+    pd.NA,
+    '11222333000181',          # repetido (mesmo código no factorize)
+]
+
+
+def test_vetorizado_igual_ao_escalar():
+    rng = np.random.default_rng(3)
+    aleatorios = [''.join(map(str, d)) for d in rng.integers(0, 10, size=(2000, 14))]
+    cnpjs = pd.Series(CNPJS + aleatorios, dtype=object)
+
+    esperado = [transformer.validar_cnpj(c) for c in cnpjs]
+    obtido = transformer.validar_cnpj_vetorizado(cnpjs)
+
+    assert obtido.tolist() == esperado
+    assert obtido.index.equals(cnpjs.index)
+    assert esperado[:3] == [True, True, True] and any(esperado[len(CNPJS):])
+
+
+def test_vetorizado_serie_vazia_e_tipo_string():
+    assert transformer.validar_cnpj_vetorizado(pd.Series([], dtype=object)).tolist() == []
+    cnpjs = pd.Series(['11222333000181', None, '123'], dtype='string')
+    assert transformer.validar_cnpj_vetorizado(cnpjs).tolist() == [True, False, False]
+
+
+class HandlerLento(BaseHTTPRequestHandler):
+    # Anuncia o corpo inteiro, manda só o começo e para de responder em /lento
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        corpo = b'Registro_ANS;CNPJ\n' * 100
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        if self.path == '/lento':
+            self.wfile.write(corpo[:20])
+            self.wfile.flush()
+            time.sleep(3)
+            return
+        self.wfile.write(corpo)
+
+
+@pytest.fixture
+def servidor():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), HandlerLento)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_baixar_com_timeout_nao_deixa_arquivo_truncado(servidor, tmp_path):
+    destino = str(tmp_path / 'cadastro_operadoras.csv')
+    inicio = time.perf_counter()
+    with pytest.raises(requests.exceptions.RequestException):
+        transformer._baixar(f"{servidor}/lento", destino, timeout=0.5)
+    assert time.perf_counter() - inicio < 2.5
+    assert not (tmp_path / 'cadastro_operadoras.csv').exists()
+
+    transformer._baixar(f"{servidor}/cadastro.csv", destino, timeout=5)
+    with open(destino, 'rb') as f:
+        assert f.read() == b'Registro_ANS;CNPJ\n' * 100